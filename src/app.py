@@ -1,5 +1,9 @@
 import os
 import sys
+import time
+
+_tS = time.time()
+_tms = {}
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
@@ -13,11 +17,16 @@ from flask_socketio import SocketIO
 
 lg = log.get(__name__)
 
+_tms['imports'] = time.time() - _tS
+
 
 #------------------------------------
 # init
 #------------------------------------
+_t = time.time()
 db.init()
+_tms['db'] = time.time() - _t
+_t = time.time()
 
 #------------------------------------
 app = dash.Dash(
@@ -33,6 +42,9 @@ app = dash.Dash(
 	pages_folder="pages",
 )
 
+_tms['pages'] = time.time() - _t
+_t = time.time()
+
 #------------------------------------
 err.injectCallbacks(app)
 
@@ -68,6 +80,16 @@ app.layout = htm.Div([
 
 ], className="d-flex flex-column min-vh-100")
 
+_tms['layout'] = time.time() - _t
+
+
+def warmUp():
+	'''torch, device and weights load in background, the ui is served meanwhile'''
+	tS = time.time()
+	import imgs
+	lg.info(f"[startup] torch + imgs imported in {time.time() - tS:.1f}s")
+	imgs.warmUp()
+
 
 
 #========================================================================
@@ -83,6 +105,12 @@ if __name__ == "__main__":
 
 		if log.EnableLogFile: lg.info(f"Log recording: {log.log_file}")
 
+		lg.info(f"[startup] ready in {time.time() - _tS:.1f}s: " + ' '.join(f"{k}({v:.2f}s)" for k, v in _tms.items()))
+
+		if envs.warmUp:
+			import threading
+			threading.Thread(target=warmUp, name="warm-up", daemon=True).start()
+
 		if conf.envs.isDev:
 			import dsh
 			dsh.registerScss()
@@ -61,7 +61,7 @@ def testVec() -> tuple[bool, list[str]]:
 		if not db.vecs.conn: return False, ['Qdrant connection not initialized']
 
 		tid = 999999999
-		tvec = np.random.rand(2048).astype(np.float32)
+		tvec = np.random.rand(db.vecs.dim).astype(np.float32)
 		tvec = tvec / np.linalg.norm(tvec)
 
 		try:
@@ -157,9 +157,9 @@ def immichLogic() -> tuple[bool, list[str]]:
 
 def model() -> tuple[bool, list[str]]:
 	try:
-		from torchvision.models import ResNet152_Weights
+		import imgs
 
-		weights = ResNet152_Weights.DEFAULT
+		weights = imgs.mdlWeights(db.dto.vecModel)
 		url = weights.url
 		filename = url.split('/')[-1]
 
@@ -176,7 +176,6 @@ def model() -> tuple[bool, list[str]]:
 			]
 
 		try:
-			import imgs
 			imgs.getModel()
 			return True, ['Model weights downloaded successfully']
 		except Exception as e: return False, ['Failed to download model weights', str(e)]
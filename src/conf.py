@@ -5,7 +5,6 @@ import re
 from typing import Dict, Callable, Optional
 
 import dotenv
-import torch
 
 # import ssl
 # ssl._create_default_https_context = ssl._create_unverified_context
@@ -18,6 +17,7 @@ lg = log.get(__name__)
 
 
 def getDevice():
+	import torch
 	useDevice = os.getenv('ForceCpu')
 	if useDevice: return torch.device('cpu')
 
@@ -25,7 +25,26 @@ def getDevice():
 	elif hasattr(torch.backends, 'mps') and torch.backends.mps.is_available(): return torch.device('mps')
 	else: return torch.device('cpu')
 
-device = getDevice()
+# conf.device is detected on first access, importing torch takes seconds and browsing never needs it
+_device = None
+
+def peekDevice():
+	'''the device when already detected, otherwise None without importing torch'''
+	return _device
+
+def deviceType() -> str:
+	'''the detected device type, 'cpu' until torch got loaded (drivers alone do not tell the torch build)'''
+	return _device.type if _device is not None else 'cpu'
+
+def __getattr__(name):
+	global _device
+	if name == 'device':
+		if _device is None:
+			tS = time.time()
+			_device = getDevice()
+			lg.info(f"[conf] device[{_device}] detected in {time.time() - tS:.1f}s")
+		return _device
+	raise AttributeError(f"module 'conf' has no attribute '{name}'")
 pathRoot = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 isDock = os.path.exists('/.dockerenv')
 
@@ -131,9 +150,12 @@ class cmds:
 	class vec(co.to):
 		toVec = co.tit('vec_toVec',desc='Generate vectors from assets')
 		clear = co.tit('vec_clear',desc='Clear all vectors')
+		chkInfer = co.tit('vec_chkInfer',desc='Build and check a cpu inference mode')
 
 	class sim(co.to):
 		fnd = co.tit('sim_find', desc='Find Similar vectors')
+		graph = co.tit('sim_graph', desc='Build similarity graph of whole library')
+		regroup = co.tit('sim_regroup', desc='Re-group by threshold from stored neighbours')
 		clear = co.tit('sim_clear', desc='Clear Similar results but keep simOk')
 		reset = co.tit('sim_clearAll', desc='Clear all similar results')
 		selOk = co.tit('sim_selOk', desc='Resolve selected assets')
@@ -190,6 +212,22 @@ class ks:
 		pgSim = 'sto-pg-sim'
 
 	class defs:
+		# vector backbones: name → (label, dim)
+		mdlDef = 'resnet152'
+		mdls = {
+			'resnet152': ('ResNet152 (Most accurate)', 2048),
+			'resnet50': ('ResNet50 (Balanced)', 2048),
+			'efficientnet_b0': ('EfficientNet-B0 (Fast)', 1280),
+			'mobilenet_v3_large': ('MobileNetV3 Large (Fastest)', 960),
+		}
+
+		# cpu inference variants: mode → label
+		cpuInfers = {
+			'eager': 'Float32 (Eager)',
+			'frozen': 'Frozen TorchScript',
+			'int8': 'Int8 Quantized',
+		}
+
 		exif = {
 			"exifImageWidth": "Width",
 			"exifImageHeight": "Height",
@@ -260,6 +298,8 @@ class envs:
 	psqlPass:str = os.getenv('PSQL_PASS','')
 	ddupPort:str = os.getenv('DEDUP_PORT', '8086')
 	offline:bool = os.getenv('OFFLINE', 'false').lower() == 'true'
+	warmUp:bool = os.getenv('DEDUP_WARMUP', 'true').lower() == 'true'  # load the model in background after start
+	sqliteWal:bool = os.getenv('DEDUP_SQLITE_WAL', 'true').lower() == 'true'  # false when the data dir is on a network share
 
 	if os.getcwd().startswith(os.path.join(pathRoot, 'tests')): ddupData = os.path.join(pathRoot, 'data/')
 	else:
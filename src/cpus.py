@@ -0,0 +1,46 @@
+#------------------------------------------------------------------------
+# cpu plan helpers shared by vectorizing and the settings ui
+#
+# this module never imports torch, rendering the cpu settings reads it
+# while imgs (and torch with it) is only loaded when processing starts
+#------------------------------------------------------------------------
+from dataclasses import dataclass
+from typing import Optional
+
+
+#------------------------------------------------------------------------
+# thread budget: decode workers, infer workers x intra-op threads and inter-op threads share the cores
+#------------------------------------------------------------------------
+@dataclass
+class ThreadPlan:
+	decoders: int
+	inferWorkers: int
+	intra: int
+	inter: int
+
+	def __str__(self): return f"threads[decode {self.decoders} infer {self.inferWorkers}x{self.intra} inter-op {self.inter}]"
+
+
+def planThreads(deviceType: str, cpuCnt: int, usePool: bool, workers: Optional[int]=None) -> ThreadPlan:
+	'''
+	split the cores so decoders + inferWorkers * intra stays within cpuCnt,
+	workers is the manual worker count, None for auto
+	'''
+	cpuCnt = max(1, cpuCnt)
+	if deviceType != 'cpu':
+		# the gpu does the model, cores go to decoding and the tensor prep left on cpu
+		dec = max(1, min(10, cpuCnt - 1))
+		return ThreadPlan(dec, 1, max(1, cpuCnt - dec), 1)
+
+	# decoding thumbnails costs a fraction of the inference, auto gives it a quarter of the cores
+	dec = min(workers or max(1, cpuCnt // 4), max(1, cpuCnt - 1))
+	if usePool: return ThreadPlan(dec, 1, max(1, cpuCnt - dec), 1)
+
+	# threads share the gil for python parts, a second infer worker keeps the cores busy between batches
+	infs = min(workers or (2 if cpuCnt >= 8 else 1), max(1, cpuCnt - dec))
+	return ThreadPlan(dec, infs, max(1, (cpuCnt - dec) // infs), 1)
+
+
+def fmtDrift(chk: Optional[dict]) -> str:
+	if not chk: return "not checked yet, selecting it builds and checks it before use"
+	return f"{chk['n']} samples: cosine to float min[{chk['cosMin']:.4f}] mean[{chk['cosMean']:.4f}], score drift max[{chk['driftMax']:.4f}] mean[{chk['driftMean']:.4f}]"
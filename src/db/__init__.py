@@ -6,6 +6,7 @@ lg = log.get(__name__)
 import db.pics as pics
 import db.sets as sets
 import db.vecs as vecs
+import db.embs as embs
 import db.psql as psql
 import db.sim as sim
 from dto import dto, DtoSets, AutoDbField
@@ -15,7 +16,8 @@ def init():
     try:
         sets.init()
         pics.init()
-        vecs.init()
+        vecs.init(dto.vecModel, dto.cpuInfer)
+        embs.init()
         psql.init()
         lg.info('All databases initialized successfully')
     except Exception as e:
@@ -24,7 +26,9 @@ def init():
 def close():
     try:
         sets.close()
+        pics.close()
         vecs.close()
+        embs.close()
         lg.info('All database connections closed successfully')
     except Exception as e:
         lg.error(f'Failed to close database connections: {str(e)}')
@@ -32,10 +36,22 @@ def close():
 
     return True
 
+def useModel(name: str, infer: Optional[str]=None):
+    '''switch the vector model or cpu infer mode, vectors of the others stay in their own collections'''
+    if infer is None: infer = vecs.infer
+    # frozen / int8 are only used once their check against float ran for this model
+    if infer != 'eager' and f"{name}-{infer}" not in dto.cpuInferChk: infer = 'eager'
+    if name == vecs.mdl and infer == vecs.infer: return
+    vecs.use(name, infer)
+    dto.vecModel, dto.cpuInfer = vecs.mdl, vecs.infer
+    pics.syncVectored(vecs.getAllIds())
+    lg.info(f'[db] vector model switched to [{vecs.mdl}] infer[{vecs.infer}]')
+
 def resetAllData():
     try:
         pics.clearAll()
         vecs.cleanAll()
+        # embs cache is kept on purpose, it lets a rebuild skip unchanged files
         lg.info('[clear] All records cleared successfully')
     except Exception as e:
         lg.error(f'[clear] Failed to clear all records: {str(e)}')
@@ -0,0 +1,60 @@
+#------------------------------------------------------------------------
+# connected components of the similarity graph (disjoint-set / union-find)
+#
+# edges are merged strongest first, with maxSize a merge that would grow a
+# set beyond it is refused, so an oversized component splits along its
+# weakest links while smaller ones come out exactly as plain components
+#------------------------------------------------------------------------
+from typing import Dict, Iterable, List, Tuple
+
+Edge = Tuple[int, int, float]
+
+
+class DSU:
+	def __init__(self):
+		self.parent: Dict[int, int] = {}
+		self.size: Dict[int, int] = {}
+
+	def find(self, x: int) -> int:
+		p = self.parent
+		if x not in p:
+			p[x] = x
+			self.size[x] = 1
+			return x
+		while p[x] != x:
+			p[x] = p[p[x]]
+			x = p[x]
+		return x
+
+	def union(self, a: int, b: int, maxSize: int=0) -> bool:
+		ra, rb = self.find(a), self.find(b)
+		if ra == rb: return False
+		if maxSize and self.size[ra] + self.size[rb] > maxSize: return False
+		if self.size[ra] < self.size[rb]: ra, rb = rb, ra
+		self.parent[rb] = ra
+		self.size[ra] += self.size[rb]
+		return True
+
+	def sets(self) -> List[List[int]]:
+		comps: Dict[int, List[int]] = {}
+		for x in self.parent: comps.setdefault(self.find(x), []).append(x)
+		return sorted([sorted(m) for m in comps.values()], key=lambda m: m[0])
+
+
+def groups(edges: Iterable[Edge], maxSize: int=0) -> List[List[int]]:
+	'''components with more than one member, sorted members, ordered by the lowest member'''
+	d = DSU()
+	for a, b, _ in sorted(edges, key=lambda e: (-e[2], min(e[0], e[1]), max(e[0], e[1]))): d.union(a, b, maxSize)
+	return [m for m in d.sets() if len(m) > 1]
+
+
+def mains(comps: List[List[int]], edges: Iterable[Edge]) -> List[int]:
+	'''per component the member most similar to the others (highest summed score), lowest autoId on ties'''
+	of = {m: i for i, c in enumerate(comps) for m in c}
+	sums: Dict[int, float] = {}
+	for a, b, s in edges:
+		ca = of.get(a)
+		if ca is None or ca != of.get(b): continue
+		sums[a] = sums.get(a, 0.0) + s
+		sums[b] = sums.get(b, 0.0) + s
+	return [min(c, key=lambda m: (-round(sums.get(m, 0.0), 6), m)) for c in comps]
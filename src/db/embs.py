@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from conf import envs
+from util import log
+from util.err import mkErr
+
+lg = log.get(__name__)
+
+#------------------------------------------------------------------------
+# local embedding cache, independent of qdrant / pics.db resets
+#
+# vectors: one memory-mapped float32 file per model  embs/<mdl>-<dim>.f32
+# index:   embs/embs.db  (path, mdl, photoQ) → row + phash, checked against size + mtime
+#------------------------------------------------------------------------
+pathDir = envs.ddupData + 'embs/'
+pathDb = pathDir + 'embs.db'
+
+IKey = Tuple[str, int, int]  # path, size, mtime_ns
+
+_lock = threading.RLock()
+_mats: Dict[str, np.memmap] = {}
+_capMin = 1024
+
+
+@contextmanager
+def mkConn():
+	conn = None
+	try:
+		conn = sqlite3.connect(pathDb, check_same_thread=False, timeout=30.0)
+		conn.execute("PRAGMA busy_timeout=30000")
+		conn.execute("PRAGMA synchronous=NORMAL")
+		yield conn
+	finally:
+		if conn: conn.close()
+
+
+def init():
+	try:
+		os.makedirs(pathDir, exist_ok=True)
+		with mkConn() as conn:
+			c = conn.cursor()
+			c.execute('''
+				CREATE TABLE IF NOT EXISTS embs (
+					path   TEXT NOT NULL,
+					mdl    TEXT NOT NULL,
+					photoQ TEXT NOT NULL,
+					size   INTEGER NOT NULL,
+					mtime  INTEGER NOT NULL,
+					row    INTEGER NOT NULL,
+					phash  INTEGER,
+					PRIMARY KEY (path, mdl, photoQ)
+				)
+			''')
+			c.execute("PRAGMA table_info(embs)")
+			if 'phash' not in {r[1] for r in c.fetchall()}: c.execute("ALTER TABLE embs ADD COLUMN phash INTEGER")
+			c.execute("CREATE INDEX IF NOT EXISTS idx_embs_mdl_row ON embs(mdl, row)")
+			conn.commit()
+		lg.info(f"[embs] cache ready: {pathDir}")
+	except Exception as e: raise mkErr("Failed to initialize embedding cache", e)
+
+
+def close():
+	with _lock:
+		for m in _mats.values(): m.flush()
+		_mats.clear()
+
+
+def keyOf(path: str) -> Optional[IKey]:
+	try:
+		st = os.stat(path)
+		return path, st.st_size, st.st_mtime_ns
+	except OSError: return None
+
+
+def _mdlKey(mdl: str, dim: int): return f"{mdl}-{dim}"
+
+
+def _mat(mdl: str, dim: int, need: int=0) -> np.memmap:
+	mk = _mdlKey(mdl, dim)
+	m = _mats.get(mk)
+	if m is not None and m.shape[0] >= need: return m
+
+	path = f"{pathDir}{mk}.f32"
+	rowB = dim * 4
+	cur = os.path.getsize(path) // rowB if os.path.exists(path) else 0
+	cap = max(cur, _capMin)
+	while cap < need: cap *= 2
+
+	if m is not None:
+		m.flush()
+		del _mats[mk]
+
+	if cap > cur:
+		with open(path, 'ab') as f: f.truncate(cap * rowB)
+
+	m = np.memmap(path, dtype=np.float32, mode='r+', shape=(cap, dim))
+	_mats[mk] = m
+	return m
+
+
+def getMany(keys: List[IKey], mdl: str, photoQ: str, dim: int) -> Dict[int, Tuple[np.ndarray, Optional[int]]]:
+	'''returns {index in keys: (vector, phash)} for entries whose size and mtime still match'''
+	try:
+		if not keys: return {}
+		mk = _mdlKey(mdl, dim)
+		byPath = {k[0]: i for i, k in enumerate(keys)}
+
+		with mkConn() as conn:
+			c = conn.cursor()
+			qargs = ','.join(['?' for _ in byPath])
+			c.execute(f"SELECT path, size, mtime, row, phash FROM embs WHERE mdl = ? AND photoQ = ? AND path IN ({qargs})", [mk, photoQ, *byPath.keys()])
+			rows = c.fetchall()
+
+		hits = {}
+		with _lock:
+			# rows appended by another process may lie past this process' mapping
+			m = _mat(mdl, dim, max((r[3] for r in rows), default=-1) + 1)
+			for path, size, mtime, row, phash in rows:
+				idx = byPath[path]
+				_, kSize, kMtime = keys[idx]
+				if size != kSize or mtime != kMtime or row >= m.shape[0]: continue
+				vec = np.array(m[row])
+				if np.isfinite(vec).all() and vec.any(): hits[idx] = (vec, phash)
+		return hits
+	except Exception as e:
+		lg.warn(f"[embs] lookup failed, treat as miss: {str(e)}")
+		return {}
+
+
+def putMany(keys: List[IKey], mat: np.ndarray, mdl: str, photoQ: str, phashes: Optional[List[Optional[int]]]=None):
+	try:
+		if not keys: return
+		if phashes is None: phashes = [None] * len(keys)
+		dim = mat.shape[1]
+		mk = _mdlKey(mdl, dim)
+
+		with _lock, mkConn() as conn:
+			c = conn.cursor()
+			# processes sharing the data dir (workers) append to the same file, rows are
+			# picked under the write lock from what is committed, never from a local counter
+			c.execute("BEGIN IMMEDIATE")
+			qargs = ','.join(['?' for _ in keys])
+			c.execute(f"SELECT path, row FROM embs WHERE mdl = ? AND photoQ = ? AND path IN ({qargs})", [mk, photoQ, *[k[0] for k in keys]])
+			rows = dict(c.fetchall())
+			c.execute("SELECT MAX(row) FROM embs WHERE mdl = ?", (mk,))
+			mx = c.fetchone()[0]
+			nxt = (mx + 1) if mx is not None else 0
+
+			# changed files keep their row, new ones append
+			idxs = []
+			for k in keys:
+				if k[0] in rows: idxs.append(rows[k[0]])
+				else:
+					rows[k[0]] = nxt
+					idxs.append(nxt)
+					nxt += 1
+
+			m = _mat(mdl, dim, max(idxs) + 1)
+			m[idxs] = mat
+			m.flush()
+
+			c.executemany('''
+				INSERT INTO embs (path, mdl, photoQ, size, mtime, row, phash) VALUES (?, ?, ?, ?, ?, ?, ?)
+				ON CONFLICT(path, mdl, photoQ) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, phash = excluded.phash
+			''', [(k[0], mk, photoQ, k[1], k[2], r, h) for k, r, h in zip(keys, idxs, phashes)])
+			conn.commit()
+	except Exception as e: lg.warn(f"[embs] store failed, vectors not cached: {str(e)}")
+
+
+def count(mdl: Optional[str]=None) -> int:
+	try:
+		with mkConn() as conn:
+			c = conn.cursor()
+			if mdl: c.execute("SELECT COUNT(*) FROM embs WHERE mdl LIKE ?", (f"{mdl}-%",))
+			else: c.execute("SELECT COUNT(*) FROM embs")
+			return c.fetchone()[0]
+	except Exception as e: raise mkErr("Failed to count cached embeddings", e)
+
+
+def clearAll():
+	try:
+		with _lock:
+			close()
+			for fn in os.listdir(pathDir):
+				if fn.endswith('.f32'): os.remove(os.path.join(pathDir, fn))
+			with mkConn() as conn:
+				conn.execute("DELETE FROM embs")
+				conn.commit()
+		lg.info("[embs] cache cleared")
+	except Exception as e: raise mkErr("Failed to clear embedding cache", e)
@@ -0,0 +1,92 @@
+#------------------------------------------------------------------------
+# exact top-k cosine neighbours over a whole vector matrix
+#
+# rows are L2-normalised so a dot product is the cosine score, the full
+# (rows x cols) score matrix is never held: row blocks are spread over
+# threads (the matmul releases the GIL) and each walks the columns in
+# chunks, keeping only scores >= thMin
+#------------------------------------------------------------------------
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional, Tuple
+
+import numpy as np
+
+Edges = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def normRows(mat: np.ndarray, chunk=65536):
+	'''in place, chunk by chunk so a memmap is never loaded whole'''
+	for s in range(0, len(mat), chunk):
+		blk = mat[s:s + chunk]
+		n = np.linalg.norm(blk, axis=1, keepdims=True)
+		n[n == 0] = 1
+		blk /= n
+
+
+def _block(mat: np.ndarray, rows: np.ndarray, k: int, thMin: float, colChunk: int) -> Edges:
+	q = np.ascontiguousarray(mat[rows])
+	rs, cs, ss = [], [], []
+	for c0 in range(0, len(mat), colChunk):
+		sc = q @ mat[c0:c0 + colChunk].T
+		r, c = np.nonzero(sc >= thMin)
+
+		# a flood of near-identical vectors (blank frames), cap every row to k already here
+		if len(r) > len(rows) * k:
+			kk = min(k + 1, sc.shape[1])
+			sc[sc < thMin] = -np.inf
+			idx = np.argpartition(-sc, kk - 1, axis=1)[:, :kk]
+			s = np.take_along_axis(sc, idx, 1)
+			ok = np.isfinite(s)
+			r, c, s = np.nonzero(ok)[0], idx[ok], s[ok]
+		else: s = sc[r, c]
+
+		rs.append(r)
+		cs.append(c + c0)
+		ss.append(s)
+
+	r, c, s = np.concatenate(rs), np.concatenate(cs), np.concatenate(ss)
+
+	# self is not a neighbour
+	keep = c != rows[r]
+	r, c, s = r[keep], c[keep], s[keep]
+
+	# best k per row
+	order = np.lexsort((-s, r))
+	r, c, s = r[order], c[order], s[order]
+	rank = np.arange(len(r)) - np.searchsorted(r, r)
+	keep = rank < k
+	return rows[r[keep]], c[keep], s[keep]
+
+
+def topK(
+	mat: np.ndarray, srcs: np.ndarray, k: int=99, thMin: float=0.95,
+	block=512, colChunk=8192, workers: Optional[int]=None,
+	isCancel: Optional[Callable[[], bool]]=None
+) -> Iterator[Tuple[int, Edges]]:
+	'''
+	neighbours of the rows srcs among all rows of mat (self excluded), best first per row
+	yields (rowsDone, (src, dst, score)) per block in order, dst indexes rows of mat
+	at most 2 blocks per worker are in flight, so finished edges never pile up ahead of the consumer
+	'''
+	blocks = (srcs[i:i + block] for i in range(0, len(srcs), block))
+	workers = workers or os.cpu_count() or 1
+
+	def run(rows: np.ndarray) -> Edges:
+		if isCancel and isCancel(): return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32)
+		return _block(mat, rows, k, thMin, colChunk)
+
+	done = 0
+	with ThreadPoolExecutor(max_workers=workers) as ex:
+		futs = deque()
+		for rows in blocks:
+			futs.append((rows, ex.submit(run, rows)))
+			if len(futs) < workers * 2: continue
+			rows, fut = futs.popleft()
+			done += len(rows)
+			yield done, fut.result()
+		while futs:
+			rows, fut = futs.popleft()
+			done += len(rows)
+			yield done, fut.result()
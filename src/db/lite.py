@@ -0,0 +1,97 @@
+#------------------------------------------------------------------------
+# pooled sqlite connections
+#
+# every `with pool.conn()` checks out a connection of its own, so callers
+# never share one at the same time (same as a fresh connect), but it is kept
+# open afterwards: pragmas, page cache and mmap survive between uses.
+# web requests run on short-lived threads, a pool is reused across them
+# where per-thread connections would be opened again for nearly every request
+#
+# WAL lets readers (callbacks, image routes) run alongside the writer
+# (background tasks); it needs the data dir on a local filesystem
+#------------------------------------------------------------------------
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from conf import envs
+from util import log
+
+lg = log.get(__name__)
+
+Key = Tuple[int, str, int]  # pid, path, generation
+
+
+class Pool:
+	def __init__(
+		self, getPath: Callable[[], str], onOpen: Optional[Callable[[sqlite3.Connection], None]]=None,
+		maxIdle=8, cacheKb=16384, mmapMb=256
+	):
+		self.getPath = getPath
+		self.onOpen = onOpen
+		self.maxIdle = maxIdle
+		self.cacheKb = cacheKb
+		self.mmapMb = mmapMb
+		self.gen = 0
+		self.pid = os.getpid()
+		self._idle: List[Tuple[Key, sqlite3.Connection]] = []
+		self._forked: List[sqlite3.Connection] = []
+		self._lock = threading.Lock()
+
+	def _open(self, path: str) -> sqlite3.Connection:
+		conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+		conn.execute("PRAGMA busy_timeout=30000")
+		conn.execute(f"PRAGMA journal_mode={'WAL' if envs.sqliteWal else 'DELETE'}")
+		conn.execute("PRAGMA synchronous=NORMAL")
+		conn.execute(f"PRAGMA cache_size=-{self.cacheKb}")
+		conn.execute(f"PRAGMA mmap_size={self.mmapMb << 20}")
+		if self.onOpen: self.onOpen(conn)
+		return conn
+
+	def _take(self, key: Key) -> Optional[sqlite3.Connection]:
+		with self._lock:
+			if self.pid != key[0]:
+				# handles inherited over fork belong to the parent, never use or close them here
+				self._forked.extend(c for _, c in self._idle)
+				self._idle, self.pid = [], key[0]
+
+			while self._idle:
+				k, c = self._idle.pop()
+				if k == key: return c
+				c.close()
+		return None
+
+	def _give(self, key: Key, conn: sqlite3.Connection):
+		if conn.in_transaction: conn.rollback()
+		with self._lock:
+			if key == (self.pid, self.getPath(), self.gen) and len(self._idle) < self.maxIdle:
+				self._idle.append((key, conn))
+				return
+		conn.close()
+
+	@contextmanager
+	def conn(self) -> Iterator[sqlite3.Connection]:
+		'''uncommitted work is rolled back on return, as closing a connection would'''
+		key = (os.getpid(), self.getPath(), self.gen)
+		conn = self._take(key) or self._open(key[1])
+		try: yield conn
+		except BaseException:
+			conn.close()
+			raise
+		else:
+			try: self._give(key, conn)
+			except sqlite3.Error as e:
+				lg.warn(f"[lite] drop connection of [{key[1]}]: {e}")
+				conn.close()
+
+	def reset(self):
+		'''close idle connections, ones in use are closed when returned; call after the schema is rebuilt'''
+		with self._lock:
+			self.gen += 1
+			idle, self._idle = self._idle, []
+			if self.pid != os.getpid():
+				self._forked.extend(c for _, c in idle)
+				return
+		for _, c in idle: c.close()
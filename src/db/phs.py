@@ -0,0 +1,66 @@
+#------------------------------------------------------------------------
+# perceptual hash index for exact / re-encoded duplicates
+#
+# multi-index hashing: the 64 bits are split into r+1 blocks, two hashes
+# within hamming distance r share at least one identical block (pigeonhole),
+# so only bucket mates are ever compared
+#------------------------------------------------------------------------
+from typing import Dict, List, Tuple
+
+from db import dsu
+
+_mask = (1 << 64) - 1
+
+
+def dist(a: int, b: int) -> int: return bin((a ^ b) & _mask).count('1')
+
+
+class HamIdx:
+	def __init__(self, items: List[Tuple[int, int]], r: int=4):
+		self.r = max(0, min(r, 16))
+		self.items = items
+
+		m = self.r + 1
+		self.spans = [(64 * i // m, 64 * (i + 1) // m) for i in range(m)]
+		self.tbls: List[Dict[int, List[int]]] = [{} for _ in self.spans]
+
+		for idx, (_, h) in enumerate(items):
+			for tbl, key in zip(self.tbls, self._keys(h)): tbl.setdefault(key, []).append(idx)
+
+	def _keys(self, h: int) -> List[int]:
+		u = h & _mask
+		return [(u >> s) & ((1 << (e - s)) - 1) for s, e in self.spans]
+
+	def near(self, h: int) -> List[Tuple[int, int]]:
+		'''(key, distance) of every item within r of h, h itself included'''
+		seen, rst = set(), []
+		for tbl, key in zip(self.tbls, self._keys(h)):
+			for idx in tbl.get(key, []):
+				if idx in seen: continue
+				seen.add(idx)
+				k, hh = self.items[idx]
+				d = dist(h, hh)
+				if d <= self.r: rst.append((k, d))
+		return rst
+
+
+def groups(items: List[Tuple[int, int]], r: int=4) -> List[List[int]]:
+	'''
+	connected components of (aid, hash) within hamming distance r
+	identical hashes are merged first, so a flood of equal hashes costs nothing
+	'''
+	byHash: Dict[int, List[int]] = {}
+	for aid, h in items: byHash.setdefault(h, []).append(aid)
+
+	uniq = list(byHash.keys())
+	d = dsu.DSU()
+	for i in range(len(uniq)): d.find(i)
+
+	if r > 0 and len(uniq) > 1:
+		idx = HamIdx(list(enumerate(uniq)), r)
+		for i, h in enumerate(uniq):
+			for j, _ in idx.near(h):
+				if j != i: d.union(i, j)
+
+	comps = [sorted(aid for i in m for aid in byHash[uniq[i]]) for m in d.sets()]
+	return sorted([g for g in comps if len(g) > 1], key=lambda g: g[0])
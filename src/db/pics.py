@@ -1,35 +1,41 @@
 import json
+import time
 import sqlite3
 from contextlib import contextmanager
+from dataclasses import dataclass, field
 from sqlite3 import Cursor
-from typing import Optional, List
+from typing import Dict, Iterator, Optional, List, Tuple
 
 from conf import envs
 from mod import models
 from mod.models import BaseDictModel
 from util import log
 from util.err import mkErr, tracebk
-from db import psql
+from db import psql, lite
 
 lg = log.get(__name__)
 
 pathDb = envs.ddupData + 'pics.db'
 
 
+def _onOpen(conn: sqlite3.Connection):
+	conn.row_factory = sqlite3.Row
+	conn.execute("PRAGMA foreign_keys = ON")
+	conn.execute("PRAGMA temp_store=MEMORY")
+	conn.execute("PRAGMA recursive_triggers = ON")  # INSERT OR REPLACE fires the delete trigger of what it replaces, keeps simCnt right
+
+_pool = lite.Pool(lambda: pathDb, _onOpen)
+
+
 @contextmanager
 def mkConn():
-	"""Context manager for database connections"""
-	conn = None
-	try:
-		conn = sqlite3.connect(pathDb, check_same_thread=False, timeout=30.0)
-		conn.row_factory = sqlite3.Row
-		conn.execute("PRAGMA foreign_keys = ON")
-		conn.execute("PRAGMA busy_timeout=30000")
-		conn.execute("PRAGMA synchronous=NORMAL")
-		conn.execute("PRAGMA temp_store=MEMORY")
-		yield conn
-	finally:
-		if conn: conn.close()
+	"""Context manager for database connections, pooled and kept open between uses"""
+	with _pool.conn() as conn: yield conn
+
+
+def close():
+	_pool.reset()
+	return True
 
 
 
@@ -56,7 +62,9 @@ _SCHEMAS = {
 		pathVdo          TEXT,
 		jsonExif         TEXT Default '{}',
 		isVectored       INTEGER Default 0,
-		simOk            INTEGER Default 0
+		simOk            INTEGER Default 0,
+		phash            INTEGER,
+		simCnt           INTEGER Default 0
 	''',
 	'assetsGrps': '''
 		autoId   INTEGER NOT NULL REFERENCES assets(autoId) ON DELETE CASCADE,
@@ -71,12 +79,38 @@ _SCHEMAS = {
 		isSelf   INTEGER DEFAULT 0,
 		PRIMARY KEY (autoId, simAid)
 	''',
+	# top-k neighbours of a graph build down to dto.simFloor, assetsSims is re-derived from it when thMin moves
+	'simsNbrs': '''
+		autoId   INTEGER NOT NULL REFERENCES assets(autoId) ON DELETE CASCADE,
+		simAid   INTEGER NOT NULL REFERENCES assets(autoId) ON DELETE CASCADE,
+		score    REAL NOT NULL,
+		PRIMARY KEY (autoId, simAid)
+	''',
 	'libraries': '''
 		id          TEXT Primary Key,
 		name        TEXT,
 		ownerId     TEXT,
 		importPaths TEXT Default '[]'
 	''',
+	# aids confirmed in qdrant but not yet marked isVectored, see addVecJrnl / flushVecJrnl
+	'vecsJrnl': '''
+		autoId   INTEGER Primary Key REFERENCES assets(autoId) ON DELETE CASCADE,
+		coll     TEXT NOT NULL,
+		phash    INTEGER
+	''',
+	# autoIds claimed by a vectorize worker until the lease expires, see claimNonVector
+	'vecsLease': '''
+		autoId   INTEGER Primary Key REFERENCES assets(autoId) ON DELETE CASCADE,
+		worker   TEXT NOT NULL,
+		until    REAL NOT NULL
+	''',
+	'vecsWorkers': '''
+		name     TEXT Primary Key,
+		done     INTEGER Default 0,
+		erro     INTEGER Default 0,
+		speed    REAL Default 0,
+		seen     REAL NOT NULL
+	''',
 }
 
 # auto-key columns: autoId (AUTOINCREMENT) and PRIMARY KEY columns
@@ -164,10 +198,13 @@ def init():
 
 			c.execute("PRAGMA table_info(assets)")
 			cols = {row[1] for row in c.fetchall()}
+			needCnt = bool(cols) and 'simCnt' not in cols  # a fresh table starts at 0 like its empty assetsSims
 
 			if 'simGIDs' in cols or 'simInfos' in cols:
 				_migrateSims(conn)
+				needCnt = True  # the legacy simCnt column is dropped, count again
 				conn.commit()
+				_pool.reset()
 			else:
 				for tbl, schema in _SCHEMAS.items():
 					c.execute(f"CREATE TABLE IF NOT EXISTS {tbl} ({schema})")
@@ -177,12 +214,26 @@ def init():
 			c.execute('''CREATE INDEX IF NOT EXISTS idx_assets_isVectored ON assets(isVectored)''')
 			c.execute('''CREATE INDEX IF NOT EXISTS idx_assets_simOk ON assets(simOk)''')
 			c.execute('''CREATE INDEX IF NOT EXISTS idx_assets_id ON assets(id)''')
+			c.execute('''CREATE INDEX IF NOT EXISTS idx_assets_phash ON assets(phash) WHERE phash IS NOT NULL''')
 
 			c.execute('''CREATE INDEX IF NOT EXISTS idx_ass_grp_groupId ON assetsGrps(groupId)''')
 			c.execute('''CREATE INDEX IF NOT EXISTS idx_ass_grp_isMain ON assetsGrps(isMain) WHERE isMain = 1''')
 
 			c.execute('''CREATE INDEX IF NOT EXISTS idx_ass_sim_simAid ON assetsSims(simAid)''')
 			c.execute('''CREATE INDEX IF NOT EXISTS idx_ass_sim_score ON assetsSims(autoId, score DESC)''')
+			c.execute('''CREATE INDEX IF NOT EXISTS idx_sims_nbr_simAid ON simsNbrs(simAid)''')
+
+			# assets.simCnt mirrors the assetsSims row count, pending lists are served from idx_assets_pnd
+			c.execute('''CREATE TRIGGER IF NOT EXISTS trg_sims_cnt_ins AFTER INSERT ON assetsSims BEGIN
+				UPDATE assets SET simCnt = simCnt + 1 WHERE autoId = NEW.autoId; END''')
+			c.execute('''CREATE TRIGGER IF NOT EXISTS trg_sims_cnt_del AFTER DELETE ON assetsSims BEGIN
+				UPDATE assets SET simCnt = simCnt - 1 WHERE autoId = OLD.autoId; END''')
+			if needCnt:
+				lg.info("[pics:migration] counting assetsSims into assets.simCnt")
+				c.execute("UPDATE assets SET simCnt = (SELECT COUNT(*) FROM assetsSims s WHERE s.autoId = assets.autoId)")
+			# simOk leads so the planner takes it over idx_assets_simOk without a hint
+			c.execute('''DROP INDEX IF EXISTS idx_assets_pending''')
+			c.execute('''CREATE INDEX IF NOT EXISTS idx_assets_pnd ON assets(simOk, simCnt DESC, autoId) WHERE simCnt > 1''')
 
 			conn.commit()
 
@@ -191,12 +242,19 @@ def init():
 		return True
 	except Exception as e: raise mkErr("Failed to initialize pics database", e)
 
+def _nbrsCleared():
+	'''simsNbrs got emptied, regroup has nothing to derive from until the graph is built again'''
+	import db
+	db.dto.simNbrsFloor = 0
+
 def clearAll():
 	try:
 		with mkConn() as conn:
 			c = conn.cursor()
 			for tbl in reversed(list(_SCHEMAS.keys())): c.execute(f"Drop Table If Exists {tbl}")
 			conn.commit()
+		_nbrsCleared()
+		_pool.reset()
 		return init()
 	except Exception as e: raise mkErr("Failed to clear pics database", e)
 
@@ -291,6 +349,39 @@ def getByAutoId(autoId) -> models.Asset:
 	except Exception as e: raise mkErr("Failed to get asset by autoId", e)
 
 
+def getByAutoIds(aids: List[int], chunk=500) -> Dict[int, models.Asset]:
+	'''assets with sim fields by autoId, one grouped join per chunk, missing aids are left out'''
+	rst: Dict[int, models.Asset] = {}
+	if not aids: return rst
+	try:
+		with mkConn() as conn:
+			c = conn.cursor()
+			aids = list(dict.fromkeys(aids))
+			for i in range(0, len(aids), chunk):
+				part = aids[i:i + chunk]
+				qargs = ','.join(['?' for _ in part])
+				c.execute(f"""
+					SELECT a.*, g._simGIDs, s._simInfosJson
+					FROM assets a
+					LEFT JOIN (
+						SELECT autoId, GROUP_CONCAT(DISTINCT groupId) as _simGIDs FROM assetsGrps
+						WHERE autoId IN ({qargs}) GROUP BY autoId
+					) g ON g.autoId = a.autoId
+					LEFT JOIN (
+						SELECT autoId, json_group_array(json_object('aid', simAid, 'score', score, 'isSelf', isSelf)) as _simInfosJson
+						FROM (SELECT autoId, simAid, score, isSelf FROM assetsSims WHERE autoId IN ({qargs}) ORDER BY autoId, score DESC)
+						GROUP BY autoId
+					) s ON s.autoId = a.autoId
+					WHERE a.autoId IN ({qargs})
+				""", part * 3)
+				for row in c.fetchall():
+					asset = models.Asset.fromDB(c, row)
+					_fillSimFields(asset, row)
+					rst[asset.autoId] = asset
+			return rst
+	except Exception as e: raise mkErr(f"Failed to get assets by autoIds count[{len(aids)}]", e)
+
+
 def _fillSimFields(asset: models.Asset, row):
 	"""Fill simGIDs and simInfos from query result"""
 	simGIDsStr = row['_simGIDs'] if '_simGIDs' in row.keys() else None
@@ -370,6 +461,17 @@ def getAll(count=0) -> list[models.Asset]:
 	except Exception as e: raise mkErr("Failed to get all assets", e)
 
 
+def getSample(count: int) -> list[models.Asset]:
+	try:
+		with mkConn() as conn:
+			c = conn.cursor()
+			c.execute("Select * From assets ORDER BY RANDOM() LIMIT ?", (count,))
+			rows = c.fetchall()
+			if not rows: return []
+			return [models.Asset.fromDB(c, row) for row in rows]
+	except Exception as e: raise mkErr("Failed to get sample assets", e)
+
+
 def getAllNonVector() -> list[models.Asset]:
 	try:
 		with mkConn() as conn:
@@ -383,6 +485,15 @@ def getAllNonVector() -> list[models.Asset]:
 	except Exception as e: raise mkErr("Failed to get non-vector assets", e)
 
 
+def countNonVector() -> int:
+	try:
+		with mkConn() as conn:
+			c = conn.cursor()
+			c.execute("Select Count(*) From assets WHERE isVectored=0")
+			return c.fetchone()[0]
+	except Exception as e: raise mkErr("Failed to count non-vector assets", e)
+
+
 #------------------------------------------------------------------------
 # paged
 #------------------------------------------------------------------------
@@ -481,16 +592,120 @@ def getFiltered(usrId="", opts="all", search="", pathFilter="", onlyFav=False, o
 # update
 #========================================================================
 
+#------------------------------------------------------------------------
+# vector journal: written right after each confirmed qdrant upsert,
+# moved into assets.isVectored in one transaction, replayed after a crash
+#------------------------------------------------------------------------
+def addVecJrnl(assets: List[models.Asset], coll: str):
+	try:
+		if not assets: return
+		with mkConn() as conn:
+			# assets deleted meanwhile are skipped instead of failing the batch on the foreign key
+			conn.executemany("INSERT OR REPLACE INTO vecsJrnl (autoId, coll, phash) SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM assets WHERE autoId = ?)", [(a.autoId, coll, a.phash, a.autoId) for a in assets])
+			conn.commit()
+	except Exception as e: raise mkErr(f"Failed to journal vectored assets count[{len(assets)}]", e)
+
+
+def flushVecJrnl(coll: str) -> int:
+	'''mark journaled aids of the given collection as vectored, entries of other collections are stale and dropped'''
+	try:
+		with mkConn() as conn:
+			c = conn.cursor()
+			c.execute("""
+				UPDATE assets SET isVectored = 1,
+					phash = COALESCE((SELECT j.phash FROM vecsJrnl j WHERE j.autoId = assets.autoId), phash)
+				WHERE autoId IN (SELECT autoId FROM vecsJrnl WHERE coll = ?)
+			""", (coll,))
+			cnt = c.rowcount
+			c.execute("DELETE FROM vecsLease WHERE autoId IN (SELECT autoId FROM vecsJrnl)")
+			c.execute("DELETE FROM vecsJrnl")
+			conn.commit()
+			return cnt
+	except Exception as e: raise mkErr(f"Failed to apply vector journal of coll[{coll}]", e)
+
+
+#------------------------------------------------------------------------
+# vectorize leases: workers (threads, processes or hosts sharing the data dir)
+# claim pending autoIds for a while, expired leases are free to claim again
+#------------------------------------------------------------------------
+def claimNonVector(worker: str, cnt=64, ttl=600.0) -> List[models.Asset]:
+	'''claim up to cnt pending assets and renew the leases this worker still holds'''
+	try:
+		now = time.time()
+		with mkConn() as conn:
+			c = conn.cursor()
+			c.execute("BEGIN IMMEDIATE")
+			c.execute("UPDATE vecsLease SET until = ? WHERE worker = ?", (now + ttl, worker))
+			c.execute("""
+				SELECT autoId, id, pathThumbnail, pathPreview FROM assets a
+				WHERE a.isVectored = 0
+					AND NOT EXISTS (SELECT 1 FROM vecsLease l WHERE l.autoId = a.autoId AND (l.until > ? OR l.worker = ?))
+					AND NOT EXISTS (SELECT 1 FROM vecsJrnl j WHERE j.autoId = a.autoId)
+				ORDER BY a.autoId LIMIT ?
+			""", (now, worker, cnt))
+			rows = c.fetchall()
+			c.executemany("INSERT OR REPLACE INTO vecsLease (autoId, worker, until) VALUES (?, ?, ?)", [(r[0], worker, now + ttl) for r in rows])
+			conn.commit()
+		return [models.Asset(autoId=aid, id=assId, pathThumbnail=pThumb, pathPreview=pPrev) for aid, assId, pThumb, pPrev in rows]
+	except Exception as e: raise mkErr(f"Failed to claim non-vector assets for worker[{worker}]", e)
+
+
+def iterClaimed(worker: str, chunk=64, ttl=600.0) -> Iterator[models.Asset]:
+	'''claims lazily as the consumer pulls, ends when nothing is left to claim'''
+	while True:
+		assets = claimNonVector(worker, chunk, ttl)
+		if not assets: return
+		yield from assets
+
+
+def releaseLeases(worker: str):
+	try:
+		with mkConn() as conn:
+			conn.execute("DELETE FROM vecsLease WHERE worker = ?", (worker,))
+			conn.commit()
+	except Exception as e: raise mkErr(f"Failed to release leases of worker[{worker}]", e)
+
+
+def countLeased(exclude: str = "") -> int:
+	'''live leases, optionally without the ones of given worker'''
+	try:
+		with mkConn() as conn:
+			c = conn.cursor()
+			c.execute("SELECT COUNT(*) FROM vecsLease WHERE until > ? AND worker != ?", (time.time(), exclude))
+			return c.fetchone()[0]
+	except Exception as e: raise mkErr("Failed to count vector leases", e)
+
+
+def setWorkerStat(name: str, done: int, erro: int, speed: float):
+	try:
+		with mkConn() as conn:
+			conn.execute("INSERT OR REPLACE INTO vecsWorkers (name, done, erro, speed, seen) VALUES (?, ?, ?, ?, ?)", (name, done, erro, speed, time.time()))
+			conn.commit()
+	except Exception as e: lg.warn(f"[pics] worker stat not saved: {str(e)}")
+
+
+def getWorkerStats(within=30.0) -> List[dict]:
+	'''workers that reported in the last `within` seconds'''
+	try:
+		with mkConn() as conn:
+			c = conn.cursor()
+			c.execute("SELECT name, done, erro, speed, seen FROM vecsWorkers WHERE seen > ? ORDER BY name", (time.time() - within,))
+			return [dict(r) for r in c.fetchall()]
+	except Exception as e: raise mkErr("Failed to get worker stats", e)
+
+
 def setVectoredBy(asset: models.Asset, done=1, cur: Optional[Cursor]=None):
+	# phash is computed along with the vector, keep the stored one when not given
+	sql, args = "UPDATE assets SET isVectored=?, phash=COALESCE(?, phash) WHERE id = ?", (done, asset.phash, asset.id)
 	try:
 		if cur:
 			# Use provided cursor (for transactions)
-			cur.execute("UPDATE assets SET isVectored=? WHERE id = ?", (done, asset.id))
+			cur.execute(sql, args)
 		else:
 			# Use context manager for standalone operation
 			with mkConn() as conn:
 				c = conn.cursor()
-				c.execute("UPDATE assets SET isVectored=? WHERE id = ?", (done, asset.id))
+				c.execute(sql, args)
 				conn.commit()
 	except Exception as e: raise mkErr(f"Failed to update vector status for asset[{asset.id}]", e)
 
@@ -615,6 +830,256 @@ def getAnyNonSim(exclAids=[]) -> Optional[models.Asset]:
 	except Exception as e: raise mkErr("Failed to get non-sim asset", e)
 
 
+def getAllHashes() -> List[tuple]:
+	'''(autoId, phash) of vectored assets not searched yet'''
+	try:
+		with mkConn() as conn:
+			c = conn.cursor()
+			c.execute("""
+				SELECT a.autoId, a.phash FROM assets a
+				WHERE a.isVectored = 1 AND a.simOk != 1 AND a.phash IS NOT NULL
+				AND NOT EXISTS (SELECT 1 FROM assetsSims si WHERE si.autoId = a.autoId)
+			""")
+			return [(r[0], r[1]) for r in c.fetchall()]
+	except Exception as e: raise mkErr("Failed to get asset hashes", e)
+
+
+def setSimGroup(rootGID: int, infosBy: Dict[int, List[models.SimInfo]]):
+	'''write a whole group in one transaction, members stay pending (simOk=0)'''
+	bat = SimBatch()
+	bat.setGroup(rootGID, infosBy)
+	bat.flush()
+
+
+@dataclass
+class SimBatch:
+	'''
+	unit of work of one search seed: group and sim rows are collected in memory and flush() writes
+	them with executemany in one transaction, a batch dropped without flush (cancel) writes nothing
+	'''
+	grps: Dict[Tuple[int, int], int] = field(default_factory=dict)  # (autoId, groupId) → isMain
+	sims: Dict[int, Tuple[List[models.SimInfo], int]] = field(default_factory=dict)  # autoId → (infos, simOk), last write wins
+
+	def setGID(self, autoId: int, GID: int):
+		self.grps.setdefault((autoId, GID), 1 if autoId == GID else 0)
+
+	def setInfos(self, autoId: int, infos: List[models.SimInfo], isOk=0):
+		if not infos: raise RuntimeError(f"Can't setSimInfos id[{autoId}] by [{type(infos)}], {tracebk.format_exc()}")
+		self.sims[autoId] = (infos, isOk)
+
+	def setGroup(self, rootGID: int, infosBy: Dict[int, List[models.SimInfo]]):
+		for aid, infos in infosBy.items():
+			self.setGID(aid, rootGID)
+			self.setInfos(aid, infos)
+
+	def flush(self) -> int:
+		'''returns the count of assets written, the batch is empty afterwards'''
+		if not self.grps and not self.sims: return 0
+		try:
+			with mkConn() as conn:
+				c = conn.cursor()
+				c.executemany("INSERT OR IGNORE INTO assetsGrps (autoId, groupId, isMain) VALUES (?, ?, ?)", [(a, g, m) for (a, g), m in self.grps.items()])
+				c.executemany("DELETE FROM assetsSims WHERE autoId = ?", [(a,) for a in self.sims])
+				c.executemany(
+					"INSERT INTO assetsSims (autoId, simAid, score, isSelf) VALUES (?, ?, ?, ?)",
+					[(a, i.aid, i.score, 1 if i.isSelf else 0) for a, (infos, _) in self.sims.items() for i in infos]
+				)
+				c.executemany("UPDATE assets SET simOk = ? WHERE autoId = ?", [(ok, a) for a, (_, ok) in self.sims.items()])
+				conn.commit()
+			cnt = len(self.sims)
+			self.grps.clear()
+			self.sims.clear()
+			return cnt
+		except Exception as e: raise mkErr(f"Failed to write sim batch grps[{len(self.grps)}] sims[{len(self.sims)}]", e)
+
+
+def getGraphNodes() -> List[tuple]:
+	'''(autoId, isVectored, simOk, originalFileName) of every asset'''
+	try:
+		with mkConn() as conn:
+			c = conn.cursor()
+			c.execute("SELECT autoId, isVectored, simOk, originalFileName FROM assets ORDER BY autoId")
+			return [tuple(r) for r in c.fetchall()]
+	except Exception as e: raise mkErr("Failed to get graph nodes", e)
+
+
+def delSimNbrs(srcs: List[int]):
+	'''drop the stored neighbours of srcs before a graph build writes them again'''
+	try:
+		with mkConn() as conn:
+			conn.executemany("DELETE FROM simsNbrs WHERE autoId = ?", [(a,) for a in srcs])
+			conn.commit()
+	except Exception as e: raise mkErr(f"Failed to delete sim neighbours srcs[{len(srcs)}]", e)
+
+
+def addSimNbrs(rows: List[tuple]):
+	'''one block of a graph build in one transaction, rows: (autoId, simAid, score) with the self rows included'''
+	try:
+		with mkConn() as conn:
+			conn.executemany("INSERT INTO simsNbrs (autoId, simAid, score) VALUES (?, ?, ?)", rows)
+			conn.commit()
+	except Exception as e: raise mkErr(f"Failed to add sim neighbours rows[{len(rows)}]", e)
+
+
+def setSimFromNbrs(thMin: float) -> int:
+	'''
+	re-derive the search records of pending assets covered by simsNbrs at thMin, no vector query involved
+	auto-resolved assets (records kept, see setSimAutoMark) are reopened first,
+	those resolved by the user have no records left and stay resolved
+	returns the pending assets re-derived
+	'''
+	try:
+		with mkConn() as conn:
+			c = conn.cursor()
+			c.execute("""
+				UPDATE assets SET simOk = 0
+				WHERE simOk = 1
+					AND EXISTS (SELECT 1 FROM simsNbrs n WHERE n.autoId = assets.autoId AND n.simAid = assets.autoId)
+					AND EXISTS (SELECT 1 FROM assetsSims si WHERE si.autoId = assets.autoId AND si.isSelf = 1)
+			""")
+			c.execute("""
+				DELETE FROM assetsSims WHERE autoId IN (
+					SELECT n.autoId FROM simsNbrs n INNER JOIN assets a ON a.autoId = n.autoId
+					WHERE n.simAid = n.autoId AND a.simOk = 0
+				)
+			""")
+			c.execute("""
+				INSERT INTO assetsSims (autoId, simAid, score, isSelf)
+				SELECT n.autoId, n.simAid, n.score, n.autoId = n.simAid FROM simsNbrs n
+				INNER JOIN assets a ON a.autoId = n.autoId
+				WHERE a.simOk = 0 AND (n.score >= ? OR n.autoId = n.simAid)
+			""", (thMin,))
+			c.execute("SELECT COUNT(*) FROM simsNbrs n INNER JOIN assets a ON a.autoId = n.autoId WHERE n.simAid = n.autoId AND a.simOk = 0")
+			cnt = c.fetchone()[0]
+			conn.commit()
+			return cnt
+	except Exception as e: raise mkErr(f"Failed to set sims from neighbours thMin[{thMin}]", e)
+
+
+def getSimEdges(thMin: float, aids: Optional[List[int]]=None, chunk=500) -> List[tuple]:
+	'''
+	(autoId, simAid, score, simOk of simAid) stored for pending assets, self rows left out
+	with aids only the edges from or to them
+	'''
+	sql = """
+		SELECT si.autoId, si.simAid, si.score, b.simOk FROM assetsSims si
+		INNER JOIN assets a ON a.autoId = si.autoId
+		INNER JOIN assets b ON b.autoId = si.simAid
+		WHERE a.simOk = 0 AND si.isSelf = 0 AND si.score >= ?
+	"""
+	try:
+		with mkConn() as conn:
+			c = conn.cursor()
+			if aids is None:
+				c.execute(sql, (thMin,))
+				return [tuple(r) for r in c.fetchall()]
+
+			rst = []
+			for i in range(0, len(aids), chunk):
+				part = aids[i:i + chunk]
+				qargs = ','.join(['?' for _ in part])
+				c.execute(sql + f" AND (si.autoId IN ({qargs}) OR si.simAid IN ({qargs}))", [thMin] + part + part)
+				rst.extend(tuple(r) for r in c.fetchall())
+			return rst
+	except Exception as e: raise mkErr(f"Failed to get sim edges thMin[{thMin}]", e)
+
+
+def getGrpMembers(aids: List[int], chunk=500) -> List[int]:
+	'''autoIds of every group any of aids belongs to'''
+	try:
+		with mkConn() as conn:
+			c = conn.cursor()
+			rst = set()
+			for i in range(0, len(aids), chunk):
+				part = aids[i:i + chunk]
+				qargs = ','.join(['?' for _ in part])
+				c.execute(f"SELECT autoId FROM assetsGrps WHERE groupId IN (SELECT groupId FROM assetsGrps WHERE autoId IN ({qargs}))", part)
+				rst.update(r[0] for r in c.fetchall())
+			return sorted(rst)
+	except Exception as e: raise mkErr(f"Failed to get group members of aids count[{len(aids)}]", e)
+
+
+def setSimGrps(grps: Dict[int, List[int]], oks: List[int], aids: Optional[List[int]]=None):
+	'''
+	replace the groups of all pending assets in one transaction, grps: main autoId -> members, oks are marked resolved
+	with aids only the groups of those assets are replaced
+	'''
+	try:
+		with mkConn() as conn:
+			c = conn.cursor()
+			if aids is None: c.execute("DELETE FROM assetsGrps WHERE autoId IN (SELECT autoId FROM assets WHERE simOk = 0)")
+			else: c.executemany("DELETE FROM assetsGrps WHERE autoId = ?", [(a,) for a in aids])
+			c.executemany("INSERT OR IGNORE INTO assetsGrps (autoId, groupId, isMain) VALUES (?, ?, ?)", [(a, gid, 1 if a == gid else 0) for gid, mems in grps.items() for a in mems])
+			c.executemany("UPDATE assets SET simOk = 1 WHERE autoId = ?", [(a,) for a in oks])
+			conn.commit()
+	except Exception as e: raise mkErr(f"Failed to set sim groups[{len(grps)}]", e)
+
+
+def getNonSimAids(aids: List[int], chunk=500) -> List[tuple]:
+	'''(autoId, originalFileName) of the given aids that are vectored but never searched, see getAnyNonSim'''
+	rst = []
+	try:
+		with mkConn() as conn:
+			c = conn.cursor()
+			aids = sorted(set(aids))
+			for i in range(0, len(aids), chunk):
+				part = aids[i:i + chunk]
+				c.execute(f"""
+					SELECT a.autoId, a.originalFileName FROM assets a
+					WHERE a.autoId IN ({','.join(['?' for _ in part])})
+					AND a.isVectored = 1 AND a.simOk != 1
+					AND NOT EXISTS (SELECT 1 FROM assetsSims si WHERE si.autoId = a.autoId)
+					ORDER BY a.autoId
+				""", part)
+				rst.extend(tuple(r) for r in c.fetchall())
+			return rst
+	except Exception as e: raise mkErr(f"Failed to get non-sim aids of count[{len(aids)}]", e)
+
+
+def addSimNew(rows: List[tuple], thMin: float, withNbrs: bool) -> List[int]:
+	'''
+	merge the hits of newly searched assets in one transaction, rows: (autoId, simAid, score) with self rows
+	the new assets get their records, searched neighbours get the reverse edge,
+	auto-resolved ones are reopened by it, assets resolved by the user are left alone
+	withNbrs also keeps them in simsNbrs, returns the neighbours that got a reverse edge
+	'''
+	try:
+		news = list(dict.fromkeys(r[0] for r in rows))
+		revs = [(b, a, sc) for a, b, sc in rows if a != b]
+		hits = [r for r in rows if r[0] == r[1] or r[2] >= thMin]
+		revHits = [r for r in revs if r[2] >= thMin]
+
+		with mkConn() as conn:
+			c = conn.cursor()
+			if withNbrs:
+				c.executemany("DELETE FROM simsNbrs WHERE autoId = ?", [(a,) for a in news])
+				c.executemany("INSERT OR REPLACE INTO simsNbrs (autoId, simAid, score) VALUES (?, ?, ?)", rows)
+				c.executemany(
+					"INSERT OR REPLACE INTO simsNbrs (autoId, simAid, score) SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM simsNbrs WHERE autoId = ? AND simAid = ?)",
+					[(b, a, sc, b, b) for b, a, sc in revs]
+				)
+
+			c.executemany("DELETE FROM assetsSims WHERE autoId = ?", [(a,) for a in news])
+			c.executemany("INSERT INTO assetsSims (autoId, simAid, score, isSelf) VALUES (?, ?, ?, ?)", [(a, b, sc, 1 if a == b else 0) for a, b, sc in hits])
+
+			c.executemany(
+				"UPDATE assets SET simOk = 0 WHERE autoId = ? AND simOk = 1 AND EXISTS (SELECT 1 FROM assetsSims WHERE autoId = ? AND isSelf = 1)",
+				[(b, b) for b, _, _ in revHits]
+			)
+			# reverse edges only go to pending neighbours that were searched (have a self row)
+			revAids = list(dict.fromkeys(b for b, _, _ in revHits))
+			touched = set()
+			for i in range(0, len(revAids), 500):
+				part = revAids[i:i + 500]
+				qargs = ','.join(['?' for _ in part])
+				c.execute(f"SELECT a.autoId FROM assets a WHERE a.autoId IN ({qargs}) AND a.simOk = 0 AND EXISTS (SELECT 1 FROM assetsSims s WHERE s.autoId = a.autoId AND s.isSelf = 1)", part)
+				touched.update(r[0] for r in c.fetchall())
+			c.executemany("INSERT OR REPLACE INTO assetsSims (autoId, simAid, score, isSelf) VALUES (?, ?, ?, 0)", [(b, a, sc) for b, a, sc in revHits if b in touched])
+			conn.commit()
+			return sorted(touched)
+	except Exception as e: raise mkErr(f"Failed to add sims of new assets rows[{len(rows)}]", e)
+
+
 def countSimOk(isOk=0):
 	try:
 		with mkConn() as conn:
@@ -626,6 +1091,18 @@ def countSimOk(isOk=0):
 	except Exception as e: raise mkErr(f"Failed to count assets with simOk[{isOk}]", e)
 
 
+def getSimOkIds(aids: List[int]) -> set:
+	'''the given aids already resolved (simOk=1)'''
+	try:
+		if not aids: return set()
+		with mkConn() as conn:
+			c = conn.cursor()
+			qargs = ','.join(['?' for _ in aids])
+			c.execute(f"SELECT autoId FROM assets WHERE simOk = 1 AND autoId IN ({qargs})", aids)
+			return {r[0] for r in c.fetchall()}
+	except Exception as e: raise mkErr(f"Failed to get simOk of aids count[{len(aids)}]", e)
+
+
 def setSimGIDs(autoId: int, GID: int):
 	try:
 		with mkConn() as conn:
@@ -650,51 +1127,40 @@ def hasSimGIDs(autoId: int) -> bool:
 
 
 def setSimInfos(autoId: int, infos: List[models.SimInfo], isOk=0):
-	if not infos or len(infos) <= 0: raise RuntimeError(f"Can't setSimInfos id[{autoId}] by [{type(infos)}], {tracebk.format_exc()}")
-
-	try:
-		with mkConn() as conn:
-			c = conn.cursor()
-
-			# clear old simInfos
-			c.execute("DELETE FROM assetsSims WHERE autoId = ?", (autoId,))
-
-			# insert new
-			for info in infos:
-				c.execute(
-					"INSERT INTO assetsSims (autoId, simAid, score, isSelf) VALUES (?, ?, ?, ?)",
-					(autoId, info.aid, info.score, 1 if info.isSelf else 0)
-				)
-
-			# update simOk
-			c.execute("UPDATE assets SET simOk = ? WHERE autoId = ?", (isOk, autoId))
-
-			conn.commit()
-	except Exception as e: raise mkErr("Failed to set similar IDs", e)
+	bat = SimBatch()
+	bat.setInfos(autoId, infos, isOk)
+	bat.flush()
 
 
 def deleteBy(assets: List[models.Asset]):
+	'''
+	set-based: the deleted autoIds go to a temp table, deletes join it and only the assets
+	that lost a neighbour are checked for auto-resolve
+	'''
 	try:
 		cntAll = len(assets)
+		aids = [ass.autoId for ass in assets]
+		if not aids: raise RuntimeError(f"No asset IDs found")
+
 		with mkConn() as conn:
 			c = conn.cursor()
+			c.execute("DROP TABLE IF EXISTS temp._delAids")
+			c.execute("DROP TABLE IF EXISTS temp._delAffs")
+			c.execute("CREATE TEMP TABLE _delAids (autoId INTEGER Primary Key)")
+			c.executemany("INSERT OR IGNORE INTO _delAids (autoId) VALUES (?)", [(a,) for a in aids])
 
-			aids = [ass.autoId for ass in assets]
-
-			# get mainGIDs from assetsGrps
-			qargs = ','.join(['?' for _ in aids])
-			c.execute(f"""
-				SELECT DISTINCT groupId FROM assetsGrps
-				WHERE autoId IN ({qargs}) AND isMain = 1
-			""", aids)
+			c.execute("SELECT DISTINCT ag.groupId FROM assetsGrps ag JOIN _delAids d ON d.autoId = ag.autoId WHERE ag.isMain = 1")
 			mainGIDs = [row[0] for row in c.fetchall()]
 
-			# 1. Delete from assets (FK CASCADE auto deletes assetsGrps and assetsSims)
-			assIds = [ass.id for ass in assets]
-			if not assIds: raise RuntimeError(f"No asset IDs found")
+			# assets that lose a neighbour, taken before the cascade removes the rows
+			c.execute("""
+				CREATE TEMP TABLE _delAffs AS
+				SELECT DISTINCT si.autoId FROM assetsSims si JOIN _delAids d ON d.autoId = si.simAid
+				WHERE si.autoId NOT IN (SELECT autoId FROM _delAids)
+			""")
 
-			qargs2 = ','.join(['?' for _ in assIds])
-			c.execute(f"DELETE FROM assets WHERE id IN ({qargs2})", assIds)
+			# 1. Delete from assets (FK CASCADE auto deletes assetsGrps and assetsSims)
+			c.execute("DELETE FROM assets WHERE autoId IN (SELECT autoId FROM _delAids)")
 			count = c.rowcount
 
 			if count != cntAll: raise mkErr(f"Failed to delete assets({cntAll}) with affected[{count}]")
@@ -704,20 +1170,18 @@ def deleteBy(assets: List[models.Asset]):
 			vecs.deleteBy(aids)
 
 			# 3. Handle other assets' assetsSims referencing deleted assets
-			for delAid in aids:
-				# delete references in assetsSims
-				c.execute("DELETE FROM assetsSims WHERE simAid = ?", (delAid,))
+			c.execute("DELETE FROM assetsSims WHERE simAid IN (SELECT autoId FROM _delAids)")
 
-			# 4. Auto-resolve assets with only self remaining in assetsSims
+			# 4. Auto-resolve affected assets with only self remaining in assetsSims
 			c.execute("""
 				UPDATE assets SET simOk = 1
-				WHERE simOk = 0 AND autoId IN (
-					SELECT autoId FROM assetsSims
-					GROUP BY autoId
-					HAVING COUNT(*) = 1 AND MAX(isSelf) = 1
-				)
+				WHERE simOk = 0 AND simCnt = 1
+					AND autoId IN (SELECT autoId FROM _delAffs)
+					AND EXISTS (SELECT 1 FROM assetsSims si WHERE si.autoId = assets.autoId AND si.isSelf = 1)
 			""")
 
+			c.execute("DROP TABLE temp._delAids")
+			c.execute("DROP TABLE temp._delAffs")
 			conn.commit()
 			lg.info(f"[pics] delete by assIds[{cntAll}] rst[{count}] mainGIDs[{mainGIDs}]")
 
@@ -770,10 +1234,12 @@ def clearAllSimIds(keepSimOk=False):
 			else:
 				c.execute("DELETE FROM assetsGrps")
 				c.execute("DELETE FROM assetsSims")
+				c.execute("DELETE FROM simsNbrs")
 				c.execute("UPDATE assets SET simOk = 0")
 				lg.info(f"Cleared all similarity results")
 			conn.commit()
 			count = c.rowcount
+			if not keepSimOk: _nbrsCleared()
 			lg.info(f"Cleared similarity results for {count} assets")
 			return count
 	except Exception as e: raise mkErr("Failed to clear sim results", e)
@@ -805,8 +1271,7 @@ def getAnySimPending() -> Optional[models.Asset]:
 			c = conn.cursor()
 			c.execute("""
 				SELECT a.* FROM assets a
-				WHERE a.simOk = 0
-					AND (SELECT COUNT(*) FROM assetsSims si WHERE si.autoId = a.autoId) > 1
+				WHERE a.simOk = 0 AND a.simCnt > 1
 				LIMIT 1
 			""")
 			row = c.fetchone()
@@ -820,8 +1285,7 @@ def getAllSimOks(isOk=0) -> List[models.Asset]:
 			c = conn.cursor()
 			c.execute("""
 				SELECT a.* FROM assets a
-				WHERE a.simOk = ?
-					AND (SELECT COUNT(*) FROM assetsSims si WHERE si.autoId = a.autoId) > 1
+				WHERE a.simOk = ? AND a.simCnt > 1
 				ORDER BY a.autoId
 			""", (isOk,))
 			rows = c.fetchall()
@@ -837,10 +1301,30 @@ def clearAllVectored():
 		with mkConn() as cnn:
 			c = cnn.cursor()
 			c.execute("UPDATE assets SET isVectored=0")
+			c.execute("DELETE FROM simsNbrs")
+			c.execute("DELETE FROM vecsJrnl")
+			c.execute("DELETE FROM vecsLease")
 			cnn.commit()
+		_nbrsCleared()
 	except Exception as e: raise mkErr(f"Failed to set isVectored to 0", e)
 
 
+# noinspection SqlWithoutWhere
+def syncVectored(aids: List[int]):
+	'''isVectored follows the given aids, used when the active vector collection changes'''
+	try:
+		with mkConn() as cnn:
+			c = cnn.cursor()
+			c.execute("UPDATE assets SET isVectored=0")
+			c.executemany("UPDATE assets SET isVectored=1 WHERE autoId = ?", [(a,) for a in aids])
+			c.execute("DELETE FROM simsNbrs")
+			c.execute("DELETE FROM vecsJrnl")
+			c.execute("DELETE FROM vecsLease")
+			cnn.commit()
+		_nbrsCleared()
+	except Exception as e: raise mkErr(f"Failed to sync isVectored count[{len(aids)}]", e)
+
+
 # auto mark simOk=1 if simInfos only includes self
 def setSimAutoMark():
 	try:
@@ -1009,24 +1493,31 @@ def countSimPending():
 		with mkConn() as conn:
 			c = conn.cursor()
 			# Count groups with isMain=1 and simOk=0 and more than 1 assetsSims
+			# walks the mains only (idx_ass_grp_isMain), far fewer than the assets with sims
 			c.execute("""
-				SELECT COUNT(*) FROM assets a
-				WHERE a.simOk = 0
-					AND EXISTS (SELECT 1 FROM assetsGrps ag WHERE ag.autoId = a.autoId AND ag.isMain = 1)
-					AND (SELECT COUNT(*) FROM assetsSims si WHERE si.autoId = a.autoId) > 1
+				SELECT COUNT(DISTINCT ag.autoId) FROM assetsGrps ag
+				JOIN assets a ON a.autoId = ag.autoId
+				WHERE ag.isMain = 1 AND a.simOk = 0 AND a.simCnt > 1
 			""")
 			cnt = c.fetchone()[0]
 			return cnt
 	except Exception as e: raise mkErr(f"Failed to count assets pending", e)
 
 
-def getPagedPending(page=1, size=20) -> list[models.Asset]:
+def getPagedPending(page=1, size=20, after: Optional[Tuple[int, int]]=None) -> list[models.Asset]:
+	'''
+	pending group mains by sim count, walks idx_assets_pnd (+isMain keeps the check on the key)
+	and only builds the rows of the page
+	after: (simCnt, autoId) of the previous page's last row, a keyset that replaces the offset
+	'''
 	try:
 		with mkConn() as conn:
 			cursor = conn.cursor()
-			offset = (page - 1) * size
+			offset = 0 if after else (page - 1) * size
+			keyset = "AND (a.simCnt < ? OR (a.simCnt = ? AND a.autoId > ?))" if after else ""
+			args = (after[0], after[0], after[1]) if after else ()
 
-			cursor.execute("""
+			cursor.execute(f"""
 				SELECT a.*,
 						(SELECT json_group_array(json_object('aid', simAid, 'score', score, 'isSelf', isSelf))
 						FROM (SELECT simAid, score, isSelf FROM assetsSims WHERE autoId = a.autoId ORDER BY score DESC)
@@ -1034,13 +1525,16 @@ def getPagedPending(page=1, size=20) -> list[models.Asset]:
 						(SELECT COUNT(*) FROM assetsGrps ag2
 						WHERE ag2.groupId IN (SELECT groupId FROM assetsGrps WHERE autoId = a.autoId)
 							AND ag2.autoId != a.autoId) as cntRelats
-				FROM assets a
-				INNER JOIN assetsGrps ag ON a.autoId = ag.autoId AND ag.isMain = 1
-				WHERE a.simOk = 0
-					AND (SELECT COUNT(*) FROM assetsSims si WHERE si.autoId = a.autoId) > 1
-				ORDER BY (SELECT COUNT(*) FROM assetsSims si WHERE si.autoId = a.autoId) DESC, a.autoId
-				LIMIT ? OFFSET ?
-			""", (size, offset))
+				FROM (
+					SELECT a.autoId FROM assets a
+					WHERE a.simOk = 0 AND a.simCnt > 1 {keyset}
+						AND EXISTS (SELECT 1 FROM assetsGrps ag WHERE ag.autoId = a.autoId AND +ag.isMain = 1)
+					ORDER BY a.simCnt DESC, a.autoId
+					LIMIT ? OFFSET ?
+				) p
+				JOIN assets a ON a.autoId = p.autoId
+				ORDER BY a.simCnt DESC, a.autoId
+			""", (*args, size, offset))
 
 			leaders = []
 			for row in cursor.fetchall():
@@ -1050,6 +1544,4 @@ def getPagedPending(page=1, size=20) -> list[models.Asset]:
 				leaders.append(asset)
 
 			return leaders
-	except Exception as e:
-		lg.error(f"Error fetching assets: {str(e)}")
-		return []
+	except Exception as e: raise mkErr(f"Failed to get pending page[{page}] size[{size}] after[{after}]", e)
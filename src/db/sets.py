@@ -1,36 +1,34 @@
-import sqlite3
 from typing import Optional
 from contextlib import contextmanager
 
 from conf import envs
 from util import log
+from db import lite
 
 lg = log.get(__name__)
 
 pathDb = envs.ddupData + 'sets.db'
 _initialized = False
+_pool = lite.Pool(lambda: pathDb, maxIdle=4, cacheKb=2048, mmapMb=0)
 
 def _ensureInit():
 	global _initialized
 	if _initialized: return
-	conn = sqlite3.connect(pathDb, check_same_thread=False, timeout=30.0)
-	try:
+	with _pool.conn() as conn:
 		c = conn.cursor()
 		c.execute('Create Table If Not Exists settings ( key TEXT Primary Key, val TEXT )')
 		conn.commit()
-	finally: conn.close()
 	_initialized = True
 
 @contextmanager
 def mkConn():
 	_ensureInit()
-	conn = sqlite3.connect(pathDb, check_same_thread=False, timeout=30.0)
-	conn.execute("PRAGMA busy_timeout = 30000")
-	try: yield conn
-	finally: conn.close()
+	with _pool.conn() as conn: yield conn
 
 
-def close(): return True
+def close():
+	_pool.reset()
+	return True
 
 def init():
 	_ensureInit()
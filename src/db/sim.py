@@ -1,9 +1,14 @@
+import os
 import time
 from datetime import datetime
-from typing import List, Tuple, Set, Callable, Optional
+from typing import Dict, List, Tuple, Set, Callable, Optional
 from dataclasses import dataclass, field
 
+import numpy as np
+
 import db
+from db import phs, knn, dsu
+from conf import co, pathCache
 from mod import models
 from mod.models import IFnProg, IFnCancel
 from util import log
@@ -92,7 +97,7 @@ def findCandidate(autoId: int, taskArgs: dict) -> models.Asset:
 		assetId = taskArgs.get('assetId')
 		asset = db.pics.getById(assetId)
 		if asset: autoId = asset.autoId
-	else: asset = db.pics.getByAutoId(autoId) if autoId else None
+	else: asset = db.pics.getByAutoIds([autoId]).get(autoId) if autoId else None
 
 	if not autoId: raise RuntimeError(f"[tsk] sim.assAid is empty")
 
@@ -112,6 +117,23 @@ def searchBy(src: models.Asset, doRep: IFnProg, isCancel: IFnCancel, fromUrl: bo
 	sizeMax = (db.dto.muod.sz or 1) if not fromUrl else 1 #when fromUrl only process one
 	lg.info(f"[sim:sh] sz[{db.dto.muod.sz}] sizeMax[{sizeMax}] url[{fromUrl}]")
 
+	# byte-identical / re-encoded copies are grouped by hash first, vectors only handle the rest
+	if not fromUrl and db.dto.phs.on:
+		hgis = searchByHash(isCancel)
+		for gi in hgis[:sizeMax]:
+			assert gi.asset is not None
+			if db.dto.muod.on:
+				gi.assets = db.pics.getSimAssets(gi.asset.autoId, False)
+				for i, a in enumerate(gi.assets):
+					a.vw.muodId = grpIdx
+					a.vw.isMain = (i == 0)
+			else: gi.assets = db.pics.getSimAssets(gi.asset.autoId, db.dto.rtree)
+			gis.append(gi)
+			grpIdx += 1
+
+		if hgis: doRep(10, f"Grouped {len(hgis)} hash duplicate groups")
+		if ass and db.pics.hasSimGIDs(ass.autoId): ass = None
+
 	while len(gis) < sizeMax:
 		if isCancel():
 			lg.info(f"[sim:sh] user cancelled")
@@ -131,7 +153,7 @@ def searchBy(src: models.Asset, doRep: IFnProg, isCancel: IFnCancel, fromUrl: bo
 		doRep(prog, f"Searching group {len(gis) + 1}/{sizeMax} - Asset #{ass.autoId}")
 
 		try:
-			gi = findGroupBy(ass, doRep, grpIdx, fromUrl, ls)
+			gi = findGroupBy(ass, doRep, grpIdx, fromUrl, ls, isCancel)
 
 			if not gi.assets:
 				if fromUrl:
@@ -169,7 +191,60 @@ def searchBy(src: models.Asset, doRep: IFnProg, isCancel: IFnCancel, fromUrl: bo
 	return gis
 
 
-def findGroupBy(asset: models.Asset, doReport: IFnProg, grpId: int, fromUrl=False, ls: Optional[LogStep]=None) -> SearchInfo:
+def searchByHash(isCancel: IFnCancel) -> List[SearchInfo]:
+	'''
+	form groups of exact / re-encoded duplicates from perceptual hashes
+	hash neighbours are only candidates: pairs are scored by the cosine of their vectors and kept
+	at thMin like the vector search, so stored scores stay comparable for regroup / graph
+	all qualifying groups are written (pending), SearchInfo.assets is left to the caller
+	'''
+	t0 = time.time()
+	thMin = db.dto.thMin
+	items = db.pics.getAllHashes()
+	comps = phs.groups(items, db.dto.phs.dist)
+	tIdx = time.time() - t0
+
+	gis = []
+	for aids in comps:
+		if isCancel(): break
+
+		# degenerate hashes (blank / flat images) are left to the vector search
+		if len(aids) > db.dto.rtreeMax: continue
+
+		vecBy = db.vecs.getAllBy(aids)
+		ids = [aid for aid in aids if aid in vecBy]
+		if len(ids) < 2: continue
+		mat = np.asarray([vecBy[aid] for aid in ids], dtype=np.float32)
+		mat /= np.maximum(np.linalg.norm(mat, axis=1, keepdims=True), 1e-12)
+		cos = mat @ mat.T
+
+		edges = [(ids[i], ids[j], float(cos[i, j])) for i in range(len(ids)) for j in range(i + 1, len(ids)) if cos[i, j] >= thMin]
+		scoreOf = {(a, b): sc for a, b, sc in edges} | {(b, a): sc for a, b, sc in edges}
+
+		for mems in dsu.groups(edges):
+			byAid = db.pics.getByAutoIds(mems)
+			assets = [byAid[aid] for aid in mems if aid in byAid and not db.dto.checkIsExclude(byAid[aid])]
+			if len(assets) < 2: continue
+
+			condOk, _ = checkGroupConds(assets)
+			if not condOk: continue
+
+			if db.dto.pathFilter and not any(db.dto.pathFilter in (a.originalPath or '') for a in assets): continue
+
+			root = assets[0]
+			infosBy = {}
+			for a in assets:
+				hits = sorted(((b.autoId, scoreOf[(a.autoId, b.autoId)]) for b in assets if (a.autoId, b.autoId) in scoreOf), key=lambda h: -h[1])
+				infosBy[a.autoId] = [models.SimInfo(a.autoId, 1.0, True)] + [models.SimInfo(aid, sc, False) for aid, sc in hits]
+			db.pics.setSimGroup(root.autoId, infosBy)
+
+			gis.append(SearchInfo(asset=root, bseInfos=infosBy[root.autoId], simAids=[a.autoId for a in assets[1:]]))
+
+	lg.info(f"[sim:hash] hashes[{len(items)}] dist[{db.dto.phs.dist}] thMin[{thMin}] comps[{len(comps)}] groups[{len(gis)}] index({int(tIdx * 1000)}ms) all({int((time.time() - t0) * 1000)}ms)")
+	return gis
+
+
+def findGroupBy(asset: models.Asset, doReport: IFnProg, grpId: int, fromUrl=False, ls: Optional[LogStep]=None, isCancel: Optional[IFnCancel]=None) -> SearchInfo:
 	result = SearchInfo()
 	result.asset = asset
 	thMin = db.dto.thMin
@@ -185,13 +260,10 @@ def findGroupBy(asset: models.Asset, doReport: IFnProg, grpId: int, fromUrl=Fals
 		return result
 
 	simAids = [i.aid for i in bseInfos if not i.isSelf]
+	byAid = db.pics.getByAutoIds(simAids)
 
 	if db.dto.excl.on and db.dto.excl.filNam:
-		filteredAids = []
-		for aid in simAids:
-			simAsset = db.pics.getByAutoId(aid)
-			if simAsset and not db.dto.checkIsExclude(simAsset): filteredAids.append(aid)
-		simAids = filteredAids
+		simAids = [aid for aid in simAids if aid in byAid and not db.dto.checkIsExclude(byAid[aid])]
 		if ls: ls.mark("extFil", str(len(simAids)))
 
 	result.simAids = simAids
@@ -201,7 +273,7 @@ def findGroupBy(asset: models.Asset, doReport: IFnProg, grpId: int, fromUrl=Fals
 		db.pics.setSimInfos(asset.autoId, bseInfos, isOk=1)
 		return result
 
-	assets = [asset] + [db.pics.getByAutoId(aid) for aid in simAids if db.pics.getByAutoId(aid)]
+	assets = [asset] + [byAid[aid] for aid in simAids if aid in byAid]
 	condOk, condReason = checkGroupConds(assets)
 	if not condOk:
 		if ls: ls.setResult(f"cond({condReason})")
@@ -220,13 +292,17 @@ def findGroupBy(asset: models.Asset, doReport: IFnProg, grpId: int, fromUrl=Fals
 			db.pics.setSimInfos(asset.autoId, bseInfos, isOk=1)
 			return result
 
-	rootGID = asset.autoId
-	db.pics.setSimGIDs(asset.autoId, rootGID)
-	db.pics.setSimInfos(asset.autoId, bseInfos)
-	if ls: ls.mark("setGID")
+	# the whole group is written at once, a cancel midway leaves the seed unsearched
+	bat = db.pics.SimBatch()
+	processChildren(asset, bseInfos, simAids, doReport, bat, isCancel)
+	if ls: ls.mark("children", str(len(bat.sims)))
+
+	if isCancel and isCancel():
+		if ls: ls.setResult("cancelled")
+		return result
 
-	processChildren(asset, bseInfos, simAids, doReport)
-	if ls: ls.mark("children")
+	bat.flush()
+	if ls: ls.mark("write")
 
 	if not fromUrl and db.dto.muod.on:
 		assets = db.pics.getSimAssets(asset.autoId, False)
@@ -246,40 +322,47 @@ def findGroupBy(asset: models.Asset, doReport: IFnProg, grpId: int, fromUrl=Fals
 	return result
 
 
-def processChildren(asset: models.Asset, bseInfos: List[models.SimInfo], simAids: List[int], doReport: IFnProg) -> Set[int]:
+def processChildren(
+	asset: models.Asset, bseInfos: List[models.SimInfo], simAids: List[int], doReport: IFnProg,
+	bat: Optional[db.pics.SimBatch]=None, isCancel: Optional[IFnCancel]=None
+) -> Set[int]:
+	'''
+	breadth-first over the related tree, one level at a time:
+	one vector retrieve + one batched query per level, rows go to bat (written here when not given)
+	'''
 	thMin = db.dto.thMin
 	maxItems = db.dto.rtreeMax
-
+	own = bat is None
+	if own: bat = db.pics.SimBatch()
 
 	rootGID = asset.autoId
-	db.pics.setSimGIDs(asset.autoId, rootGID)
-	db.pics.setSimInfos(asset.autoId, bseInfos)
+	bat.setGID(asset.autoId, rootGID)
+	bat.setInfos(asset.autoId, bseInfos)
 
 	doneIds = {asset.autoId}
-	simQ = [(aid, 0) for aid in simAids]
-
-	while simQ:
-		aid, depth = simQ.pop(0)
-		if aid in doneIds: continue
+	level = list(dict.fromkeys(simAids))
+	depth = 0
 
-		doneIds.add(aid)
-		doReport(50, f"Processing children similar photo #{aid} depth({depth}) count({len(doneIds)})")
+	while level:
+		if isCancel and isCancel(): break
 
-		try:
-			ass = db.pics.getByAutoId(aid)
-			if ass.simOk: continue  # ignore already resolved
+		take = []
+		for aid in level:
+			if aid in doneIds: continue
+			if len(doneIds) >= maxItems: break
+			doneIds.add(aid)
+			take.append(aid)
 
-			# lg.info(f"[sim:fnd] search child #{aid} depth[{depth}]items({len(doneIds)}/{maxItems})")
-			cVec, cInfos = db.vecs.findSimiliar(aid, thMin)
+		if not take: break
+		doReport(50, f"Processing children similar photos depth({depth}) level({len(take)}) count({len(doneIds)})")
 
-			db.pics.setSimGIDs(aid, rootGID)
-			db.pics.setSimInfos(aid, cInfos)
+		try:
+			oks = db.pics.getSimOkIds(take)
+			todo = [aid for aid in take if aid not in oks]  # ignore already resolved
 
-			# Add children to queue if haven't reached max depth/items
-			if len(doneIds) < maxItems:
-				for inf in cInfos:
-					if inf.aid not in doneIds: simQ.append((inf.aid, depth + 1))
-		except Exception as ce: raise RuntimeError(f"Error processing similar image {aid}: {ce}")
+			infosBy = db.vecs.findSimiliarMany(todo, thMin)
+			bat.setGroup(rootGID, infosBy)
+		except Exception as ce: raise RuntimeError(f"Error processing similar images depth({depth}) {take}: {ce}")
 
 		# Check item limit
 		if len(doneIds) >= maxItems:
@@ -287,4 +370,227 @@ def processChildren(asset: models.Asset, bseInfos: List[models.SimInfo], simAids
 			doReport(90, f"Reached max items limit ({maxItems}), processing current item...")
 			break
 
+		level = list(dict.fromkeys(inf.aid for aid in todo for inf in infosBy[aid] if inf.aid not in doneIds))
+		depth += 1
+
+	if own: bat.flush()
 	return doneIds
+
+
+#------------------------------------------------------------------------
+# whole-library graph
+#------------------------------------------------------------------------
+_mmapMin = 1 << 30  # matrix bytes above which vectors go to a memory-mapped file
+
+
+def _grpSkip(aids: List[int]) -> str:
+	'''same group settings the seed search applies, returns the reason when skipped'''
+	cntSim = len(aids) - 1
+	if cntSim < 1: return "len<2"
+	if db.dto.excl.on and db.dto.excl.fndLes > 0 and cntSim < db.dto.excl.fndLes: return f"excl(sim:{cntSim}<{db.dto.excl.fndLes})"
+	if db.dto.excl.on and db.dto.excl.fndOvr > 0 and cntSim > db.dto.excl.fndOvr: return f"excl(sim:{cntSim}>{db.dto.excl.fndOvr})"
+
+	g = db.dto.gpsk
+	if not any([g.eqDt, g.eqW, g.eqH, g.eqFsz]) and not db.dto.pathFilter: return ""
+
+	byAid = db.pics.getByAutoIds(aids)
+	assets = [byAid[aid] for aid in aids if aid in byAid]
+	condOk, reason = checkGroupConds(assets)
+	if not condOk: return f"cond({reason})"
+	if db.dto.pathFilter and not any(db.dto.pathFilter in (a.originalPath or '') for a in assets): return f"pathFil({db.dto.pathFilter})"
+	return ""
+
+
+def buildGraph(doRep: IFnProg, isCancel: IFnCancel, limit=100) -> Tuple[int, int, int]:
+	'''
+	search every pending asset at once instead of one vector query per seed:
+	all vectors are scrolled into one matrix, top-k neighbours down to simFloor come from blocked
+	matmuls and are kept in simsNbrs, the search records >= thMin are derived from them and
+	groupAll forms the groups, a later threshold change only needs regroup
+	neighbours are written block by block while simNbrsFloor is 0 (store unusable), so a cancel
+	leaves the search records as they were and the store waits for the next build
+	returns (edges, groups, resolved)
+	'''
+	thMin = db.dto.thMin
+	floor = min(co.vad.float(db.dto.simFloor, 0.6, 0.5, 1.0), thMin)
+	t0 = time.time()
+
+	nodes = db.pics.getGraphNodes()
+	known = {n[0] for n in nodes}
+	excl = {aid for aid, _, _, nam in nodes if db.dto.checkIsExclude(models.Asset(autoId=aid, originalFileName=nam))}
+	pend = [aid for aid, isVec, ok, _ in nodes if isVec and not ok and aid not in excl]
+
+	cnt = db.vecs.count()
+	if not cnt or not pend: return 0, 0, 0
+
+	pathMat = None
+	if cnt * db.vecs.dim * 4 >= _mmapMin:
+		os.makedirs(pathCache, exist_ok=True)
+		pathMat = os.path.join(pathCache, 'graph.mat')
+
+	try:
+		ids, mat = db.vecs.getMatrix(pathMat, onPage=lambda n, c: doRep(int(n / c * 20), f"Loading vectors {n}/{c}"))
+		knn.normRows(mat)
+		tLoad = time.time() - t0
+
+		pos = {int(a): i for i, a in enumerate(ids)}
+		srcs = np.array([pos[a] for a in pend if a in pos], dtype=np.int64)
+		lg.info(f"[sim:graph] vectors[{len(ids)}] pending[{len(pend)}] noVector[{len(pend) - len(srcs)}] thMin[{thMin}] floor[{floor}] mmap[{pathMat is not None}]")
+
+		db.dto.simNbrsFloor = 0
+		db.pics.delSimNbrs(ids[srcs].tolist())
+
+		cntEdges = cntNbrs = last = 0
+		for done, (src, dst, scs) in knn.topK(mat, srcs, limit - 1, floor, isCancel=isCancel):
+			if isCancel(): return 0, 0, 0
+			rows = [(a, a, 1.0) for a in ids[srcs[last:done]].tolist()]
+			last = done
+			for a, b, s in zip(ids[src].tolist(), ids[dst].tolist(), scs.tolist()):
+				if b in excl or b not in known: continue
+				rows.append((a, b, s))
+				if s >= thMin: cntEdges += 1
+			db.pics.addSimNbrs(rows)
+			cntNbrs += len(rows)
+			doRep(20 + int(done / len(srcs) * 70), f"Neighbours of {done}/{len(srcs)} assets, pairs[{cntEdges}]")
+	finally:
+		mat = None
+		if pathMat and os.path.exists(pathMat): os.remove(pathMat)
+	tKnn = time.time() - t0 - tLoad
+
+	if isCancel(): return 0, 0, 0
+
+	db.dto.simNbrsFloor = floor
+
+	doRep(95, f"Grouping {cntEdges} similar pairs..")
+	db.pics.clearAllSimIds(keepSimOk=True)
+	db.pics.setSimFromNbrs(thMin)
+	cntGrps, cntSkip = groupAll(thMin)
+
+	lg.info(f"[sim:graph] nbrs[{cntNbrs}] edges[{cntEdges}] groups[{cntGrps}] skipped[{cntSkip}] load({tLoad:.1f}s) knn({tKnn:.1f}s) all({time.time() - t0:.1f}s)")
+	return cntEdges, cntGrps, cntSkip
+
+
+def _formGroups(rows: List[tuple]) -> Tuple[Dict[int, List[int]], List[int]]:
+	'''groups of (autoId, simAid, score, simOk of simAid) edges, returns ({main: members}, resolved by group settings)'''
+	edges = [(a, b, s) for a, b, s, ok in rows if not ok]
+	nbrsOf: Dict[int, List[int]] = {}
+	for a, b, _, _ in rows: nbrsOf.setdefault(a, []).append(b)
+
+	comps = dsu.groups(edges, db.dto.rtreeMax)
+	mains = dsu.mains(comps, edges)
+
+	# left alone by a split, or only similar to resolved ones
+	inComp = {m for c in comps for m in c}
+	for aid in sorted(nbrsOf):
+		if aid not in inComp:
+			comps.append([aid])
+			mains.append(aid)
+
+	grps, oks = {}, []
+	for main, mems in zip(mains, comps):
+		# resolved or split off neighbours are shown with the group but not part of it
+		shown = list(dict.fromkeys(mems + [b for a in mems for b in nbrsOf.get(a, [])]))
+		if _grpSkip(shown): oks.extend(mems)
+		else: grps[main] = mems
+	return grps, oks
+
+
+def groupAll(thMin: Optional[float]=None) -> Tuple[int, int]:
+	'''
+	all groups of pending assets in one union-find sweep over the stored edges >= thMin,
+	components larger than rtreeMax split along their weakest links, the main asset is
+	the member most similar to the rest, an asset with similar but no component is its own group
+	returns (groups, resolved by group settings)
+	'''
+	thMin = db.dto.thMin if thMin is None else thMin
+	t0 = time.time()
+
+	rows = db.pics.getSimEdges(thMin)
+	grps, oks = _formGroups(rows)
+
+	db.pics.setSimGrps(grps, oks)
+	db.pics.setSimAutoMark()
+
+	lg.info(f"[sim:grp] edges[{len(rows)}] groups[{len(grps)}] skipped[{len(oks)}] maxSize[{db.dto.rtreeMax}] ({int((time.time() - t0) * 1000)}ms)")
+	return len(grps), len(oks)
+
+
+def groupAround(aids: List[int], thMin: Optional[float]=None) -> Tuple[int, int, int]:
+	'''
+	groupAll limited to the components reaching the given aids: edges and groups are followed
+	out from them until closed, only those groups are rewritten, all others stay as they are
+	returns (groups, resolved by group settings, assets regrouped)
+	'''
+	thMin = db.dto.thMin if thMin is None else thMin
+
+	mems: Set[int] = set()
+	rows: Dict[Tuple[int, int], tuple] = {}
+	front = set(aids)
+	while front:
+		mems |= front
+		rs = db.pics.getSimEdges(thMin, list(front))
+		for r in rs: rows[(r[0], r[1])] = r
+		nxt = {r[0] for r in rs} | {r[1] for r in rs if not r[3]}
+		front = (nxt | set(db.pics.getGrpMembers(list(front)))) - mems
+
+	grps, oks = _formGroups(list(rows.values()))
+
+	db.pics.setSimGrps(grps, oks, list(mems))
+	db.pics.setSimAutoMark()
+	return len(grps), len(oks), len(mems)
+
+
+def regroup(thMin: float) -> Optional[Tuple[int, int]]:
+	'''
+	groups at a new threshold from the stored neighbours, seconds and no qdrant query,
+	None when thMin is below the floor of the last graph build (needs a new build)
+	'''
+	floor = db.dto.simNbrsFloor
+	if not floor or thMin < floor: return None
+
+	t0 = time.time()
+	cnt = db.pics.setSimFromNbrs(thMin)
+	rst = groupAll(thMin)
+	lg.info(f"[sim:regroup] thMin[{thMin}] floor[{floor}] assets[{cnt}] groups[{rst[0]}] ({int((time.time() - t0) * 1000)}ms)")
+	return rst
+
+
+def updateNew(aids: List[int], doRep: IFnProg, isCancel: IFnCancel, chunk=64, limit=100) -> Tuple[int, int, int]:
+	'''
+	search only the given aids (the ones a vectorize run just added) that were never searched,
+	their hits are merged into the stored records and only the groups they reach are re-formed,
+	joining or bridging existing ones, groups they do not reach are left as they are
+	returns (searched, groups re-formed, assets regrouped)
+	'''
+	thMin = db.dto.thMin
+	floor = db.dto.simNbrsFloor
+	withNbrs = 0 < floor <= thMin
+	th = floor if withNbrs else thMin
+	t0 = time.time()
+
+	news = [aid for aid, nam in db.pics.getNonSimAids(aids) if not db.dto.checkIsExclude(models.Asset(autoId=aid, originalFileName=nam))]
+	if not news: return 0, 0, 0
+
+	touched: Set[int] = set()
+	for i in range(0, len(news), chunk):
+		if isCancel(): break
+		part = news[i:i + chunk]
+		doRep(int(i / len(news) * 80), f"Searching new assets {i}/{len(news)}")
+
+		infosBy = db.vecs.findSimiliarMany(part, th, limit)
+		excl = set()
+		if db.dto.excl.on and db.dto.excl.filNam:
+			nbrs = list({inf.aid for infos in infosBy.values() for inf in infos if not inf.isSelf})
+			byAid = db.pics.getByAutoIds(nbrs)
+			excl = {aid for aid in nbrs if aid not in byAid or db.dto.checkIsExclude(byAid[aid])}
+
+		rows = [(aid, inf.aid, 1.0 if inf.isSelf else inf.score) for aid, infos in infosBy.items() for inf in infos if inf.aid not in excl]
+
+		touched.update(part)
+		touched.update(db.pics.addSimNew(rows, thMin, withNbrs))
+
+	doRep(85, f"Grouping around {len(touched)} assets..")
+	cntGrps, _, cntMems = groupAround(sorted(touched), thMin)
+
+	lg.info(f"[sim:new] searched[{len(news)}] thMin[{thMin}] nbrs[{withNbrs}] touched[{len(touched)}] regrouped[{cntMems}] groups[{cntGrps}] ({time.time() - t0:.1f}s)")
+	return len(news), cntGrps, cntMems
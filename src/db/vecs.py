@@ -1,11 +1,11 @@
-from typing import List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 import numpy as np
 import qdrant_client.http.models
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as qmod
 
-from conf import envs
+from conf import envs, ks
 from util import log
 from mod import models
 from util.err import mkErr
@@ -14,16 +14,44 @@ from util.err import mkErr
 lg = log.get(__name__)
 
 keyColl = "deduper"
+mdl = ks.defs.mdlDef
+dim = 2048
+infer = 'eager'
 
 conn: Optional[QdrantClient] = None
 
 
-def init():
+def collName(name: str, size: int, mode: str='eager') -> str:
+	# resnet152 keeps the original collection so existing vectors stay valid
+	base = "deduper" if name == ks.defs.mdlDef else f"deduper_{name}_{size}"
+	# frozen / int8 vectors drift from float ones, every infer mode is searched on its own
+	return base if mode == 'eager' else f"{base}_{mode}"
+
+
+def use(name: str, mode: str='eager'):
+	'''switch the active collection to the one of given model and infer mode, other collections are kept'''
+	global keyColl, mdl, dim, infer
+	if name not in ks.defs.mdls:
+		lg.warn(f"[qdrant] unknown model[{name}], use default[{ks.defs.mdlDef}]")
+		name = ks.defs.mdlDef
+	if mode not in ks.defs.cpuInfers:
+		lg.warn(f"[qdrant] unknown infer mode[{mode}], use eager")
+		mode = 'eager'
+
+	mdl, dim, infer = name, ks.defs.mdls[name][1], mode
+	keyColl = collName(mdl, dim, infer)
+	lg.info(f"[qdrant] use model[{mdl}] dim[{dim}] infer[{infer}] coll[{keyColl}]")
+
+	if conn is not None: create()
+
+
+def init(name: Optional[str]=None, mode: str='eager'):
 	global conn
 	try:
 		conn = QdrantClient(envs.qdrantUrl, timeout=60)
 
-		create()
+		if name: use(name, mode)
+		else: create()
 	except Exception as e: raise mkErr(f"Failed to initialize Qdrant", e)
 
 def close():
@@ -43,7 +71,7 @@ def create():
 			conn.create_collection(
 				collection_name=keyColl,
 				vectors_config=qmod.VectorParams(
-					size=2048,
+					size=dim,
 					distance=qmod.Distance.COSINE
 				),
 				timeout=60
@@ -104,7 +132,7 @@ def save(aid: int, vector: np.ndarray, confirm=True):
 		if np.isinf(vector).any(): raise ValueError(f"[vecs] Vector contains infinite values")
 
 		vecList = vector.tolist()
-		if not vecList or len(vecList) != 2048: raise ValueError(f"[vecs] Vector length is incorrect, expected 2048, actual {len(vecList) if vecList else 0}")
+		if not vecList or len(vecList) != dim: raise ValueError(f"[vecs] Vector length is incorrect, expected {dim}, actual {len(vecList) if vecList else 0}")
 
 		if not all(isinstance(x, (int, float)) for x in vecList[:5]): raise ValueError(f"[vecs] Vector contains invalid data types")
 
@@ -127,6 +155,93 @@ def save(aid: int, vector: np.ndarray, confirm=True):
 	except Exception as e: raise mkErr(f"Error saving vector for asset {aid}", e)
 
 
+def chkMany(mat: np.ndarray, size: Optional[int]=None) -> np.ndarray:
+	'''validate a (N, dim) block in one pass, returns mask of usable rows'''
+	size = size or dim
+	if mat.ndim != 2 or mat.shape[1] != size: raise ValueError(f"[vecs] Matrix shape is incorrect, expected (N, {size}), actual {mat.shape}")
+	return np.isfinite(mat).all(axis=1) & (np.abs(mat).sum(axis=1) > 0)
+
+
+def saveMany(aids: List[int], mat: np.ndarray, chunk=256, wait=True, confirm=True) -> List[int]:
+	'''
+	upsert a block of vectors, returns aids skipped by validation
+	wait=False sends every chunk without waiting and only blocks on the last one,
+	updates are applied in order so the verification after it sees all chunks
+	'''
+	try:
+		if conn is None: raise RuntimeError("[vecs] Qdrant connection not initialized")
+		if len(aids) != len(mat): raise ValueError(f"[vecs] aids[{len(aids)}] and vectors[{len(mat)}] length mismatch")
+		if not aids: return []
+
+		mat = np.asarray(mat, dtype=np.float32)
+		ok = chkMany(mat)
+		bads = [int(aids[i]) for i in np.flatnonzero(~ok)]
+		if bads: lg.warn(f"[vecs] saveMany skip invalid vectors aids{bads}")
+
+		ids = [int(a) for a, o in zip(aids, ok) if o]
+		mat = mat[ok]
+
+		chunks = [(ids[i:i + chunk], mat[i:i + chunk]) for i in range(0, len(ids), chunk)]
+		for n, (cids, cmat) in enumerate(chunks):
+			waited = wait or n == len(chunks) - 1
+			rst = conn.upsert(
+				collection_name=keyColl,
+				points=qmod.Batch(ids=cids, vectors=cmat.tolist(), payloads=[{"aid": a} for a in cids]), # type: ignore
+				wait=waited
+			)
+			if waited and rst.status != qmod.UpdateStatus.COMPLETED: raise RuntimeError(f"Upsert failed with status: {rst.status}")
+
+		if confirm:
+			for cids, _ in chunks:
+				stored = conn.retrieve(collection_name=keyColl, ids=cids, with_payload=False, with_vectors=False)
+				miss = set(cids) - {int(p.id) for p in stored}
+				if miss: raise RuntimeError(f"[vecs] Failed save vectors aids{sorted(miss)}")
+
+		return bads
+	except Exception as e: raise mkErr(f"Error saving vectors for assets count[{len(aids)}]", e)
+
+
+def getAllIds() -> List[int]:
+	try:
+		if conn is None: raise RuntimeError("[vecs] Qdrant connection not initialized")
+
+		ids, offset = [], None
+		while True:
+			pts, offset = conn.scroll(collection_name=keyColl, limit=10000, offset=offset, with_payload=False, with_vectors=False)
+			ids.extend(int(p.id) for p in pts)
+			if offset is None: break
+		return ids
+	except Exception as e: raise mkErr(f"[vecs] Error listing ids of coll[{keyColl}]", e)
+
+
+def getMatrix(pathMmap: Optional[str]=None, page=1000, onPage: Optional[Callable[[int, int], None]]=None) -> Tuple[np.ndarray, np.ndarray]:
+	'''
+	scroll every vector of the collection into one float32 (N, dim) matrix, rows follow the returned ids
+	with pathMmap the matrix is a memory-mapped file there instead of RAM,
+	points added while scrolling beyond the initial count are left out
+	'''
+	try:
+		if conn is None: raise RuntimeError("[vecs] Qdrant connection not initialized")
+
+		cnt = count()
+		ids = np.empty(cnt, dtype=np.int64)
+		if pathMmap: mat = np.memmap(pathMmap, dtype=np.float32, mode='w+', shape=(max(cnt, 1), dim))
+		else: mat = np.empty((cnt, dim), dtype=np.float32)
+
+		n, offset = 0, None
+		while n < cnt:
+			pts, offset = conn.scroll(collection_name=keyColl, limit=page, offset=offset, with_payload=False, with_vectors=True)
+			for p in pts[:cnt - n]:
+				ids[n] = int(p.id)
+				mat[n] = p.vector
+				n += 1
+			if onPage: onPage(n, cnt)
+			if offset is None: break
+
+		return ids[:n], mat[:n]
+	except Exception as e: raise mkErr(f"[vecs] Error loading vectors of coll[{keyColl}]", e)
+
+
 def getBy(aid: int) -> List[float]:
 	try:
 		if conn is None: raise RuntimeError("[vecs] Qdrant connection not initialized")
@@ -199,24 +314,49 @@ def search(vec, thMin: float=0.95, limit=100) -> list[qdrant_client.http.models.
 #------------------------------------------------------------------------
 # only return different id
 #------------------------------------------------------------------------
-def findSimiliar(aid: int, thMin: float=0.95, limit=100, logRow=False) -> Tuple[list[float], list[models.SimInfo]]:
+def _toInfos(aid: int, pts) -> list[models.SimInfo]:
+	infos: list[models.SimInfo] = []
+	for hit in pts:
+		hit_aid = int(hit.id)
+		if hit.score <= 1.0 or hit_aid == aid:  #always add self
+			isSelf = hit_aid == aid
+			infos.append(models.SimInfo(hit_aid, hit.score, isSelf))
+	return infos
+
+
+def _withSelf(aid: int, pts) -> list[models.SimInfo]:
+	# a point id query leaves the point itself out, it is always the top hit of its own vector
+	return [models.SimInfo(aid, 1.0, True)] + _toInfos(aid, pts)
+
+
+def findSimiliar(aid: int, thMin: float=0.95, limit=100, logRow=False, withVec=False) -> Tuple[list[float], list[models.SimInfo]]:
+	'''
+	searches by the stored point id, the vector never leaves qdrant,
+	withVec also fetches it for callers that need it, otherwise the returned vector is empty
+	'''
 	try:
 		if conn is None: raise RuntimeError("Qdrant connection not initialized")
 
-		vector = getBy(aid)
+		vector = getBy(aid) if withVec else []
 
-		rep = conn.query_points(collection_name=keyColl, query=vector, limit=limit, score_threshold=thMin, with_payload=True)
-		rst = rep.points
-		infos: list[models.SimInfo] = []
-
-		# lg.info(f"[vecs:find] #{aid}, threshold[{thMin}-1.0] limit[{limit}] found[{len(rst)}]")
-		for i, hit in enumerate(rst):
-			hit_aid = int(hit.id)
-			if logRow: lg.info(f"\tno.{i + 1}: AID[{hit_aid}], score[{hit.score:.6f}] self[{int(hit.id) == aid}]")
-
-			if hit.score <= 1.0 or hit_aid == aid:  #always add self
-				isSelf = hit_aid == aid
-				infos.append(models.SimInfo(hit_aid, hit.score, isSelf))
+		rep = conn.query_points(collection_name=keyColl, query=aid, limit=limit - 1, score_threshold=thMin, with_payload=False)
+		infos = _withSelf(aid, rep.points)
+		if logRow:
+			for i, inf in enumerate(infos): lg.info(f"\tno.{i + 1}: AID[{inf.aid}], score[{inf.score:.6f}] self[{inf.isSelf}]")
 
+		# lg.info(f"[vecs:find] #{aid}, threshold[{thMin}-1.0] limit[{limit}] found[{len(infos)}]")
 		return vector, infos
 	except Exception as e: raise mkErr(f"Error finding similar assets for aid[{aid}]", e)
+
+
+def findSimiliarMany(aids: List[int], thMin: float=0.95, limit=100) -> Dict[int, list[models.SimInfo]]:
+	'''findSimiliar for a whole frontier in one batched query by point ids'''
+	try:
+		if conn is None: raise RuntimeError("Qdrant connection not initialized")
+		if not aids: return {}
+
+		reqs = [qmod.QueryRequest(query=a, limit=limit - 1, score_threshold=thMin, with_payload=False) for a in aids]  # type: ignore
+		reps = conn.query_batch_points(collection_name=keyColl, requests=reqs)
+
+		return {a: _withSelf(a, rep.points) for a, rep in zip(aids, reps)}
+	except Exception as e: raise mkErr(f"Error finding similar assets for aids count[{len(aids)}]", e)
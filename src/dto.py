@@ -4,7 +4,7 @@ from typing import Any, Callable, cast, Generic, TypeVar, overload
 from conf import ks, Optional
 from util import log
 
-from dtom import Ausl, Muod, Gpsk, Excl, Mrg, PairKv
+from dtom import Ausl, Muod, Gpsk, Excl, Mrg, PairKv, Phs
 
 lg = log.get(__name__)
 
@@ -151,6 +151,8 @@ class DtoSets:
 
     photoQ = AutoDbField('photoQ', str, ks.db.thumbnail)
     thMin = AutoDbField('simMin', float, 0.93)
+    simFloor = AutoDbField('simFloor', float, 0.60)
+    simNbrsFloor = AutoDbField('simNbrsFloor', float, 0.0)  # floor of the stored neighbours, 0 before any graph build
 
     autoNext = AutoDbField('autoNext', bool, True)
     showGridInfo = AutoDbField('showGridInfo', bool, True)
@@ -167,11 +169,21 @@ class DtoSets:
 
     excl = AutoDbField('excl', Excl)
 
+    phs = AutoDbField('phs', Phs)
+
     gpuAutoMode = AutoDbField('gpuAutoMode', bool, True)
     gpuBatchSize = AutoDbField('gpuBatchSize', int, 8)
 
     cpuAutoMode = AutoDbField('cpuAutoMode', bool, True)
     cpuWorkers = AutoDbField('cpuWorkers', int, 4)
+    cpuPoolMode = AutoDbField('cpuPoolMode', bool, True)
+    cpuBatchSize = AutoDbField('cpuBatchSize', int, 16)
+    cpuInfer = AutoDbField('cpuInfer', str, 'eager')
+    cpuInferChk = AutoDbField('cpuInferChk', dict, {})
+
+    batchTuned = AutoDbField('batchTuned', dict, {})
+
+    vecModel = AutoDbField('vecModel', str, ks.defs.mdlDef)
 
     mrg = AutoDbField('mrg', Mrg)
 
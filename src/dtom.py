@@ -51,6 +51,11 @@ class Mrg:
 	loc:bool = False
 	vis:bool = False
 
+@dataclass
+class Phs:
+	on:bool = False
+	dist:int = 4
+
 @dataclass
 class Excl:
 	on:bool = True
@@ -1,16 +1,21 @@
 import os
+import sys
 import time
+import copy
+import errno
+import socket
+import threading
+import platform
 import torch
 import base64
 from io import BytesIO
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
 import multiprocessing
-import threading
 
-from typing import List, Optional, Tuple
+from typing import Iterable, List, Optional
 
 import numpy as np
-from torchvision.models import resnet152, ResNet152_Weights
+import torchvision.models as tvm
 from torchvision.transforms import Compose, Resize, ToTensor, Normalize
 from PIL import Image, ImageFile
 
@@ -18,12 +23,13 @@ ImageFile.LOAD_TRUNCATED_IMAGES = True
 
 os.environ['KMP_DUPLICATE_LIB_OK'] = "TRUE"
 
-import db, conf
+import db, conf, pix, pipe
 from util import log
 from mod import models
 from util.err import mkErr
-from conf import envs
+from conf import envs, ks
 import rtm
+from cpus import planThreads, fmtDrift
 
 
 lg = log.get(__name__)
@@ -32,7 +38,9 @@ class FeatureExtractor(torch.nn.Module):
 	def __init__(self, base_model):
 		super(FeatureExtractor, self).__init__()
 
-		self.features = torch.nn.Sequential(*list(base_model.children())[:-2])
+		# mobilenet / efficientnet keep the conv trunk in .features, resnet drops avgpool + fc
+		if hasattr(base_model, 'features'): self.features = base_model.features
+		else: self.features = torch.nn.Sequential(*list(base_model.children())[:-2])
 		self.avgpool = torch.nn.AdaptiveAvgPool2d((1, 1))
 
 	def forward(self, x):
@@ -41,54 +49,52 @@ class FeatureExtractor(torch.nn.Module):
 		return x.view(x.size(0), -1)
 
 
+# name → (builder, weights enum), dims are in ks.defs.mdls
+_mdlFns = {
+	'resnet152': (tvm.resnet152, tvm.ResNet152_Weights),
+	'resnet50': (tvm.resnet50, tvm.ResNet50_Weights),
+	'efficientnet_b0': (tvm.efficientnet_b0, tvm.EfficientNet_B0_Weights),
+	'mobilenet_v3_large': (tvm.mobilenet_v3_large, tvm.MobileNet_V3_Large_Weights),
+}
+
 _model = None
+_modelName = None
+_modelLock = threading.Lock()
+
+def mdlWeights(name: str):
+	_, weights = _mdlFns.get(name, _mdlFns[ks.defs.mdlDef])
+	return weights.DEFAULT
 
 def getModel():
-	global _model
-	if _model is None:
-		model_dir = os.path.join(envs.ddupData, 'models')
-		os.makedirs(model_dir, exist_ok=True)
-		torch.hub.set_dir(model_dir)
-
-		base_model = resnet152(weights=ResNet152_Weights.DEFAULT)
-		_model = FeatureExtractor(base_model)
-		_model = _model.to(conf.device)
-		_model.eval()
+	'''model of the active vector collection, rebuilt when the selection changes'''
+	global _model, _modelName
+	name = db.vecs.mdl
+	if _model is not None and _modelName == name: return _model
+
+	# warm-up thread and a task may ask at the same time, load once
+	with _modelLock:
+		if _model is None or _modelName != name:
+			tS = time.time()
+			model_dir = os.path.join(envs.ddupData, 'models')
+			os.makedirs(model_dir, exist_ok=True)
+			torch.hub.set_dir(model_dir)
+
+			fn, _ = _mdlFns.get(name, _mdlFns[ks.defs.mdlDef])
+			base_model = fn(weights=mdlWeights(name))
+			m = FeatureExtractor(base_model)
+			m = m.to(conf.device)
+			m.eval()
+			_model, _modelName = m, name
+			lg.info(f"[imgs] model loaded: {name} dim[{db.vecs.dim}] in {time.time() - tS:.1f}s")
 	return _model
 
-def getOptimalBatchSize() -> int:
-	import db
-	device_type = conf.device.type
-
-	if device_type == 'cpu': return 1
-	elif device_type in ['cuda', 'mps']:
-		# Check if user wants manual mode
-		if not db.dto.gpuAutoMode and db.dto.gpuBatchSize: return db.dto.gpuBatchSize
-
-		# Auto mode - use existing logic
-		if device_type == 'cuda': # NVIDIA GPU (Linux/Windows)
-			try:
-				gpu_memory = torch.cuda.get_device_properties(0).total_memory
-				if gpu_memory > 12 * 1024 ** 3: return 16    # 12GB+ (RTX 3090, 4090)
-				elif gpu_memory > 8 * 1024**3: return 12   # 8-12GB (RTX 3080, 4070)
-				elif gpu_memory > 6 * 1024**3: return 8    # 6-8GB (RTX 3060 Ti)
-				elif gpu_memory > 4 * 1024**3: return 6    # 4-6GB (RTX 3060)
-				elif gpu_memory > 2 * 1024**3: return 4    # 2-4GB
-				return 2  # <2GB
-			except: return 8
-		elif device_type == 'mps': # Apple Silicon GPU (macOS)
-			try:
-				import platform
-				if 'arm64' in platform.machine().lower():
-					import psutil
-					total_memory = psutil.virtual_memory().total
-					if total_memory > 32 * 1024 ** 3: return 64    # 32GB+ (M2 Ultra)
-					elif total_memory > 16 * 1024**3: return 32   # 16-32GB (M2 Pro/Max)
-					elif total_memory > 8 * 1024**3: return 16    # 8-16GB (M2)
-					else: return 8  # 8GB (M1)
-				return 8
-			except: return 8
-	return 8
+def warmUp():
+	'''load device and weights ahead of the first vectorize, runs in background after start'''
+	try:
+		tS = time.time()
+		getModel()
+		lg.info(f"[imgs] warm-up done in {time.time() - tS:.1f}s, device[{conf.device}] model[{_modelName}]")
+	except Exception as e: lg.warn(f"[imgs] warm-up failed, model loads on first use: {type(e).__name__}: {str(e)}")
 
 def convert_image_to_rgb(image):
 	if image.mode == 'RGBA': return image.convert('RGB')
@@ -105,88 +111,253 @@ transform = Compose([
 def extractFeatures(image) -> np.ndarray:
 	image_tensor = transform(image).unsqueeze(0)
 	image_tensor = image_tensor.to(conf.device)
-	with torch.no_grad(): features = getModel()(image_tensor).squeeze(0)
-
-	feature_length = features.shape[0]
-	if feature_length != 2048:
-		if feature_length > 2048: features = features[:2048]
-		else:
-			padded = torch.zeros(2048, device=conf.device)
-			padded[:feature_length] = features
-			features = padded
+	features = _infer(image_tensor).squeeze(0)
 
 	features = torch.nn.functional.normalize(features, p=2, dim=0)
 
 	vec = features.cpu().numpy()
 	if vec is None or vec.size == 0 or not np.isfinite(vec).all(): raise ValueError("Extracted vector is empty or contains invalid values")
 
-	if not isinstance(vec, np.ndarray) or vec.size != 2048: raise ValueError(f"vector incorrect: size[{vec.size if isinstance(vec, np.ndarray) else 'unknown'}]")
+	if not isinstance(vec, np.ndarray) or vec.size != db.vecs.dim: raise ValueError(f"vector incorrect: size[{vec.size if isinstance(vec, np.ndarray) else 'unknown'}] expected[{db.vecs.dim}]")
 
 	return vec
 
-def extractFeaturesBatch(images: List[Image.Image]) -> List[np.ndarray]:
-	if not images: return []
-
-	device_type = conf.device.type
-
-	try:
-		image_tensors = []
-		for img in images:
-			tensor = transform(img)
-			image_tensors.append(tensor)
-
-		batch_tensor = torch.stack(image_tensors)
-
-		if device_type == 'cuda': batch_tensor = batch_tensor.to(conf.device, non_blocking=True)
-		elif device_type == 'mps': batch_tensor = batch_tensor.to(conf.device, non_blocking=False)
-		else: batch_tensor = batch_tensor.to(conf.device)
-
-		with torch.no_grad(): features_batch = getModel()(batch_tensor)
-
-		# Fix: squeeze removes batch dim when size=1, causing 1D output
-		if len(features_batch.shape) == 1:
-			# Reshape flattened vector back to batch format
-			batch_size = batch_tensor.shape[0]
-			expected_feature_size = features_batch.shape[0] // batch_size
-			features_batch = features_batch.view(batch_size, expected_feature_size)
-
-		# Adjust feature vector dimensions on GPU
-		batch_size = features_batch.shape[0]
-		feature_dim = features_batch.shape[1]
-
-		if feature_dim != 2048:
-			if feature_dim > 2048: features_batch = features_batch[:,:2048]
-			else:
-				padded_batch = torch.zeros(batch_size, 2048, device=conf.device)
-				padded_batch[:,:feature_dim] = features_batch
-				features_batch = padded_batch
-
-		features_batch_normalized = torch.nn.functional.normalize(features_batch, p=2, dim=1)
+_pixMean = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
+_pixStd = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
+
+def _toInput(pixs: np.ndarray) -> torch.Tensor:
+	t = torch.from_numpy(pixs).permute(0, 3, 1, 2).float().div_(255)
+	return ((t - _pixMean) / _pixStd).contiguous()
+
+
+#------------------------------------------------------------------------
+# cpu inference variants
+#
+# eager:  float32 FeatureExtractor as is
+# frozen: traced + frozen torchscript in channels-last
+# int8:   static post-training int8 (fx), calibrated on library images, then frozen
+#
+# built once per model / mode / torch version and kept in models/opt by
+# chkCpuModel, which compares against the float model on a sample of the
+# library; a mode is switched to (with its own collection) only after that
+#------------------------------------------------------------------------
+_inferModel = None
+_inferKey = None
+_inferLock = threading.Lock()
+_cntSample = 32
+
+def inferMode() -> str:
+	'''mode of the active collection, see db.useModel'''
+	return db.vecs.infer
+
+def vecKey() -> str:
+	'''embedding cache key, kept apart per infer mode like the collections'''
+	mode = inferMode()
+	return db.vecs.mdl if mode == 'eager' else f"{db.vecs.mdl}-{mode}"
+
+def _pathOpt(name: str, mode: str) -> str:
+	return os.path.join(envs.ddupData, 'models', 'opt', f"{name}-{mode}-torch{torch.__version__.split('+')[0]}.pt")
+
+def _samplePix(cnt: int) -> Optional[np.ndarray]:
+	pixs = []
+	for a in db.pics.getSample(cnt * 2):
+		p, _ = pix.loadPix(rtm.pth.full(a.getImagePath(db.dto.photoQ)))
+		if p is not None: pixs.append(p)
+		if len(pixs) >= cnt: break
+	return np.stack(pixs) if pixs else None
+
+def _drift(ref: torch.Tensor, out: torch.Tensor) -> dict:
+	cos = (ref * out).sum(dim=1)
+	d = (ref @ ref.T - out @ out.T).abs()
+	return {'n': len(ref), 'cosMin': round(float(cos.min()), 5), 'cosMean': round(float(cos.mean()), 5), 'driftMax': round(float(d.max()), 5), 'driftMean': round(float(d.mean()), 5)}
+
+def mkCpuModel(name: str, mode: str) -> dict:
+	base = getModel()
+	pixs = _samplePix(_cntSample)
+	if pixs is None: raise RuntimeError("no decodable library images for calibration")
+
+	x = _toInput(pixs)
+	with torch.no_grad():
+		ref = torch.nn.functional.normalize(base(x), p=2, dim=1)
+
+		m = copy.deepcopy(base)
+		if mode == 'int8':
+			from torch.ao.quantization import get_default_qconfig_mapping
+			from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+			eng = 'qnnpack' if platform.machine().lower() in ('arm64', 'aarch64') else 'x86'
+			torch.backends.quantized.engine = eng
+			m = prepare_fx(m, get_default_qconfig_mapping(eng), (x[:1],))
+			for i in range(0, len(x), 8): m(x[i:i + 8])
+			m = convert_fx(m)
+
+		m = m.to(memory_format=torch.channels_last)
+		xc = x.contiguous(memory_format=torch.channels_last)
+		m = torch.jit.freeze(torch.jit.trace(m, xc[:1]))
+
+		out = torch.nn.functional.normalize(m(xc), p=2, dim=1)
+
+	path = _pathOpt(name, mode)
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	torch.jit.save(m, path)
+
+	chk = _drift(ref, out)
+	_setChk(f"{name}-{mode}", chk)
+	lg.info(f"[imgs] {name} {mode} check: {fmtDrift(chk)}")
+	return chk
+
+def _setChk(key: str, chk: Optional[dict]):
+	chks = dict(db.dto.cpuInferChk)
+	if chk: chks[key] = chk
+	else: chks.pop(key, None)
+	db.dto.cpuInferChk = chks
+
+def chkCpuModel(name: str, mode: str) -> dict:
+	'''build the frozen / int8 model and check it against float, its own step before db.useModel can pick the mode'''
+	global _inferKey
+	if conf.device.type != 'cpu': raise RuntimeError(f"{ks.defs.cpuInfers[mode]} inference is for cpu only, device is {conf.device.type}")
 
-		if device_type == 'mps': batch_numpy = features_batch_normalized.detach().cpu().numpy()
-		else: batch_numpy = features_batch_normalized.cpu().numpy()
-
-		results = []
-		for i in range(batch_size):
-			vec = batch_numpy[i]
+	tS = time.time()
+	with _inferLock:
+		chk = mkCpuModel(name, mode)
+		_inferKey = None
+	lg.info(f"[imgs] {name} {mode} built and checked in {time.time() - tS:.1f}s")
+	return chk
+
+def loadCpuModel(name: str, mode: str):
+	'''only what chkCpuModel built, a vectorize run never builds a model it was not checked with'''
+	path = _pathOpt(name, mode)
+	if not os.path.exists(path):
+		# e.g. torch got upgraded, the check no longer covers this build
+		_setChk(f"{name}-{mode}", None)
+		raise RuntimeError(f"{ks.defs.cpuInfers[mode]} model of {name} is not built for torch {torch.__version__}, select Float32 then {ks.defs.cpuInfers[mode]} again to rebuild and check it")
+	return torch.jit.load(path, map_location='cpu')
+
+def getInferModel():
+	'''model used for extraction, cpu may swap in the frozen / int8 variant'''
+	global _inferModel, _inferKey
+	mode = inferMode()
+	if mode == 'eager': return getModel()
+
+	key = f"{db.vecs.mdl}-{mode}"
+	if _inferKey == key: return _inferModel
+
+	with _inferLock:
+		if _inferKey != key:
+			# no float fallback, its vectors would land in the collection of this mode
+			try: _inferModel = loadCpuModel(db.vecs.mdl, mode)
+			except Exception as e: raise mkErr(f"[imgs] {key} unavailable", e)
+			_inferKey = key
+	return _inferModel
+
+def _infer(t: torch.Tensor) -> torch.Tensor:
+	m = getInferModel()
+	if m is not _model: t = t.contiguous(memory_format=torch.channels_last)
+	with torch.no_grad(): return m(t)
+
+
+#------------------------------------------------------------------------
+# batch size autotune: short calibration runs on the device, best images/sec kept per device/model
+#------------------------------------------------------------------------
+_tuneMax = {'cuda': 128, 'mps': 64, 'cpu': 32}
+_tuneBudget = 30.0  # seconds, stop growing once spent
+_tuneGain = 1.05    # a larger batch must be this much faster to be chosen
+
+def _devKey() -> str:
+	dt = conf.device.type
+	if dt == 'cuda':
+		try: return f"cuda:{torch.cuda.get_device_name(0)}"
+		except Exception: return 'cuda'
+	if dt == 'cpu': return f"cpu:t{torch.get_num_threads()}"
+	return dt
+
+def tuneKey() -> str: return f"{_devKey()}|{vecKey()}"
+
+def _isOom(e: Exception) -> bool:
+	return isinstance(e, MemoryError) or 'out of memory' in str(e).lower()
+
+def _freeMem():
+	if conf.device.type == 'cuda': torch.cuda.empty_cache()
+	elif conf.device.type == 'mps' and hasattr(torch, 'mps'): torch.mps.empty_cache()
+
+def _sync():
+	if conf.device.type == 'cuda': torch.cuda.synchronize()
+	elif conf.device.type == 'mps' and hasattr(torch, 'mps'): torch.mps.synchronize()
+
+def tuneBatchSize(onUpdate: Optional[models.IFnProg]=None, pct: int=0) -> int:
+	'''
+	run one warm-up plus one timed batch at 1, 2, 4.. and keep the fastest,
+	allocation failure stops the growth and keeps the largest size that fit
+	'''
+	getInferModel()
+	dt = conf.device.type
+	sizeMax = _tuneMax.get(dt, 32)
+	pixs = np.random.default_rng(0).integers(0, 256, (sizeMax, 224, 224, 3), dtype=np.uint8)
+
+	rsts = {}
+	best, bestIps = 1, 0.0
+	tS = time.time()
+	size = 1
+	while size <= sizeMax:
+		if onUpdate: onUpdate(pct, f"Tuning batch size for {db.vecs.mdl}: trying {size}...")
+		try:
+			x = _toInput(pixs[:size]).to(conf.device)
+			_infer(x)
+			_sync()
+			t = time.perf_counter()
+			_infer(x)
+			_sync()
+			ips = size / max(time.perf_counter() - t, 1e-6)
+		except Exception as e:
+			if not _isOom(e): raise
+			lg.info(f"[imgs:tune] batch[{size}] out of memory, back off")
+			_freeMem()
+			break
+
+		rsts[size] = round(ips, 1)
+		if ips > bestIps * _tuneGain: best, bestIps = size, ips
+		elif size >= best * 4: break  # two steps without gain
+		if time.time() - tS > _tuneBudget: break
+		size *= 2
+
+	_freeMem()
+	key = tuneKey()
+	tuned = dict(db.dto.batchTuned)
+	tuned[key] = {'size': best, 'ips': round(bestIps, 1)}
+	db.dto.batchTuned = tuned
+	lg.info(f"[imgs:tune] {key} best[{best}] {bestIps:.1f} img/s, tried{rsts} in {time.time() - tS:.1f}s")
+	return best
+
+def getOptimalBatchSize(onUpdate: Optional[models.IFnProg]=None, pct: int=0) -> int:
+	'''manual size when auto mode is off, otherwise the tuned size of current device/model, tuned on first use'''
+	dt = conf.device.type
+	if dt == 'cpu':
+		if not db.dto.cpuAutoMode: return max(1, db.dto.cpuBatchSize)
+	elif not db.dto.gpuAutoMode and db.dto.gpuBatchSize: return db.dto.gpuBatchSize
+
+	rec = db.dto.batchTuned.get(tuneKey())
+	if rec: return rec['size']
+
+	try: return tuneBatchSize(onUpdate, pct)
+	except Exception as e:
+		lg.warn(f"[imgs:tune] failed, use default batch: {type(e).__name__}: {str(e)}")
+		return max(1, db.dto.cpuBatchSize) if dt == 'cpu' else 8
 
-			if vec is None or vec.size == 0 or not np.isfinite(vec).all(): raise ValueError(f"Extracted vector {i} is empty or contains invalid values")
 
-			if not isinstance(vec, np.ndarray) or vec.size != 2048: raise ValueError(f"vector {i} incorrect: size[{vec.size if isinstance(vec, np.ndarray) else 'unknown'}]")
+def extractFeaturesPix(pixs: np.ndarray) -> np.ndarray:
+	'''
+	pixs: uint8 (N, 224, 224, 3) from pix.loadPix
+	return: float32 (N, dim) l2-normalized, dim of the active model
+	'''
+	fs = _infer(_toInput(pixs).to(conf.device))
 
-			results.append(vec)
+	fs = torch.nn.functional.normalize(fs, p=2, dim=1)
+	mat = fs.cpu().numpy()
 
-		return results
-	except Exception as e:
-		lg.warning(f"Batch processing failed on {device_type} with {len(images)} images, falling back to single processing. Error: {type(e).__name__}: {str(e)}")
-		results = []
-		for img in images:
-			try:
-				vec = extractFeatures(img)
-				results.append(vec)
-			except Exception as single_e: raise ValueError(f"Single image processing also failed: {str(single_e)}")
-		return results
+	if mat.ndim != 2 or mat.shape[1] != db.vecs.dim: raise ValueError(f"vector incorrect: shape[{mat.shape}] expected dim[{db.vecs.dim}]")
+	if not np.isfinite(mat).all(): raise ValueError("Extracted vectors contain invalid values")
 
+	return mat
 
 
 def toB64(path):
@@ -204,15 +375,14 @@ def toB64(path):
 	return None
 
 
-def getImg(path) -> Optional[Image.Image]:
+# minSize > 0 decodes at reduced resolution (still covering minSize px), for model input only
+def getImg(path, minSize=0) -> Optional[Image.Image]:
 	path = rtm.pth.full(path)
 	try:
 		if os.path.exists(path):
 			# size = os.path.getsize(path)
 			# lg.info(f"[getImgLocal] image[{os.path.basename(path)}] size[{size / 1024 / 1024:.2f} MB]")
-			image = Image.open(path)
-			image.load()
-			return image
+			return pix.openScaled(path, minSize)
 		else: lg.error(f"File not found: {path}")
 	except Exception as e: lg.error(f"Error opening image from local path: {str(e)}")
 
@@ -225,128 +395,173 @@ def getImgB64(path) -> Optional[str]:
 	return toB64(path) if os.path.exists(path) else None
 
 
-def saveVectorBy(asset: models.Asset, photoQ) -> Tuple[models.Asset, Optional[str]]:
-	try:
-		path = asset.getImagePath(photoQ)
-		img = getImg(path)
-		if img is None: return asset, f"image load failed: {asset.id} - cannot load image from {path}"
+#------------------------------------------------------------------------
+# streaming vectorize pipeline: read → decode → infer → upsert
+#------------------------------------------------------------------------
+# identifies this process in vector leases and the combined worker progress
+wkrName = f"{socket.gethostname()}:{os.getpid()}"
 
-		vec = extractFeatures(img)
-		if vec is None: return asset, f"feature extraction failed: {asset.id} - cannot extract features"
+def poolCtx():
+	# spawn/forkserver children re-import __main__ (app.py runs db.init and builds dash at import),
+	# so the pool is only used where workers can be forked; decode workers never touch torch
+	if sys.platform == 'darwin' or 'fork' not in multiprocessing.get_all_start_methods(): return None
+	return multiprocessing.get_context('fork')
 
-		db.vecs.save(asset.autoId, vec)
 
-		return asset, None
-	except Exception as e:
-		errMsg = str(e)
-		if "Vector" in errMsg or "primitive" in errMsg: return asset, f"vector storage failed: {asset.id} - {errMsg}"
-		elif "image" in errMsg or "PIL" in errMsg: return asset, f"image processing failed: {asset.id} - {errMsg}"
-		else: return asset, f"feature extraction failed: {asset.id} - {errMsg}"
-
-def loadImagesParallel(assets: List[models.Asset], photoQ, maxWorkers=10) -> Tuple[List[Image.Image], List[models.Asset], List[Tuple[models.Asset, Optional[str]]]]:
-	imgs = []
-	rstOKs = []
-	rstNos = []
+def _isCritical(e: Exception) -> bool:
+	if isinstance(e, MemoryError): return True
+	return isinstance(e, OSError) and e.errno == errno.ENOSPC
 
-	def doLoadImg(asset):
-		try:
-			path = asset.getImagePath(photoQ)
-			img = getImg(path)
-			if img: return asset, img, None
-			else: return asset, None, f"Failed to load image: {path}"
-		except Exception as e: return asset, None, f"Error loading image {asset.id}: {str(e)}"
-
-	def isCriticalError(error_msg: str) -> bool:
-		critical_keywords = [
-			'MemoryError', 'OutOfMemoryError', 'memory',
-			'No space left on device', 'ENOSPC', 'disk full',
-			'PermissionError', 'permission denied', 'access denied',
-			'OSError', 'IOError', 'FileNotFoundError'
-		]
-		return any(keyword.lower() in error_msg.lower() for keyword in critical_keywords)
-
-	with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
-		futureImg = {executor.submit(doLoadImg, asset): asset for asset in assets}
-
-		for future in as_completed(futureImg):
-			asset, img, error = future.result()
-			if img:
-				imgs.append(img)
-				rstOKs.append(asset)
-			else:
-				if error and isCriticalError(error): raise RuntimeError(f"Critical error during image loading: {error}")
-				rstNos.append((asset, error))
-
-	return imgs, rstOKs, rstNos
-
-def saveVectorBatch(assets: List[models.Asset], photoQ) -> List[Tuple[models.Asset, Optional[str]]]:
-	try: imgs, rstOKs, rstNos = loadImagesParallel(assets, photoQ)
-	except RuntimeError as e:
-		if "Critical error during image loading" in str(e): raise e
-		else: return [(asset, f"Image loading failed: {str(e)}") for asset in assets]
-
-	results = rstNos
-	if not imgs: return results
 
-	try:
-		vecs = extractFeaturesBatch(imgs)
+def mkVecPipe(assets: Iterable[models.Asset], photoQ, batchSize: int, decoders: int, inferWorkers: int=1, pool: Optional[ProcessPoolExecutor]=None, isCancelled: Optional[models.IFnCancel]=None, ioWorkers: int=4, useCache: bool=True) -> pipe.Pipe:
+	mdlName, mdlDim = vecKey(), db.vecs.dim
 
-		for asset, vec in zip(rstOKs, vecs):
+	def doRead(jobs: List[pipe.Job]):
+		keys = {}
+		for j in jobs:
 			try:
-				db.vecs.save(asset.autoId, vec)
-				results.append((asset, None))
+				path = rtm.pth.full(j.key.getImagePath(photoQ))
+				k = db.embs.keyOf(path) if useCache else None
+				if k: keys[id(j)] = k
+				j.meta['path'] = path
+			except Exception as e: j.err = f"image load failed: {j.key.id} - {str(e)}"
+
+		# unchanged files reuse their cached vector and never get decoded
+		hits = {}
+		if keys:
+			lst = [j for j in jobs if id(j) in keys]
+			found = db.embs.getMany([keys[id(j)] for j in lst], mdlName, photoQ, mdlDim)
+			hits = {id(lst[idx]): vec for idx, vec in found.items()}
+
+		for j in jobs:
+			if j.err: continue
+			if id(j) in hits:
+				vec, j.key.phash = hits[id(j)]
+				j.meta['hit'] = True
+				if j.key.phash is not None:
+					j.data = vec
+					continue
+				# cached before hashes existed: decode once for the hash, keep the vector
+				j.meta['vec'] = vec
+			j.meta['ekey'] = keys.get(id(j))
+			try:
+				with open(j.meta['path'], 'rb') as f: j.data = f.read()
 			except Exception as e:
-				errMsg = str(e)
-				if "Vector" in errMsg or "primitive" in errMsg: results.append((asset, f"vector storage failed: {asset.id} - {errMsg}"))
-				else: results.append((asset, f"vector save failed: {asset.id} - {errMsg}"))
-	except Exception as e:
-		lg.warning(f"Batch feature extraction failed: {str(e)}")
+				if _isCritical(e): raise RuntimeError(f"Critical error during image loading: {j.key.id} - {str(e)}")
+				j.err = f"image load failed: {j.key.id} - {str(e)}"
+
+	def doDecode(jobs: List[pipe.Job]):
+		for j in jobs:
+			if j.meta.get('hit') and 'vec' not in j.meta: continue
+			p, err = pool.submit(pix.decodePix, j.data).result() if pool else pix.decodePix(j.data)
+			if p is None:
+				j.data = None
+				j.err = f"image processing failed: {j.key.id} - {err}"
+				continue
+			j.key.phash = pix.dHash(p)
+			j.data = j.meta.pop('vec') if 'vec' in j.meta else p
+
+	def doInfer(jobs: List[pipe.Job]):
+		jobs = [j for j in jobs if not j.meta.get('hit')]
+		if not jobs: return
+		try: mat = extractFeaturesPix(np.stack([j.data for j in jobs]))
+		except Exception as e:
+			if len(jobs) > 1: lg.warning(f"[imgs] batch of {len(jobs)} failed, fallback to single: {type(e).__name__}: {str(e)}")
+			mat = None
+
+		for idx, j in enumerate(jobs):
+			try: j.data = mat[idx] if mat is not None else extractFeaturesPix(j.data[np.newaxis])[0]
+			except Exception as e: j.err = f"feature extraction failed: {j.key.id} - {str(e)}"
+
+	def doUpsert(jobs: List[pipe.Job]):
+		news = [j for j in jobs if j.meta.get('ekey')]
+		if news: db.embs.putMany([j.meta['ekey'] for j in news], np.stack([j.data for j in news]), mdlName, photoQ, [j.key.phash for j in news])
 
-		# fallback
-		for idx, asset in enumerate(rstOKs):
-			try:
-				if idx < len(imgs):
-					vec = extractFeatures(imgs[idx])
-					db.vecs.save(asset.autoId, vec)
-					results.append((asset, None))
-				else: results.append((asset, f"image loading failed: {asset.id} - no corresponding image"))
-			except Exception as fallback_e:
-				errMsg = str(fallback_e)
-				if "Vector" in errMsg or "primitive" in errMsg: results.append((asset, f"vector storage failed: {asset.id} - {errMsg}"))
-				elif "image" in errMsg or "PIL" in errMsg: results.append((asset, f"image processing failed: {asset.id} - {errMsg}"))
-				else: results.append((asset, f"feature extraction failed: {asset.id} - {errMsg}"))
+		try:
+			bads = set(db.vecs.saveMany([j.key.autoId for j in jobs], np.stack([j.data for j in jobs])))
+			for j in jobs:
+				if j.key.autoId in bads: j.err = f"vector storage failed: {j.key.id} - invalid vector"
+		except Exception as e:
+			for j in jobs: j.err = f"vector save failed: {j.key.id} - {str(e)}"
+
+		# journal what qdrant confirmed, a restart replays it instead of embedding again
+		oks = [j for j in jobs if not j.err]
+		try: db.pics.addVecJrnl([j.key for j in oks], db.vecs.keyColl)
+		except Exception as e:
+			for j in oks: j.err = f"vector journal failed: {j.key.id} - {str(e)}"
+		for j in jobs: j.data = None
+
+	depth = max(batchSize * 2, decoders * 2, 8)
+	pp = pipe.Pipe((pipe.Job(a) for a in assets), isCancelled)
+	pp.add('rd', doRead, workers=ioWorkers, depth=depth, batch=16)
+	pp.add('dec', doDecode, workers=decoders, depth=depth)
+	pp.add('inf', doInfer, workers=inferWorkers, depth=depth, batch=batchSize)
+	pp.add('up', doUpsert, workers=1, depth=depth, batch=max(batchSize, 16))
+	return pp
+
+
+def _applyInterop(n: int) -> int:
+	'''torch only accepts it before the first parallel work of the process, keeps the current value otherwise'''
+	if torch.get_num_interop_threads() != n:
+		try: torch.set_num_interop_threads(n)
+		except RuntimeError: lg.info(f"[imgs] inter-op threads fixed at {torch.get_num_interop_threads()} for this process")
+	return torch.get_num_interop_threads()
+
+
+def _fmtRemain(tElapsed: float, cntDone: int, cntAll: int) -> str:
+	if cntDone < 5: return "Calculating..."
+
+	remainTimeSec = tElapsed / cntDone * (cntAll - cntDone) * 1.1
+
+	if remainTimeSec < 60: return f"{int(remainTimeSec)} seconds"
+	if remainTimeSec < 3600:
+		mins = remainTimeSec / 60
+		return f"{mins:.1f} minutes" if mins >= 1 else "< 1 minute"
 
-	return results
+	hours = int(remainTimeSec / 3600)
+	mins = int((remainTimeSec % 3600) / 60)
+	return f"{hours}h {mins}m"
 
 
-def processVectors(assets: List[models.Asset], photoQ, onUpdate: models.IFnProg, isCancelled: models.IFnCancel) -> models.ProcessInfo:
+def processVectors(assets: Iterable[models.Asset], photoQ, onUpdate: models.IFnProg, isCancelled: models.IFnCancel, cntAll: Optional[int]=None) -> models.ProcessInfo:
+	'''assets may be a lazy iterator, then cntAll is the total used for progress'''
 	tS = time.time()
-	pi = models.ProcessInfo(all=len(assets), done=0, skip=0, erro=0)
+	pi = models.ProcessInfo(all=cntAll if cntAll is not None else len(assets), done=0, skip=0, erro=0)  # type: ignore
 	inPct = 15
 
-	batchSize = getOptimalBatchSize()
 	commitBatch = 100
 	device_type = conf.device.type
+	cpuCnt = multiprocessing.cpu_count()
 
-	if device_type in ['cuda', 'mps']: numWorkers = 1
-	else:
-		# Check if user wants manual mode
-		if not db.dto.cpuAutoMode:
-			cpuCnt = multiprocessing.cpu_count()
-			if cpuCnt is None: cpuCnt = multiprocessing.cpu_count()
-			numWorkers = min(db.dto.cpuWorkers, cpuCnt)
-		else:
-			# Auto mode - use existing logic
-			cpuCnt = multiprocessing.cpu_count()
-			if cpuCnt is None: cpuCnt = multiprocessing.cpu_count()
-			numWorkers = min(cpuCnt // 2, cpuCnt)
+	usePool = device_type == 'cpu' and db.dto.cpuPoolMode and poolCtx() is not None
+	workers = None if device_type != 'cpu' or db.dto.cpuAutoMode else max(1, min(db.dto.cpuWorkers, cpuCnt))
+	plan = planThreads(device_type, cpuCnt, usePool, workers)
+	decoders, inferWorkers, numThreads = plan.decoders, plan.inferWorkers, plan.intra
+
+	if device_type in ['cuda', 'mps']: mode = f"{device_type.upper()} Batch"
+	elif usePool: mode = "CPU Pool"
+	else: mode = "CPU Threading"  # every infer worker runs its own batched inference
 
-	lock = threading.Lock()
 	cntDone = 0
-	updAssets = []
+	cntHit = 0
+	cntPend = 0
 	lastUpdateTime = 0
 
 	try:
+		infMode = inferMode()
+		if infMode != 'eager':
+			if device_type != 'cpu': raise RuntimeError(f"{ks.defs.cpuInfers[infMode]} inference is for cpu only, switch back to Float32 on {device_type}")
+			if onUpdate: onUpdate(inPct - 2, f"Preparing {ks.defs.cpuInfers[infMode]} model for {db.vecs.mdl}...")
+			getInferModel()
+
+		plan.inter = _applyInterop(plan.inter)
+
+		# tuned under the thread count the run will use
+		oldThreads = torch.get_num_threads()
+		torch.set_num_threads(numThreads)
+		try: batchSize = getOptimalBatchSize(onUpdate, inPct - 1)
+		finally: torch.set_num_threads(oldThreads)
+
 		if device_type == 'cuda':
 			try:
 				gpu_name = torch.cuda.get_device_name(0)
@@ -368,195 +583,72 @@ def processVectors(assets: List[models.Asset], photoQ, onUpdate: models.IFnProg,
 				deviceStr = f"Apple GPU (MPS, batch={batchSize})"
 				lg.info(f"[processVectors] Device: Apple MPS, Batch: {batchSize}")
 		else:
-			cpu_count = multiprocessing.cpu_count()
-			deviceStr = f"CPU ({cpu_count} cores, workers={numWorkers})"
-			lg.info(f"[processVectors] Device: CPU, Cores: {cpu_count}, Workers: {numWorkers}")
-
-		if onUpdate: onUpdate(inPct, f"Processing [{pi.all}] images on {deviceStr}")
-
-		batches = []
-		for i in range(0, len(assets), batchSize):
-			batch = assets[i:i + batchSize]
-			batches.append(batch)
-
-		if device_type in ['cuda', 'mps'] and batchSize > 1:
-			lg.info(f"[imgs] Using {device_type.upper()} batch processing: {len(batches)} batches of size {batchSize}")
-
-			for batchIdx, batch in enumerate(batches):
-				if isCancelled and isCancelled():
-					lg.info("[imgs] Processing cancelled by user")
-					pi.erro = len(assets) - cntDone
-					break
-
-				try:
-					results = saveVectorBatch(batch, photoQ)
-
-					with lock:
-						firstError = None
-						for asset, error in results:
-							if error:
-								lg.error(error)
-								pi.erro += 1
-								if firstError is None: firstError = error
-							else:
-								pi.done += 1
-								updAssets.append(asset)
-							cntDone += 1
-
-						# Allow processing to continue even when errors occur
-						# Original logic would stop on first error, preventing full batch processing
-						# Commenting out allows all images to be processed with complete success/failure stats
-						# if firstError and pi.erro == 1:
-						#     lg.error(f"[imgs] Stopping processing on first error: {firstError}")
-						#     pi.erro += len(assets) - cntDone
-						#     break
-
-						# Batch commit database updates
-						if len(updAssets) >= commitBatch:
-							assetsBatch = updAssets[:]
-							updAssets = []
-							with db.pics.mkConn() as conn:
-								cur = conn.cursor()
-								for a in assetsBatch: db.pics.setVectoredBy(a, cur=cur)
-								conn.commit()
-
-						currentTime = time.time()
-						tElapsed = currentTime - tS
-						needUpdate = (batchIdx % 5 == 0 or batchIdx == len(batches) - 1 or (currentTime - lastUpdateTime) > 1)
-
-						if onUpdate and needUpdate:
-							lastUpdateTime = currentTime
-
-							if cntDone >= 5:
-								avgTimePerItem = tElapsed / cntDone
-								remainCnt = pi.all - cntDone
-								remainTimeSec = avgTimePerItem * remainCnt * 1.1
-
-								if remainTimeSec < 60: remainStr = f"{int(remainTimeSec)} seconds"
-								elif remainTimeSec < 3600:
-									mins = remainTimeSec / 60
-									remainStr = f"{mins:.1f} minutes" if mins >= 1 else "< 1 minute"
-								else:
-									hours = int(remainTimeSec / 3600)
-									mins = int((remainTimeSec % 3600) / 60)
-									remainStr = f"{hours}h {mins}m"
-							else: remainStr = "Calculating..."
-
-							percent = inPct + int(cntDone / pi.all * (100 - inPct))
-							itemsPerSec = cntDone / tElapsed if tElapsed > 0 else 0
-							speedStr = f" {itemsPerSec:.1f} items/sec" if itemsPerSec > 0 else ""
-
-							msg = f"{device_type.upper()} Batch: {cntDone}/{pi.all} ok[{pi.done}]"
-							if pi.skip: msg += f" skip[{pi.skip}]"
-							if pi.erro: msg += f" error[{pi.erro}]"
-							msg += f" ( remaining: {remainStr}{speedStr} )"
-							onUpdate(percent, msg)
-				except RuntimeError as e:
-					if "Critical error during image loading" in str(e):
-						lg.error(f"Critical error encountered, stopping processing: {str(e)}")
-						with lock: pi.erro += len(assets) - cntDone
-						break
-					else:
-						lg.error(f"Batch processing failed: {str(e)}")
-						with lock:
-							pi.erro += len(batch)
-							cntDone += len(batch)
-				except Exception as e:
-					lg.error(f"Batch processing failed: {str(e)}")
-					with lock:
-						pi.erro += len(batch)
-						cntDone += len(batch)
-		else:
-			lg.info(f"[imgs] Using CPU threading: {numWorkers} workers")
-
-			with ThreadPoolExecutor(max_workers=numWorkers) as executor:
-				futures = {executor.submit(saveVectorBy, asset, photoQ): asset for asset in assets}
-
-				for future in as_completed(futures):
-					if isCancelled and isCancelled():
-						lg.info("[imgs] Processing cancelled by user")
-						executor.shutdown(wait=False, cancel_futures=True)
-						pi.erro = len(assets) - cntDone
-						break
-
-					asset = futures[future]
-					try:
-						asset, error = future.result()
-
-						with lock:
-							if error:
-								lg.error(error)
-								pi.erro += 1
-							else:
-								pi.done += 1
-								updAssets.append(asset)
-
-							cntDone += 1
-
-							# Allow processing to continue even when errors occur
-							# Original logic would stop on first error, preventing full batch processing
-							# Commenting out allows all images to be processed with complete success/failure stats
-							# if pi.erro == 1:
-							#     lg.error(f"[imgs] Stopping processing on first error: {error}")
-							#     executor.shutdown(wait=False, cancel_futures=True)
-							#     pi.erro += len(assets) - cntDone
-							#     break
-
-							if len(updAssets) >= commitBatch:
-								assetsBatch = updAssets[:]
-								updAssets = []
-								with db.pics.mkConn() as conn:
-									cur = conn.cursor()
-									for a in assetsBatch: db.pics.setVectoredBy(a, cur=cur)
-									conn.commit()
-
-							currentTime = time.time()
-							tElapsed = currentTime - tS
-							needUpdate = (cntDone % 10 == 0 or cntDone == pi.all or
-							cntDone < 10 or (currentTime - lastUpdateTime) > 1)
-
-							if onUpdate and needUpdate:
-								if isCancelled and isCancelled():
-									lg.info("[imgs] Processing cancelled during update")
-									break
-
-								lastUpdateTime = currentTime
-
-								if cntDone >= 5:
-									avgTimePerItem = tElapsed / cntDone
-									remainCnt = pi.all - cntDone
-									remainTimeSec = avgTimePerItem * remainCnt * 1.1
-
-									if remainTimeSec < 60: remainStr = f"{int(remainTimeSec)} seconds"
-									elif remainTimeSec < 3600:
-										mins = remainTimeSec / 60
-										remainStr = f"{mins:.1f} minutes" if mins >= 1 else "< 1 minute"
-									else:
-										hours = int(remainTimeSec / 3600)
-										mins = int((remainTimeSec % 3600) / 60)
-										remainStr = f"{hours}h {mins}m"
-								else: remainStr = "Calculating..."
-
-								percent = inPct + int(cntDone / pi.all * (100 - inPct))
-								itemsPerSec = cntDone / tElapsed if tElapsed > 0 else 0
-								speedStr = f" {itemsPerSec:.1f} items/sec" if itemsPerSec > 0 else ""
-
-								msg = f"CPU Threading: {cntDone}/{pi.all} ok[{pi.done}]"
-								if pi.skip: msg += f" skip[{pi.skip}]"
-								if pi.erro: msg += f" error[{pi.erro}]"
-								msg += f" ( remaining: {remainStr}{speedStr} )"
-								onUpdate(percent, msg)
-					except Exception as e:
-						with lock:
-							lg.error(f"Future execution failed for {asset.id}: {str(e)}")
-							pi.erro += 1
-							cntDone += 1
-
-		if updAssets:
-			with db.pics.mkConn() as conn:
-				cur = conn.cursor()
-				for asset in updAssets: db.pics.setVectoredBy(asset, cur=cur)
-				conn.commit()
+			deviceStr = f"CPU ({cpuCnt} cores, batch={batchSize})"
+			lg.info(f"[processVectors] Device: CPU, Cores: {cpuCnt}, Batch: {batchSize}")
+
+		lg.info(f"[processVectors] {plan} for {cpuCnt} cores")
+
+		if infMode != 'eager':
+			deviceStr += f" {infMode}"
+			chk = db.dto.cpuInferChk.get(f"{db.vecs.mdl}-{infMode}")
+			if chk: lg.info(f"[processVectors] {infMode} check: {fmtDrift(chk)}")
+
+		if onUpdate: onUpdate(inPct, f"Processing [{pi.all}] images with {db.vecs.mdl} on {deviceStr}")
+
+		pool = ProcessPoolExecutor(max_workers=decoders, mp_context=poolCtx()) if usePool else None
+		oldThreads = torch.get_num_threads()
+		torch.set_num_threads(numThreads)
+
+		pp = mkVecPipe(assets, photoQ, batchSize, decoders, inferWorkers, pool, isCancelled)
+		lg.info(f"[imgs] {mode}: model[{db.vecs.mdl}] decoders[{decoders}] infer[{inferWorkers}] batch[{batchSize}]")
+
+		try:
+			for job in pp.run():
+				if job.err:
+					lg.error(job.err)
+					pi.erro += 1
+				else:
+					pi.done += 1
+					pi.aids.append(job.key.autoId)
+					if job.meta.get('hit'): cntHit += 1
+					cntPend += 1
+				cntDone += 1
+
+				# done aids are already journaled by the upsert stage, move them into assets in batches
+				if cntPend >= commitBatch:
+					db.pics.flushVecJrnl(db.vecs.keyColl)
+					cntPend = 0
+
+				currentTime = time.time()
+				tElapsed = currentTime - tS
+				needUpdate = cntDone < 10 or cntDone >= pi.all or (currentTime - lastUpdateTime) > 1
+
+				if onUpdate and needUpdate:
+					lastUpdateTime = currentTime
+
+					percent = inPct + int(min(cntDone, pi.all) / max(pi.all, 1) * (100 - inPct))
+					itemsPerSec = cntDone / tElapsed if tElapsed > 0 else 0
+					speedStr = f" {itemsPerSec:.1f} items/sec" if itemsPerSec > 0 else ""
+
+					msg = f"{mode}: {cntDone}/{pi.all} ok[{pi.done}]"
+					if cntHit: msg += f" cached[{cntHit}]"
+					if pi.skip: msg += f" skip[{pi.skip}]"
+					if pi.erro: msg += f" error[{pi.erro}]"
+					msg += f" ( remaining: {_fmtRemain(tElapsed, cntDone, pi.all)}{speedStr} ) {plan} {pp.stats()}"
+					db.pics.setWorkerStat(wkrName, pi.done, pi.erro, itemsPerSec)
+					onUpdate(percent, msg)
+		finally:
+			if pool: pool.shutdown(wait=False, cancel_futures=True)
+			torch.set_num_threads(oldThreads)
+			lg.info(f"[imgs] pipeline stats: {pp.stats()} cached[{cntHit}] {plan} {pi.done / max(time.time() - tS, 1e-6):.1f} items/sec")
+
+			# vectors already in qdrant, keep pics.db in step even when the run fails
+			db.pics.flushVecJrnl(db.vecs.keyColl)
+			db.pics.setWorkerStat(wkrName, pi.done, pi.erro, pi.done / max(time.time() - tS, 1e-6))
+
+		if isCancelled and isCancelled():
+			lg.info("[imgs] Processing cancelled by user")
+			pi.erro = max(0, pi.all - cntDone)
 
 		if isCancelled and isCancelled():
 			if onUpdate: onUpdate(0, f"Processing cancelled! Completed: {pi.done}, Errors: {pi.erro}")
@@ -565,7 +657,7 @@ def processVectors(assets: List[models.Asset], photoQ, onUpdate: models.IFnProg,
 		if onUpdate:
 			finalElapsed = time.time() - tS
 			finalSpeed = pi.done / finalElapsed if finalElapsed > 0 else 0
-			onUpdate(100, f"Completed! done[{pi.done}] skip[{pi.skip}] error[{pi.erro}] ({finalSpeed:.1f} items/sec)")
+			onUpdate(100, f"Completed! done[{pi.done}] cached[{cntHit}] skip[{pi.skip}] error[{pi.erro}] ({finalSpeed:.1f} items/sec, {plan})")
 
 		return pi
 	except Exception as e: raise mkErr("Failed to generate vectors for assets", e)
@@ -159,6 +159,8 @@ class Asset(BaseDictModel):
     jsonExif: AssetExif = field(default_factory=AssetExif)
     isVectored: Optional[int] = 0
     simOk: Optional[int] = 0
+    phash: Optional[int] = None
+    simCnt: Optional[int] = 0
     simInfos: List[SimInfo] = field(default_factory=list)
     simGIDs: List[int] = field(default_factory=list)
 
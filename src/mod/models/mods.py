@@ -28,6 +28,7 @@ class ProcessInfo(BaseDictModel):
     skip: int = 0
     erro: int = 0
     done: int = 0
+    aids: List[int] = field(default_factory=list)  # vectored by this run
 
 
 @dataclass
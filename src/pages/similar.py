@@ -71,6 +71,7 @@ class k:
 	btnExportIds = 'sim-btn-ExportIds'
 
 	btnFind = "sim-btn-fnd"
+	btnGraph = "sim-btn-graph"
 	btnClear = "sim-btn-clear"
 	btnReset = "sim-btn-reset"
 	btnRmSel = "sim-btn-RmSel"
@@ -135,7 +136,12 @@ def layout(autoId=None):
 							htm.Span(f"Find Similar"),
 							htm.Br(),
 							htm.Small("No similar found → auto-mark resolved"),
-						], id=k.btnFind, color="primary", className="w-100", disabled=True),
+						], id=k.btnFind, color="primary", className="w-100 mb-1", disabled=True),
+						dbc.Button([
+							htm.Span("Build similarity graph"),
+							htm.Br(),
+							htm.Small("search whole library at once"),
+						], id=k.btnGraph, color="primary", outline=True, className="w-100", disabled=True),
 					], width=6),
 
 					dbc.Col([
@@ -317,9 +323,18 @@ def sim_onPagerChanged(dta_pgr, dta_now):
 		if DEBUG: lg.info(f"[sim:pager] Already on page {pgr.idx}, skipping reload")
 		return noUpd.by(2)
 
+	# next page continues from the last row shown instead of counting past every earlier one
+	after = None
+	prev = now.sim.assPend
+	if oldPgr and pgr.idx == oldPgr.idx + 1 and pgr.size == oldPgr.size and len(prev) == pgr.size:
+		after = (prev[-1].simCnt or 0, prev[-1].autoId)
+
 	now.sim.pagerPnd = pgr
 
-	paged = db.pics.getPagedPending(page=pgr.idx, size=pgr.size)
+	try: paged = db.pics.getPagedPending(page=pgr.idx, size=pgr.size, after=after)
+	except Exception as e:
+		lg.error(f"[sim:pager] load page[{pgr.idx}] failed: {str(e)}")
+		return dbc.Alert(f"Failed to load pending page {pgr.idx}: {str(e)}", color="danger", className="text-center"), noUpd
 	now.sim.assPend = paged
 
 	lg.info(f"[sim:pager] paged: {pgr.idx}/{(pgr.cnt + pgr.size - 1) // pgr.size}, got {len(paged)} items")
@@ -473,7 +488,10 @@ def sim_Load(dta_now, dta_cnt):
 	else: needReload = True
 
 	if needReload:
-		paged = db.pics.getPagedPending(page=pgr.idx, size=pgr.size)
+		try: paged = db.pics.getPagedPending(page=pgr.idx, size=pgr.size)
+		except Exception as e:
+			lg.error(f"[sim:load] pend reload failed: {str(e)}")
+			paged = []
 		lg.info(f"[sim:load] pend reload, idx[{pgr.idx}] size[{pgr.size}] got[{len(paged)}]")
 		now.sim.assPend = paged
 
@@ -532,6 +550,7 @@ ccbk(
 @cbk(
 	[
 		out(k.btnFind, "disabled"),
+		out(k.btnGraph, "disabled"),
 		out(k.btnClear, "disabled"),
 		out(k.btnReset, "disabled"),
 		out(k.btnOkAll, "disabled"),
@@ -566,6 +585,7 @@ def sim_UpdateButtons(dta_now, dta_ste, dta_cnt, dta_tsk):
 	cntNo = cnt.ass - cnt.simOk if cnt else 0
 	cntPn = cnt.simPnd if cnt else 0
 	disFind = cntNo <= 0 or (cntPn >= cntNo) or isTaskRunning
+	disGraph = cntNo <= 0 or isTaskRunning
 
 	cntSrchd = db.pics.countHasSimIds(isOk=0) if not isTaskRunning else 0
 	disClear = cntSrchd <= 0 or isTaskRunning
@@ -585,7 +605,7 @@ def sim_UpdateButtons(dta_now, dta_ste, dta_cnt, dta_tsk):
 
 	# lg.info(f"[sim:UpdBtns] disFind[{disFind}]")
 
-	return disFind, disClear, disReset, disOk, disDel, disRm, disRS, disExport
+	return disFind, disGraph, disClear, disReset, disOk, disDel, disRm, disRS, disExport
 
 
 #------------------------------------------------------------------------
@@ -642,6 +662,7 @@ def sim_OnSwitchViewGroup(clks, dta_now):
 	],
 	[
 		inp(k.btnFind, "n_clicks"),
+		inp(k.btnGraph, "n_clicks"),
 		inp(k.btnClear, "n_clicks"),
 		inp(k.btnReset, "n_clicks"),
 		inp(k.btnRmSel, "n_clicks"),
@@ -664,11 +685,11 @@ def sim_OnSwitchViewGroup(clks, dta_now):
 	prevent_initial_call=True
 )
 def sim_RunModal(
-	clk_fnd, clk_clr, clk_rst, clk_rm, clk_rs, clk_ok, clk_ra,
+	clk_fnd, clk_grp, clk_clr, clk_rst, clk_rm, clk_rs, clk_ok, clk_ra,
 	dta_now, dta_cnt, dta_mdl, dta_tsk, dta_nfy, dta_ste,
 	nchkOkAll, nchkRmSel, ncRS, ncRA
 ):
-	if not clk_fnd and not clk_clr and not clk_rst and not clk_rm and not clk_rs and not clk_ok and not clk_ra:
+	if not clk_fnd and not clk_grp and not clk_clr and not clk_rst and not clk_rm and not clk_rs and not clk_ok and not clk_ra:
 		lg.info(f"[sim:RunModal] non clicked")
 		return noUpd.by(5)
 
@@ -706,7 +727,21 @@ def sim_RunModal(
 	lg.info(f"[similar] trig[{trgId}] tsk[{tsk}]")
 
 	#------------------------------------------------------------------------
-	if trgId == k.btnClear:
+	if trgId == k.btnGraph:
+		cntNo = cnt.ass - cnt.simOk if cnt else 0
+		cntRs = db.pics.countHasSimIds(isOk=0)
+
+		mdl.reset()
+		mdl.id = ks.pg.similar
+		mdl.cmd = ks.cmd.sim.graph
+		mdl.msg = [
+			f"Build the similarity graph of ({cntNo}) unresolved assets?", htm.Br(),
+			f"All vectors are compared at once with threshold[{db.dto.thMin}]", htm.Br(),
+			f"Existing search records ({cntRs}) will be rebuilt", htm.Br(),
+			htm.B("Resolved items (simOk=1) will be kept"), htm.Br(),
+		]
+	#------------------------------------------------------------------------
+	elif trgId == k.btnClear:
 		cntRs = db.pics.countHasSimIds(isOk=0)
 		if cntRs <= 0:
 			nfy.warn(f"[similar] No search records to clear")
@@ -1005,6 +1040,76 @@ def sim_FindSimilar(doReport: IFnProg, sto: models.ITaskStore):
 
 
 
+def sim_BuildGraph(doReport: IFnProg, sto: models.ITaskStore):
+	from db import sim
+
+	nfy, now = sto.nfy, sto.now
+
+	try:
+		t0 = time.time()
+		doReport(1, "prepare..")
+
+		cntEdges, cntGrps, cntSkip = sim.buildGraph(doReport, sto.isCancelled)
+
+		if sto.isCancelled():
+			msg = "Build similarity graph cancelled, records unchanged"
+			nfy.info(msg)
+			return sto, msg
+
+		now.sim.clearAll()
+		sto.ste.clear()
+
+		doReport(100, f"Completed {cntGrps} group(s)")
+
+		msg = [f"Similarity graph built: {cntEdges} similar pairs, {cntGrps} group(s) pending"]
+		if cntSkip: msg.append(f"{cntSkip} assets resolved by group settings")
+		msg.append(f"Elapsed: {time.time() - t0:.1f}s")
+
+		lg.info(f"[sim:graph] {msg}")
+		nfy.success(msg)
+		return sto, msg
+	except Exception as e:
+		msg = f"[sim:graph] Build similarity graph failed: {str(e)}"
+		nfy.error(msg)
+		lg.error(traceback.format_exc())
+		raise RuntimeError(msg)
+
+
+def sim_Regroup(doReport: IFnProg, sto: models.ITaskStore):
+	from db import sim
+
+	nfy, now = sto.nfy, sto.now
+	thMin = db.dto.thMin
+
+	try:
+		t0 = time.time()
+		doReport(10, f"Re-grouping at threshold[{thMin}]..")
+
+		rst = sim.regroup(thMin)
+		if rst is None:
+			msg = f"Threshold[{thMin}] is below the stored neighbours, Build similarity graph again"
+			nfy.warn(msg)
+			return sto, msg
+
+		cntGrps, cntSkip = rst
+		now.sim.clearAll()
+		sto.ste.clear()
+
+		doReport(100, f"Completed {cntGrps} group(s)")
+
+		msg = [f"Re-grouped at threshold[{thMin}]: {cntGrps} group(s) pending"]
+		if cntSkip: msg.append(f"{cntSkip} assets resolved by group settings")
+		msg.append(f"Elapsed: {time.time() - t0:.1f}s")
+
+		nfy.success(msg)
+		return sto, msg
+	except Exception as e:
+		msg = f"[sim:regroup] Re-group failed: {str(e)}"
+		nfy.error(msg)
+		lg.error(traceback.format_exc())
+		raise RuntimeError(msg)
+
+
 def sim_ClearSims(doReport: IFnProg, sto: models.ITaskStore):
 	nfy, now, tsk = sto.nfy, sto.now, sto.tsk
 
@@ -1238,6 +1343,8 @@ def sim_AllDelete(doReport: IFnProg, sto: models.ITaskStore):
 # Set up global functions
 #========================================================================
 mapFns[ks.cmd.sim.fnd] = sim_FindSimilar
+mapFns[ks.cmd.sim.graph] = sim_BuildGraph
+mapFns[ks.cmd.sim.regroup] = sim_Regroup
 mapFns[ks.cmd.sim.clear] = sim_ClearSims
 mapFns[ks.cmd.sim.reset] = sim_ClearSims
 mapFns[ks.cmd.sim.selOk] = sim_SelectedResolve
@@ -16,6 +16,7 @@ dash.register_page(
 
 class K:
 	selectQ = "vector-selectPhotoQ"
+	selectMdl = "vector-selectModel"
 	btnDoVec = "vector-btnDoVec"
 	btnClear = "vector-btnClear"
 
@@ -48,13 +49,23 @@ def layout():
 									value=db.dto.photoQ,
 									className="mb-3",
 								),
-							], width=12),
+							], width=6),
+							dbc.Col([
+								dbc.Label("Model"),
+								dbc.Select(
+									id=K.selectMdl,
+									options=[{"label": lbl, "value": nam} for nam, (lbl, _) in ks.defs.mdls.items()],
+									value=db.vecs.mdl,
+									className="mb-3",
+								),
+							], width=6),
 						], className="mb-2"),
 						dbc.Row([
 							dbc.Col([
 								htm.Ul([
 									htm.Li([htm.B("Thumbnail"), htm.Small(" Fastest, but with lower detail comparison accuracy"),]),
 									htm.Li([htm.B("Preview"), htm.Small(" Medium quality, generally the most balanced option"),]),
+									htm.Li([htm.B("Model"), htm.Small(" Lighter models are much faster on CPU, every model keeps its own vectors so switching back needs no reprocessing"),]),
 								]),
 							], width=12, className=""),
 						], className="mb-0"),
@@ -66,7 +77,7 @@ def layout():
 		dbc.Row([
 
 			htm.Div([
-				cardSets.renderGpuSettings() if conf.device.type in ['cuda', 'mps'] else cardSets.renderCpuSettings()
+				cardSets.renderGpuSettings() if conf.deviceType() in ['cuda', 'mps'] else cardSets.renderCpuSettings()
 			]),
 		]),
 		dbc.Row([
@@ -110,6 +121,7 @@ def layout():
 		out(K.btnDoVec, "disabled"),
 		out(K.btnClear, "disabled"),
 		out(K.selectQ, "disabled"),
+		out(K.selectMdl, "disabled"),
 	],
 	[
 		inp(ks.sto.cnt, "data"),
@@ -163,7 +175,80 @@ def vec_UpdateStatus(dta_cnt, dta_tsk):
 		disBtnClr = True
 		disSelect = False
 
-	return btnTxt, disBtnRun, disBtnClr, disSelect
+	return btnTxt, disBtnRun, disBtnClr, disSelect, isTskRunning
+
+#------------------------------------------------------------------------
+#------------------------------------------------------------------------
+@cbk(
+	[
+		out(ks.sto.cnt, "data", allow_duplicate=True),
+		out(ks.sto.nfy, "data", allow_duplicate=True),
+	],
+	inp(K.selectMdl, "value"),
+	[
+		ste(ks.sto.tsk, "data"),
+		ste(ks.sto.nfy, "data"),
+	],
+	prevent_initial_call=True
+)
+def vec_OnModel(mdlName, dta_tsk, dta_nfy):
+	tsk = models.Tsk.fromDic(dta_tsk) if dta_tsk else models.Tsk()
+	if tsk.id or not mdlName or mdlName == db.vecs.mdl: return noUpd.by(2)
+
+	nfy = models.Nfy.fromDic(dta_nfy)
+
+	try:
+		db.useModel(mdlName)
+		nfy.info(f"Vector model switched to [{ks.defs.mdls[db.vecs.mdl][0]}]")
+	except Exception as e:
+		lg.error(f"[vec] switch model failed: {str(e)}")
+		nfy.error(f"Failed to switch model: {str(e)}")
+
+	return models.Cnt.mkNewCnt().toDict(), nfy.toDict()
+
+#------------------------------------------------------------------------
+#------------------------------------------------------------------------
+@cbk(
+	[
+		out(ks.sto.cnt, "data", allow_duplicate=True),
+		out(ks.sto.mdl, "data", allow_duplicate=True),
+		out(ks.sto.nfy, "data", allow_duplicate=True),
+	],
+	inp(cardSets.k.id(cardSets.k.cpuInfer), "value"),
+	[
+		ste(ks.sto.mdl, "data"),
+		ste(ks.sto.tsk, "data"),
+		ste(ks.sto.nfy, "data"),
+	],
+	prevent_initial_call=True
+)
+def vec_OnInfer(infer, dta_mdl, dta_tsk, dta_nfy):
+	tsk = models.Tsk.fromDic(dta_tsk) if dta_tsk else models.Tsk()
+	if tsk.id or infer not in ks.defs.cpuInfers or infer == db.vecs.infer: return noUpd.by(3)
+
+	mdl = models.Mdl.fromDic(dta_mdl)
+	nfy = models.Nfy.fromDic(dta_nfy)
+	lbl = ks.defs.cpuInfers[infer]
+
+	# frozen / int8 get used only after their check against float ran for this model
+	if infer != 'eager' and f"{db.vecs.mdl}-{infer}" not in db.dto.cpuInferChk:
+		mdl.id = ks.pg.vector
+		mdl.cmd = ks.cmd.vec.chkInfer
+		mdl.args = {'infer': infer}
+		mdl.msg = [
+			f"Build the {lbl} model of [{ks.defs.mdls[db.vecs.mdl][0]}] and check it against Float32 on library images?",
+			"It is used once the check is done, its vectors are kept apart from the other modes",
+		]
+		return noUpd, mdl.toDict(), noUpd
+
+	try:
+		db.useModel(db.vecs.mdl, infer)
+		nfy.info(f"Inference switched to [{lbl}]")
+	except Exception as e:
+		lg.error(f"[vec] switch inference failed: {str(e)}")
+		nfy.error(f"Failed to switch inference: {str(e)}")
+
+	return models.Cnt.mkNewCnt().toDict(), noUpd, nfy.toDict()
 
 #------------------------------------------------------------------------
 #------------------------------------------------------------------------
@@ -231,10 +316,29 @@ def vec_RunModal(nclk_proc, nclk_clear, photoQ, dta_now, dta_cnt, dta_mdl, dta_t
 #========================================================================
 # task acts
 #========================================================================
-import imgs
+import time
 from mod.models import IFnProg
 
+def _withWorkers(doReport: IFnProg, cntAll: int) -> IFnProg:
+	'''adds the progress other vectorize workers made since now to the local report'''
+	import imgs
+	bases = {w['name']: w['done'] for w in db.pics.getWorkerStats() if w['name'] != imgs.wkrName}
+
+	def report(percent, msg):
+		ws = db.pics.getWorkerStats()
+		if len(ws) <= 1: return doReport(percent, msg)
+
+		# a restarted worker counts from zero again
+		done = sum(w['done'] - bases.get(w['name'], 0) if w['done'] >= bases.get(w['name'], 0) else w['done'] for w in ws)
+		speed = sum(w['speed'] for w in ws)
+		percent = max(percent, min(99, 15 + int(done / max(cntAll, 1) * 85)))
+		doReport(percent, f"{msg} | workers[{len(ws)}] all[{done}/{cntAll}] {speed:.1f} items/sec")
+
+	return report
+
+
 def vec_ToVec(doReport: IFnProg, sto: models.ITaskStore):
+	import imgs
 	nfy, _, cnt = sto.nfy, sto.now, sto.cnt
 	msg = "[vec] Processing successful"
 
@@ -249,10 +353,21 @@ def vec_ToVec(doReport: IFnProg, sto: models.ITaskStore):
 			nfy.info(msg)
 			return sto, msg
 
-		assets = db.pics.getAllNonVector()
-		doReport(5, f"Getting asset data count[{len(assets)}]")
+		# frozen / int8 are cpu only, on a gpu the float collection is used again
+		if db.vecs.infer != 'eager' and conf.device.type != 'cpu':
+			db.useModel(db.vecs.mdl, 'eager')
+			doReport(2, f"Inference switched to [{ks.defs.cpuInfers['eager']}] for device[{conf.device.type}]")
+
+		# vectors saved by an interrupted run are in qdrant already, only their flags were lost
+		cntRec = db.pics.flushVecJrnl(db.vecs.keyColl)
+		if cntRec:
+			lg.info(f"[vec] recovered [{cntRec}] vectored assets from journal")
+			doReport(3, f"Recovered [ {cntRec} ] assets from the last interrupted run")
+
+		cntAll = db.pics.countNonVector()
+		doReport(5, f"Getting asset data count[{cntAll}]")
 
-		if not assets or len(assets) == 0:
+		if not cntAll:
 			msg = "No assets to process"
 			nfy.error(msg)
 			return sto, msg
@@ -263,11 +378,17 @@ def vec_ToVec(doReport: IFnProg, sto: models.ITaskStore):
 			nfy.info(msg)
 			return sto, msg
 
-		cntAll = len(assets)
 		doReport(8, f"Found [ {cntAll} ] starting processing")
 
-		# Pass the cancel checker to processVectors
-		rst = imgs.processVectors(assets, photoQ, onUpdate=doReport, isCancelled=sto.isCancelled)
+		# rows are claimed in small leased chunks while processing, so worker.py processes can share the work
+		report = _withWorkers(doReport, cntAll)
+		try:
+			rst = imgs.processVectors(db.pics.iterClaimed(imgs.wkrName), photoQ, onUpdate=report, isCancelled=sto.isCancelled, cntAll=cntAll)
+
+			while not sto.isCancelled() and db.pics.countLeased(imgs.wkrName) and len(db.pics.getWorkerStats()) > 1:
+				report(15, "Waiting for other workers to finish their claimed assets")
+				time.sleep(2)
+		finally: db.pics.releaseLeases(imgs.wkrName)
 
 		# Check for cancellation after processing
 		if sto.isCancelled():
@@ -280,6 +401,12 @@ def vec_ToVec(doReport: IFnProg, sto: models.ITaskStore):
 		msg = f"Completed: total[ {rst.all} ] done[ {rst.done} ] Skip[ {rst.skip} ]"
 		if rst.erro: msg += f" Error[ {rst.erro}]"
 
+		# a library searched before only needs the new assets searched, existing groups are kept
+		if rst.done and (db.pics.countSimOk(isOk=1) or db.pics.countHasSimIds(isOk=0)):
+			from db import sim
+			cntNew, cntGrps, _ = sim.updateNew(rst.aids, lambda p, m: doReport(90 + p // 10, m), sto.isCancelled)
+			if cntNew: msg += f", searched new[ {cntNew} ] groups updated[ {cntGrps} ]"
+
 		nfy.success(msg)
 
 		return sto, msg
@@ -327,8 +454,35 @@ def vec_Clear(doReport: IFnProg, sto: models.ITaskStore):
 		nfy.error(msg)
 		raise RuntimeError(msg)
 
+def vec_ChkInfer(doReport: IFnProg, sto: models.ITaskStore):
+	import imgs, cpus
+	nfy, cnt, tsk = sto.nfy, sto.cnt, sto.tsk
+	infer = tsk.args.get('infer')
+	lbl = ks.defs.cpuInfers.get(infer, infer)
+
+	try:
+		if infer not in ks.defs.cpuInfers or infer == 'eager': raise RuntimeError(f"No check for inference[{infer}]")
+
+		doReport(10, f"Building {lbl} model of {db.vecs.mdl} and comparing it with Float32..")
+		chk = imgs.chkCpuModel(db.vecs.mdl, infer)
+
+		doReport(90, f"Switching to the {lbl} vectors")
+		db.useModel(db.vecs.mdl, infer)
+		cnt.refreshFromDB()
+
+		msg = f"{lbl} checked on {cpus.fmtDrift(chk)}"
+		nfy.success(msg)
+
+		doReport(100, "Check complete")
+		return sto, msg
+	except Exception as e:
+		msg = f"{lbl} check failed, inference stays {ks.defs.cpuInfers[db.vecs.infer]}: {str(e)}"
+		nfy.error(msg)
+		raise RuntimeError(msg)
+
 #========================================================================
 # Set up global functions
 #========================================================================
 mapFns[ks.cmd.vec.toVec] = vec_ToVec
 mapFns[ks.cmd.vec.clear] = vec_Clear
+mapFns[ks.cmd.vec.chkInfer] = vec_ChkInfer
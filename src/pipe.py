@@ -0,0 +1,159 @@
+#------------------------------------------------------------------------
+# staged streaming pipeline with bounded queues
+#
+# src → [stage q] → workers → [stage q] → workers → ... → run() yields
+# every stage owns its input queue, so a slow stage backs up only its
+# upstream neighbour instead of stalling the whole run
+#------------------------------------------------------------------------
+import time
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+from util import log
+
+lg = log.get(__name__)
+
+_END = object()
+_tick = 0.2
+
+
+@dataclass
+class Job:
+	key: Any
+	data: Any = None
+	err: Optional[str] = None
+	meta: dict = field(default_factory=dict)
+
+
+@dataclass
+class Stage:
+	name: str
+	fn: Callable[[List[Job]], None]
+	workers: int = 1
+	depth: int = 32
+	batch: int = 1
+	flushWait: float = 0.05
+
+	q: 'queue.Queue' = field(init=False)
+	waitIn: float = 0.0     # seconds workers sat idle waiting for input
+	waitOut: float = 0.0    # seconds workers were blocked by a full downstream queue
+	cnt: int = 0
+	_alive: int = field(init=False, default=0)
+	_lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+	def __post_init__(self): self.q = queue.Queue(maxsize=max(1, self.depth))
+
+
+class Pipe:
+	def __init__(self, src: Iterable[Job], isCancelled: Optional[Callable[[], bool]]=None, depthOut: int=64):
+		self.src = src
+		self.isCancelled = isCancelled
+		self.stages: List[Stage] = []
+		self.out: queue.Queue = queue.Queue(maxsize=max(1, depthOut))
+		self.stop = threading.Event()
+		self.exc: Optional[BaseException] = None
+		self._ths: List[threading.Thread] = []
+
+	def add(self, name: str, fn: Callable[[List[Job]], None], workers=1, depth=32, batch=1, flushWait=0.05) -> 'Pipe':
+		self.stages.append(Stage(name, fn, max(1, workers), depth, max(1, batch), flushWait))
+		return self
+
+	#------------------------------------------------------------------------
+	def _put(self, q: queue.Queue, item) -> float:
+		t0 = time.time()
+		while not self.stop.is_set():
+			try:
+				q.put(item, timeout=_tick)
+				break
+			except queue.Full: continue
+		return time.time() - t0
+
+	def _get(self, q: queue.Queue, timeout: Optional[float]=None):
+		t0 = time.time()
+		while not self.stop.is_set():
+			try: return q.get(timeout=_tick if timeout is None else min(timeout, _tick))
+			except queue.Empty:
+				if timeout is not None and time.time() - t0 >= timeout: raise
+		return _END
+
+	def _feed(self):
+		try:
+			dst = self.stages[0].q if self.stages else self.out
+			for job in self.src:
+				if self.stop.is_set(): return
+				self._put(dst, job)
+		except BaseException as e: self._fail(e)
+		finally:
+			dst = self.stages[0].q if self.stages else self.out
+			self._put(dst, _END)
+
+	def _work(self, idx: int):
+		stg = self.stages[idx]
+		dst = self.stages[idx + 1].q if idx + 1 < len(self.stages) else self.out
+		ended = False
+		try:
+			while not ended and not self.stop.is_set():
+				t0 = time.time()
+				job = self._get(stg.q)
+				stg.waitIn += time.time() - t0
+				if job is _END:
+					ended = True
+					break
+
+				jobs = [job]
+				while len(jobs) < stg.batch:
+					try: nxt = self._get(stg.q, stg.flushWait)
+					except queue.Empty: break
+					if nxt is _END:
+						ended = True
+						break
+					jobs.append(nxt)
+
+				todo = [j for j in jobs if not j.err]
+				if todo: stg.fn(todo)
+				stg.cnt += len(jobs)
+
+				for j in jobs: stg.waitOut += self._put(dst, j)
+		except BaseException as e: self._fail(e)
+		finally:
+			# wake siblings, the last worker out closes the downstream queue
+			if ended: self._put(stg.q, _END)
+			with stg._lock:
+				stg._alive -= 1
+				last = stg._alive == 0
+			if last: self._put(dst, _END)
+
+	def _fail(self, e: BaseException):
+		if self.exc is None:
+			self.exc = e
+			lg.error(f"[pipe] stage failed: {type(e).__name__}: {str(e)}")
+		self.stop.set()
+
+	#------------------------------------------------------------------------
+	def stats(self) -> str:
+		return " ".join(f"{s.name}[q{s.q.qsize()} w{s.waitIn:.1f}s b{s.waitOut:.1f}s]" for s in self.stages)
+
+	def run(self) -> Iterator[Job]:
+		self._ths = [threading.Thread(target=self._feed, name="pipe-src", daemon=True)]
+		for idx, stg in enumerate(self.stages):
+			stg._alive = stg.workers
+			for n in range(stg.workers): self._ths.append(threading.Thread(target=self._work, args=(idx,), name=f"pipe-{stg.name}-{n}", daemon=True))
+
+		for th in self._ths: th.start()
+
+		try:
+			while True:
+				if self.isCancelled and self.isCancelled():
+					lg.info("[pipe] cancelled")
+					break
+				try: job = self._get(self.out, _tick)
+				except queue.Empty: continue
+				if job is _END: break
+				yield job
+		finally:
+			self.stop.set()
+			for th in self._ths: th.join(timeout=5)
+
+		if self.exc is not None: raise self.exc
@@ -0,0 +1,89 @@
+#------------------------------------------------------------------------
+# lightweight decode helpers for vectorization workers
+#
+# this module only depends on PIL / numpy, the decode workers run it
+# without ever touching torch, dash or the dbs
+#------------------------------------------------------------------------
+import os
+from io import BytesIO
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageFile
+
+ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+sizeIn = 224
+
+_heifOk: Optional[bool] = None
+
+def _regHeif():
+	global _heifOk
+	if _heifOk is not None: return _heifOk
+	try:
+		from pillow_heif import register_heif_opener
+		register_heif_opener()
+		_heifOk = True
+	except ImportError: _heifOk = False
+	return _heifOk
+
+
+def toRGB(img: Image.Image) -> Image.Image:
+	if img.mode != 'RGB': return img.convert('RGB')
+	return img
+
+
+def openScaled(src, size: int=0) -> Image.Image:
+	'''
+	open + decode asking for the smallest scale that still covers size px
+	jpeg decodes straight at 1/2..1/8 via draft, other formats (webp/png/heif)
+	have no scaled decode so they are box-reduced by an integer factor before resize
+	'''
+	img = Image.open(src)
+	if size and img.format == 'JPEG': img.draft('RGB', (size, size))
+	img.load()
+
+	if size:
+		f = min(img.width, img.height) // size
+		if f >= 2:
+			rdc = img.reduce(f)
+			img.close()
+			img = rdc
+	return img
+
+
+def _toPix(src, size: int) -> np.ndarray:
+	with openScaled(src, size) as img:
+		img = toRGB(img)
+		img = img.resize((size, size), Image.Resampling.BILINEAR)
+		return np.asarray(img, dtype=np.uint8)
+
+
+def loadPix(path: str, size: int=sizeIn) -> Tuple[Optional[np.ndarray], Optional[str]]:
+	'''
+	decode + resize one image for the model input
+	returns uint8 (size, size, 3) pixels, normalization happens batched on the inference side
+	'''
+	_regHeif()
+	try:
+		if not os.path.exists(path): return None, f"File not found: {path}"
+		return _toPix(path, size), None
+	except Exception as e: return None, f"{type(e).__name__}: {str(e)}"
+
+
+def dHash(pixs: np.ndarray) -> int:
+	'''
+	64-bit difference hash of decoded pixels, stays equal across re-encodes / resizes
+	returned as signed int64 so it fits an sqlite INTEGER
+	'''
+	img = Image.fromarray(pixs).convert('L').resize((9, 8), Image.Resampling.BOX)
+	g = np.asarray(img, dtype=np.int16)
+	bits = np.packbits(g[:, 1:] > g[:, :-1])
+	return int(bits.view('>i8')[0])
+
+
+def decodePix(data: bytes, size: int=sizeIn) -> Tuple[Optional[np.ndarray], Optional[str]]:
+	'''same as loadPix but from bytes already read by the io stage'''
+	_regHeif()
+	try: return _toPix(BytesIO(data), size), None
+	except Exception as e: return None, f"{type(e).__name__}: {str(e)}"
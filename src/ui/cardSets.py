@@ -19,6 +19,7 @@ class k:
 	showGridInfo = "showGridInfo"
 	simRtree = "simRtree"
 	simMaxItems = "simMaxItems"
+	simFloor = "simFloor"
 	pathFilter = "pathFilter"
 
 	muodOn = "muodOn"
@@ -33,6 +34,10 @@ class k:
 
 	cpuAutoMode = "cpuAutoMode"
 	cpuWorkers = "cpuWorkers"
+	cpuPoolMode = "cpuPoolMode"
+	cpuBatchSize = "cpuBatchSize"
+	cpuInfer = "cpuInfer"
+	cpuInferChk = "cpuInferChk"
 
 	libPathsData = "libPathsData"
 	libPathsContainer = "libPathsContainer"
@@ -58,6 +63,9 @@ class k:
 	@staticmethod
 	def excl(field): return {"type": "excl", "field": field}
 
+	@staticmethod
+	def phs(field): return {"type": "phs", "field": field}
+
 
 optThresholdMin = 0.5
 optThresholdMarks = {"0.5":0.5, "0.6":0.6, "0.7": 0.7, "0.8": 0.8, "0.9": 0.9, "1": 1}
@@ -65,6 +73,9 @@ optThresholdMarks = {"0.5":0.5, "0.6":0.6, "0.7": 0.7, "0.8": 0.8, "0.9": 0.9, "
 optMaxDepths = []
 for i in range(6): optMaxDepths.append({"label": f"{i}", "value": i})
 
+optSimFloor = []
+for i in [0.5, 0.6, 0.7, 0.8, 0.9]: optSimFloor.append({"label": f"{i}", "value": i})
+
 optMaxItems = []
 for i in [10, 50, 100, 200, 300, 500, 1000]: optMaxItems.append({"label": f"{i}", "value": i})
 
@@ -90,6 +101,9 @@ for i in range(1,6): optExclLess.append({"label": f" < {i}", "value": i})
 optExclOver = [{"label": "--", "value": 0}]
 for i in [3,5,10,20,30,50,100]: optExclOver.append({"label": f" > {i}", "value": i})
 
+optPhsDist = []
+for i in [0, 2, 4, 6, 8, 10]: optPhsDist.append({"label": f"{i}", "value": i})
+
 optGpuBatch = {}
 for i in [1, 2, 4, 8, 12, 16, 24, 32, 48, 64]: optGpuBatch[str(i)] = i
 
@@ -99,6 +113,9 @@ cpuCnt = multiprocessing.cpu_count()
 if cpuCnt is None: cpuCnt = multiprocessing.cpu_count()
 for i in range(1, min(cpuCnt + 1, 17)): optCpuWorkers[str(i)] = i
 
+optCpuBatch = {}
+for i in [1, 4, 8, 16, 32, 64]: optCpuBatch[str(i)] = i
+
 def renderThreshold():
 	return dbc.Card([
 		dbc.CardHeader(["Threshold Min",htm.Small("sets minimum similarity for matching")]),
@@ -113,6 +130,16 @@ def renderThreshold():
 				], className=""),
 				htm.Ul([])
 			], className="irow mb-0"),
+			htm.Div([
+				htm.Div([
+					htm.Label("Keep Neighbours From: "),
+					dbc.Select(id=k.id(k.simFloor), options=toOpts(optSimFloor), value=db.dto.simFloor, size="sm"),
+				], className="icbxs"),
+				htm.Ul([
+					htm.Li("Build similarity graph keeps neighbours down to this score"),
+					htm.Li("Moving the threshold above it re-groups in seconds, without searching again"),
+				])
+			], className="irow mb-0"),
 		])
 	], className="ifns mb-1")
 
@@ -320,6 +347,25 @@ def renderCard():
 				])
 			], className="irow"),
 
+			htm.Div([
+				htm.Label([
+					"Hash Duplicates",
+					htm.Span("Group identical / re-encoded copies by perceptual hash before the vector search", className="txt-smx text-muted ms-3")
+				], className="txt-sm"),
+				htm.Div([
+					dbc.Checkbox(id=k.phs("on"), label="Enable", value=db.dto.phs.on, className="txt-sm"),
+
+					htm.Div([
+						htm.Label("Max Bits Diff: ", className="txt-sm"),
+						dbc.Select(id=k.phs("dist"), options=optPhsDist, value=db.dto.phs.dist, className="txt-smx", disabled=not db.dto.phs.on, style={"maxWidth": "30px"})
+					]),
+				], className="icbxs"),
+				htm.Ul([
+					htm.Li("0 only matches identical hashes, 4 also catches re-encoded or resized copies, higher values may group different photos"),
+					htm.Li("Hash groups are listed first, the vector search continues with the remaining photos")
+				])
+			], className="irow"),
+
 			htm.Div([
 				htm.Label("Path Filter", className="txt-sm"),
 				htm.Div([
@@ -395,14 +441,23 @@ def renderCard():
 	], className="ifns mb-0")
 
 
+def _isTaskRunning() -> bool:
+	from mod.mgr.tskSvc import mgr
+	if not mgr: return False
+	return any(info.status.value in ['pending', 'running'] for info in mgr.list().values())
+
+
 @cbk(
 	[
 		out(ks.sto.now, "data", allow_duplicate=True),
 		out(k.id(k.muodMx), "disabled", allow_duplicate=True),
 		out(k.id(k.muodOn), "value", allow_duplicate=True),
 		out(k.id(k.simRtree), "value", allow_duplicate=True),
+		out(ks.sto.tsk, "data", allow_duplicate=True),
+		out(ks.sto.nfy, "data", allow_duplicate=True),
 	],
 	inp(k.id(k.threshold), "value"),
+	inp(k.id(k.simFloor), "value"),
 	inp(k.id(k.autoNext), "value"),
 	inp(k.id(k.showGridInfo), "value"),
 	inp(k.id(k.simRtree), "value"),
@@ -415,17 +470,32 @@ def renderCard():
 	inp(k.id(k.gpskEqH), "value"),
 	inp(k.id(k.gpskEqFsz), "value"),
 	ste(ks.sto.now, "data"),
+	ste(ks.sto.nfy, "data"),
 	prevent_initial_call=True
 )
-def settings_OnUpd(th, auNxt, shGdInfo, rtree,  maxItems, pathFilter, muodOn, muodMxGs, gDt, gW, gH, gFsz, dta_now):
-	retNow = noUpd
+def settings_OnUpd(th, floor, auNxt, shGdInfo, rtree,  maxItems, pathFilter, muodOn, muodMxGs, gDt, gW, gH, gFsz, dta_now, dta_nfy):
+	retNow, retTsk, retNfy = noUpd, noUpd, noUpd
 
 	trigId = getTrgId()
 	lg.info(f'trig: [{trigId}] tree[{rtree}] muod[{muodOn}]')
 
 	now = models.Now.fromDic(dta_now)
 
+	thOld = db.dto.thMin
 	db.dto.thMin = co.vad.float(th, 0.93, 0.50, 1.0)
+	db.dto.simFloor = co.vad.float(floor, 0.6, 0.50, 1.0)
+
+	# groups follow the threshold from the stored neighbours of the last graph build
+	if trigId == k.threshold and db.dto.thMin != thOld and db.dto.simNbrsFloor > 0:
+		if db.dto.thMin < db.dto.simNbrsFloor:
+			nfy = models.Nfy.fromDic(dta_nfy)
+			nfy.warn(f"Threshold below the stored neighbours ({db.dto.simNbrsFloor}), Build similarity graph again to re-group")
+			retNfy = nfy.toDict()
+		elif not _isTaskRunning():
+			mdl = models.Mdl()
+			mdl.id = ks.pg.similar
+			mdl.cmd = ks.cmd.sim.regroup
+			retTsk = mdl.mkTsk().toDict()
 
 	db.dto.autoNext = auNxt
 	db.dto.rtreeMax = maxItems
@@ -460,7 +530,7 @@ def settings_OnUpd(th, auNxt, shGdInfo, rtree,  maxItems, pathFilter, muodOn, mu
 			now.sim.assCur = db.pics.getSimAssets(now.sim.assAid, db.dto.rtree if not db.dto.muod.on else False)
 			retNow = now
 
-	return [retNow, disMuodMx, muodOn, rtree]
+	return [retNow, disMuodMx, muodOn, rtree, retTsk, retNfy]
 
 
 @cbk(
@@ -523,6 +593,25 @@ def excl_OnUpd(values):
 	return [False if f == 'on' else not e.on for f in fields]
 
 
+@cbk(
+	out({"type": "phs", "field": ALL}, "disabled"),
+	inp({"type": "phs", "field": ALL}, "value"),
+	prevent_initial_call=True
+)
+def phs_OnUpd(values):
+	p = db.dto.phs
+
+	fields = []
+	for item in ctx.inputs_list[0]:
+		fld = item['id']['field']
+		val = item['value']
+		fields.append(fld)
+		setattr(p, fld, int(val) if fld == 'dist' else val)
+
+	lg.info(f"[phs:OnUpd] {p}")
+	return [False if f == 'on' else not p.on for f in fields]
+
+
 def renderGpuSettings():
 	return dbc.Card([
 		dbc.CardHeader("GPU Performance"),
@@ -547,7 +636,7 @@ def renderGpuSettings():
 
 				]),
 				htm.Ul([
-					htm.Li([htm.B("Auto Mode: "), "Automatically selects optimal batch size based on GPU memory"]),
+					htm.Li([htm.B("Auto Mode: "), "Measures images/sec at increasing batch sizes once per GPU and model, keeps the fastest"]),
 					htm.Li([htm.B("Manual Mode: "), "Manually adjust batch size. Larger values use more GPU memory but may be faster"]),
 					htm.Li([htm.B("Suggested: "), "8GB GPU use 8-12, 16GB+ GPU can use 16-32"])
 				])
@@ -558,6 +647,8 @@ def renderGpuSettings():
 
 def renderCpuSettings():
 	import multiprocessing
+	import cpus
+	infer = db.vecs.infer
 	cpuCnt = multiprocessing.cpu_count()
 	if cpuCnt is None: cpuCnt = multiprocessing.cpu_count()
 	return dbc.Card([
@@ -566,7 +657,7 @@ def renderCpuSettings():
 			htm.Div([
 				htm.Label("CPU Multi-Threading", className="txt-sm"),
 				htm.Div([
-					dbc.Checkbox(id=k.id(k.cpuAutoMode), label="Auto Workers", value=db.dto.cpuAutoMode),
+					dbc.Checkbox(id=k.id(k.cpuAutoMode), label="Auto Workers & Batch", value=db.dto.cpuAutoMode),
 
 					htm.Div([
 						htm.Label("Worker Threads: "),
@@ -580,11 +671,33 @@ def renderCpuSettings():
 						)
 					], className="mt-2"),
 
+					dbc.Checkbox(id=k.id(k.cpuPoolMode), label="Process Pool Batching", value=db.dto.cpuPoolMode, className="mt-2"),
+
+					htm.Div([
+						htm.Label("Batch Size: "),
+						dcc.Slider(
+							id=k.id(k.cpuBatchSize),
+							min=1, max=64, step=1,
+							value=db.dto.cpuBatchSize,
+							marks=optCpuBatch,
+							disabled=db.dto.cpuAutoMode,
+							tooltip={"placement": "top", "always_visible": True}
+						)
+					], className="mt-2"),
+
+					htm.Div([
+						htm.Label("Inference: "),
+						dbc.Select(id=k.id(k.cpuInfer), options=[{"label": lbl, "value": v} for v, lbl in ks.defs.cpuInfers.items()], value=infer, size="sm"),
+						htm.Small(id=k.id(k.cpuInferChk), children=cpus.fmtDrift(db.dto.cpuInferChk.get(f"{db.vecs.mdl}-{infer}")) if infer != 'eager' else "", className="text-muted"),
+					], className="mt-2"),
+
 				]),
 				htm.Ul([
-					htm.Li([htm.B("Auto Mode: "), f"Uses {min(cpuCnt // 2, 4)} threads (CPU cores: {cpuCnt})"]),
-					htm.Li([htm.B("Manual Mode: "), "Manually adjust thread count. More threads may be faster but consume more resources"]),
-					htm.Li([htm.B("Suggested: "), f"For {cpuCnt}-core CPU, recommend {min(cpuCnt // 2, 8)} threads"])
+					htm.Li([htm.B("Auto Mode: "), f"Splits the {cpuCnt} cores as {cpus.planThreads('cpu', cpuCnt, db.dto.cpuPoolMode)}, batch size is measured once per model and kept"]),
+					htm.Li([htm.B("Manual Mode: "), "Sets the decode and infer workers, torch threads get the remaining cores so the total never exceeds them"]),
+					htm.Li([htm.B("Process Pool: "), "Workers decode images in separate processes, one model runs batched inference on the remaining cores"]),
+					htm.Li([htm.B("Inference: "), "Frozen and Int8 are built and checked against Float32 once per model before use, each keeps its own vectors. Int8 is several times faster with a small score drift, mind it before lowering thresholds"]),
+					htm.Li([htm.B("Suggested: "), f"Keep Auto, lower the workers manually only to leave cores of this {cpuCnt}-core CPU to other services"])
 				])
 			], className="irow"),
 		])
@@ -613,19 +726,29 @@ def gpuSettings_OnUpd(autoMode, batchSize):
 @cbk(
 	[
 		out(k.id(k.cpuWorkers), "disabled"),
+		out(k.id(k.cpuBatchSize), "disabled"),
+		out(k.id(k.cpuInferChk), "children"),
 	],
 	inp(k.id(k.cpuAutoMode), "value"),
 	inp(k.id(k.cpuWorkers), "value"),
+	inp(k.id(k.cpuPoolMode), "value"),
+	inp(k.id(k.cpuBatchSize), "value"),
+	inp(k.id(k.cpuInfer), "value"),
 	prevent_initial_call=True
 )
-def cpuSettings_OnUpd(autoMode, workers):
+def cpuSettings_OnUpd(autoMode, workers, poolMode, batchSize, infer):
+	import cpus
 	db.dto.cpuAutoMode = autoMode
 	db.dto.cpuWorkers = workers
+	db.dto.cpuPoolMode = poolMode
+	db.dto.cpuBatchSize = batchSize
+
+	lg.info(f"[cpuSets:OnUpd] AutoMode[{autoMode}] Workers[{workers}] PoolMode[{poolMode}] BatchSize[{batchSize}] Infer[{infer}]")
 
-	lg.info(f"[cpuSets:OnUpd] AutoMode[{autoMode}] Workers[{workers}]")
+	txtChk = cpus.fmtDrift(db.dto.cpuInferChk.get(f"{db.vecs.mdl}-{infer}")) if infer != 'eager' else ""
 
 	dis = autoMode
-	return [dis]
+	return [dis, dis, txtChk]
 
 
 @cbk(
@@ -57,8 +57,14 @@ def onUpdateSideBar(_trigger, dta_count, dta_nfy):
 		lg.info(f'[sidebar] refresh cnt')
 		cnt.refreshFromDB()
 
-	dvcType = conf.device.type
-	if dvcType == 'cuda':
+	# the device is known once torch got loaded (warm-up or first vectorize), the sidebar never loads it
+	dvc = conf.peekDevice()
+	dvcType = dvc.type if dvc else None
+	if dvcType is None:
+		# without warm-up nothing resolves it before the first vectorize
+		dvcInfo = "detecting.." if envs.warmUp else "on first vectorize"
+		dvcStyle = "tag second"
+	elif dvcType == 'cuda':
 		import torch
 		try:
 			gpuNam = torch.cuda.get_device_name(0)
@@ -92,7 +98,7 @@ def onUpdateSideBar(_trigger, dta_count, dta_nfy):
 		], className="mb-2"),
 		dbc.Row([
 			dbc.Col(htm.Small("device"), width=3),
-			dbc.Col(htm.Span(dvcInfo, className=f"{dvcStyle} warp", title=f"Device: {conf.device}"))
+			dbc.Col(htm.Span(dvcInfo, className=f"{dvcStyle} warp", title=f"Device: {dvc or 'not loaded yet'}"))
 		], className="mb-2"),
 	]
 
@@ -0,0 +1,83 @@
+'''
+standalone vectorize worker
+
+runs the same extraction as the Vectors page, pending assets are claimed through
+leases in pics.db, so several processes, or hosts sharing the data dir and qdrant,
+can vectorize one library together; the Vectors task shows their combined progress
+
+settings (model, photoQ, cpu options) are read once at start, restart workers after changing them
+
+	python -m src.worker             exit when nothing is left to claim
+	python -m src.worker --follow    keep polling for newly fetched assets
+'''
+import os
+import sys
+import time
+import signal
+import argparse
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from util import log
+import db, imgs
+
+lg = log.get(__name__)
+
+_stop = threading.Event()
+_lastLog = 0.0
+
+
+def _onSignal(sig, _):
+	lg.info(f"[worker] signal[{sig}] stopping after the current batch")
+	_stop.set()
+
+
+def _report(percent, msg):
+	global _lastLog
+	now = time.time()
+	if now - _lastLog < 10 and percent < 100: return
+	_lastLog = now
+	lg.info(f"[worker] {percent}% {msg}")
+
+
+def run(follow=False, chunk=64, ttl=600.0, poll=30.0) -> int:
+	db.sets.init()
+	db.pics.init()
+	db.vecs.init(db.dto.vecModel, db.dto.cpuInfer)
+	db.embs.init()
+
+	lg.info(f"[worker] {imgs.wkrName} start, model[{db.vecs.mdl}] infer[{db.vecs.infer}] photoQ[{db.dto.photoQ}] chunk[{chunk}] ttl[{ttl}s]")
+	tS = time.time()
+	done = 0
+	try:
+		while not _stop.is_set():
+			db.pics.flushVecJrnl(db.vecs.keyColl)
+			cnt = db.pics.countNonVector()
+			if cnt:
+				pi = imgs.processVectors(db.pics.iterClaimed(imgs.wkrName, chunk, ttl), db.dto.photoQ, onUpdate=_report, isCancelled=_stop.is_set, cntAll=cnt)
+				done += pi.done
+				db.pics.releaseLeases(imgs.wkrName)
+
+			if not follow: break
+			_stop.wait(poll)
+	finally:
+		db.pics.releaseLeases(imgs.wkrName)
+		db.close()
+
+	lg.info(f"[worker] {imgs.wkrName} stopped, done[{done}] in {time.time() - tS:.1f}s")
+	return done
+
+
+if __name__ == "__main__":
+	ap = argparse.ArgumentParser(description="Deduper vectorize worker")
+	ap.add_argument('--follow', action='store_true', help="keep running and poll for new assets")
+	ap.add_argument('--chunk', type=int, default=64, help="assets claimed per lease")
+	ap.add_argument('--ttl', type=float, default=600.0, help="lease seconds before others may claim again")
+	ap.add_argument('--poll', type=float, default=30.0, help="seconds between polls with --follow")
+	args = ap.parse_args()
+
+	signal.signal(signal.SIGINT, _onSignal)
+	signal.signal(signal.SIGTERM, _onSignal)
+
+	run(args.follow, args.chunk, args.ttl, args.poll)
@@ -0,0 +1,58 @@
+import unittest
+import os
+import sys
+import random
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from db import dsu
+
+
+def bruteComps(edges):
+    adj = {}
+    for a, b, _ in edges:
+        adj.setdefault(a, set()).add(b)
+        adj.setdefault(b, set()).add(a)
+    seen, comps = set(), []
+    for n in sorted(adj):
+        if n in seen: continue
+        stack, comp = [n], []
+        seen.add(n)
+        while stack:
+            x = stack.pop()
+            comp.append(x)
+            for y in adj[x] - seen:
+                seen.add(y)
+                stack.append(y)
+        comps.append(sorted(comp))
+    return sorted(comps, key=lambda c: c[0])
+
+
+class TestDsu(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(3)
+        self.edges = [(rnd.randrange(400), rnd.randrange(400), round(rnd.uniform(0.9, 1.0), 4)) for _ in range(300)]
+        self.edges = [e for e in self.edges if e[0] != e[1]]
+
+    def test_components_match_bfs(self):
+        self.assertEqual(dsu.groups(self.edges), bruteComps(self.edges))
+
+    def test_split_oversized_by_weakest_links(self):
+        # two tight triangles joined by one weak link
+        edges = [(1, 2, .99), (2, 3, .99), (1, 3, .98), (4, 5, .99), (5, 6, .99), (4, 6, .98), (3, 4, .91)]
+        self.assertEqual(dsu.groups(edges), [[1, 2, 3, 4, 5, 6]])
+        self.assertEqual(dsu.groups(edges, maxSize=3), [[1, 2, 3], [4, 5, 6]])
+
+        for g in dsu.groups(self.edges, maxSize=5): self.assertLessEqual(len(g), 5)
+        capped = {m for g in dsu.groups(self.edges, maxSize=5) for m in g}
+        self.assertTrue(capped <= {m for g in dsu.groups(self.edges) for m in g})
+
+    def test_main_is_deterministic(self):
+        edges = [(1, 2, .95), (2, 3, .97), (3, 2, .97), (2, 1, .95)]
+        comps = dsu.groups(edges)
+        self.assertEqual(dsu.mains(comps, edges), [2])
+        self.assertEqual(dsu.mains(comps, list(reversed(edges))), [2])
+        self.assertEqual(dsu.mains([[5, 7]], [(7, 5, .96), (5, 7, .96)]), [5])
+
+
+if __name__ == '__main__':
+    unittest.main()
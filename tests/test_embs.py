@@ -0,0 +1,55 @@
+import unittest
+import os
+import sys
+import tempfile
+import multiprocessing
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+
+from db import embs
+
+
+def keysOf(tag, n): return [(f"/{tag}/{i}.jpg", 100 + i, 1000 + i) for i in range(n)]
+
+
+def putBatch(tag, val, n):
+    embs.putMany(keysOf(tag, n), np.full((n, 4), val, dtype=np.float32), 'mdl', 'thumb')
+
+
+def putChild(tag, val, n, q):
+    putBatch(tag, val, n)
+    q.put(tag)
+
+
+class TestEmbs(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        embs.close()
+        embs.pathDir = self.tmp.name + '/'
+        embs.pathDb = os.path.join(self.tmp.name, 'embs.db')
+        embs.init()
+
+    def tearDown(self):
+        embs.close()
+        self.tmp.cleanup()
+
+    def test_rows_not_reused_across_processes(self):
+        # A writes, B (another process sharing the dir) appends, A writes again
+        putBatch('A', 1, 3)
+        ctx = multiprocessing.get_context('fork')
+        q = ctx.Queue()
+        p = ctx.Process(target=putChild, args=('B', 2, 3, q))
+        p.start()
+        self.assertEqual(q.get(timeout=60), 'B')
+        p.join(timeout=10)
+        putBatch('C', 3, 3)
+
+        for tag, val in (('A', 1), ('B', 2), ('C', 3)):
+            hits = embs.getMany(keysOf(tag, 3), 'mdl', 'thumb', 4)
+            self.assertEqual(sorted(hits), [0, 1, 2])
+            for vec, _ in hits.values(): self.assertTrue((vec == val).all(), f"{tag} got {vec}")
+
+
+if __name__ == '__main__':
+    unittest.main()
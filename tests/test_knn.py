@@ -0,0 +1,80 @@
+import unittest
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+
+from db import knn
+
+
+def bruteTopK(mat, srcs, k, thMin):
+    sc = mat[srcs] @ mat.T
+    rst = {}
+    for i, s in enumerate(srcs):
+        hits = [(float(sc[i, c]), c) for c in range(len(mat)) if c != s and sc[i, c] >= thMin]
+        rst[int(s)] = [c for _, c in sorted(hits, key=lambda h: (-h[0], h[1]))[:k]]
+    return rst
+
+
+def collect(gen):
+    rst, dones = {}, []
+    for done, (src, dst, scs) in gen:
+        dones.append(done)
+        for s, d in zip(src, dst): rst.setdefault(int(s), []).append(int(d))
+    return rst, dones
+
+
+class TestKnn(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        centers = rng.standard_normal((40, 64))
+        self.mat = (centers[rng.integers(0, 40, 700)] + 0.3 * rng.standard_normal((700, 64))).astype(np.float32)
+        knn.normRows(self.mat)
+
+    def test_rows_normalised(self):
+        self.assertTrue(np.allclose(np.linalg.norm(self.mat, axis=1), 1.0, atol=1e-5))
+
+    def test_topk_matches_bruteforce(self):
+        srcs = np.arange(0, 700, 3)
+        for k, thMin in ((5, 0.8), (30, 0.9), (99, 0.5)):
+            got, dones = collect(knn.topK(self.mat, srcs, k, thMin, block=64, colChunk=100, workers=3))
+            want = bruteTopK(self.mat, srcs, k, thMin)
+            self.assertEqual(dones[-1], len(srcs))
+            self.assertEqual(dones, sorted(dones))
+            for s in srcs:
+                g, w = got.get(int(s), []), want[int(s)]
+                self.assertEqual(len(g), len(w), f"k={k} th={thMin} src={s}")
+                # equal scores may swap places, the score sets must match
+                sc = self.mat[s] @ self.mat.T
+                self.assertTrue(np.allclose(sorted(sc[g]), sorted(sc[w]), atol=1e-5))
+                self.assertNotIn(int(s), g)
+
+    def test_flood_capped_per_row(self):
+        mat = np.ones((300, 8), dtype=np.float32)
+        knn.normRows(mat)
+        got, _ = collect(knn.topK(mat, np.arange(300), 7, 0.9, block=50, colChunk=64, workers=2))
+        self.assertEqual(len(got), 300)
+        for s, ds in got.items():
+            self.assertEqual(len(ds), 7)
+            self.assertNotIn(s, ds)
+
+    def test_blocks_in_flight_bounded(self):
+        started = []
+        def isCancel():
+            started.append(1)
+            return False
+
+        gen = knn.topK(self.mat, np.arange(700), 5, 0.9, block=20, workers=2, isCancel=isCancel)
+        next(gen)
+        self.assertLessEqual(len(started), 4)
+        gen.close()
+
+    def test_cancel_yields_empty_blocks(self):
+        got, dones = collect(knn.topK(self.mat, np.arange(700), 5, 0.5, block=100, workers=2, isCancel=lambda: True))
+        self.assertEqual(got, {})
+        self.assertEqual(dones[-1], 700)
+
+
+if __name__ == '__main__':
+    unittest.main()
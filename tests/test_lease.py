@@ -0,0 +1,66 @@
+import unittest
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from db import pics
+
+
+def claimAll(pathDb, worker, q):
+    pics.pathDb = pathDb
+    got = []
+    for a in pics.iterClaimed(worker, chunk=7):
+        got.append(a.autoId)
+        # vectored + journaled like the upsert stage does, then flushed now and then
+        a.phash = a.autoId
+        pics.addVecJrnl([a], 'coll')
+        if len(got) % 5 == 0: pics.flushVecJrnl('coll')
+    pics.flushVecJrnl('coll')
+    q.put((worker, got))
+
+
+class TestLease(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        pics.pathDb = os.path.join(self.tmp.name, 'pics.db')
+        pics.init()
+        with pics.mkConn() as conn:
+            conn.executemany("INSERT INTO assets (id, pathThumbnail) VALUES (?, ?)", [(f"a{i}", f"t/{i}.jpg") for i in range(300)])
+            conn.commit()
+
+    def tearDown(self): self.tmp.cleanup()
+
+    def test_claims_disjoint_across_processes(self):
+        ctx = multiprocessing.get_context('fork')
+        q = ctx.Queue()
+        ps = [ctx.Process(target=claimAll, args=(pics.pathDb, f"w{n}", q)) for n in range(4)]
+        for p in ps: p.start()
+        rsts = dict(q.get(timeout=60) for _ in ps)
+        for p in ps: p.join(timeout=10)
+
+        aids = [a for got in rsts.values() for a in got]
+        self.assertEqual(len(aids), 300)
+        self.assertEqual(len(set(aids)), 300)
+        self.assertEqual(pics.countNonVector(), 0)
+        self.assertEqual(pics.countLeased(), 0)
+
+    def test_expired_lease_is_claimed_again(self):
+        first = pics.claimNonVector('w0', 10, ttl=0.05)
+        self.assertEqual(len(first), 10)
+        self.assertEqual([a.autoId for a in pics.claimNonVector('w1', 10)], list(range(11, 21)))
+
+        time.sleep(0.1)
+        again = pics.claimNonVector('w1', 10)
+        self.assertEqual([a.autoId for a in again], [a.autoId for a in first])
+
+        # a worker never re-claims what it still holds, release gives it back
+        self.assertEqual(pics.claimNonVector('w1', 5)[0].autoId, 21)
+        pics.releaseLeases('w1')
+        self.assertEqual(pics.claimNonVector('w2', 5)[0].autoId, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import os
+import sys
+import sqlite3
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from db import lite
+
+
+def isClosed(conn):
+    try: conn.execute("SELECT 1")
+    except sqlite3.ProgrammingError: return True
+    return False
+
+
+class TestPool(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'a.db')
+        self.opened = []
+        self.pool = lite.Pool(lambda: self.path, onOpen=self.opened.append, maxIdle=2)
+        with self.pool.conn() as c:
+            c.execute("CREATE TABLE t (v INTEGER)")
+            c.commit()
+
+    def tearDown(self):
+        self.pool.reset()
+        self.tmp.cleanup()
+
+    def test_reuse_after_return(self):
+        with self.pool.conn() as a: pass
+        with self.pool.conn() as b: pass
+        self.assertIs(a, b)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_nested_use_gets_own_connection(self):
+        with self.pool.conn() as a:
+            with self.pool.conn() as b:
+                self.assertIsNot(a, b)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_uncommitted_rolled_back(self):
+        with self.pool.conn() as c: c.execute("INSERT INTO t VALUES (1)")
+        with self.pool.conn() as c:
+            self.assertFalse(c.in_transaction)
+            self.assertEqual(c.execute("SELECT COUNT(*) FROM t").fetchone()[0], 0)
+
+    def test_error_closes_connection(self):
+        with self.assertRaises(ValueError):
+            with self.pool.conn() as a: raise ValueError("x")
+        self.assertTrue(isClosed(a))
+        with self.pool.conn() as b: self.assertIsNot(a, b)
+
+    def test_max_idle(self):
+        with self.pool.conn() as a, self.pool.conn() as b, self.pool.conn() as c: pass
+        self.assertEqual(len(self.pool._idle), 2)
+        self.assertEqual(sum(isClosed(x) for x in (a, b, c)), 1)
+
+    def test_reset_closes_idle_and_in_use(self):
+        with self.pool.conn() as idle: pass
+        gen = self.pool.gen
+        with self.pool.conn() as busy:
+            self.pool.reset()
+            self.assertEqual(self.pool.gen, gen + 1)
+            self.assertFalse(isClosed(busy))
+        self.assertTrue(isClosed(busy))
+        with self.pool.conn() as fresh: self.assertIsNot(fresh, busy)
+
+    def test_path_change_drops_old(self):
+        with self.pool.conn() as a: pass
+        self.path = os.path.join(self.tmp.name, 'b.db')
+        with self.pool.conn() as b:
+            self.assertIsNot(a, b)
+            self.assertEqual(b.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0], 0)
+        self.assertTrue(isClosed(a))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+
+from db import pics, sets
+
+
+class TestPending(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        sets.close()
+        sets.pathDb = os.path.join(self.tmp.name, 'sets.db')
+        sets._initialized = False
+        sets.init()
+        pics.close()
+        pics.pathDb = os.path.join(self.tmp.name, 'pics.db')
+        pics.init()
+        with pics.mkConn() as conn:
+            conn.executemany("INSERT INTO assets (autoId, id, isVectored, originalFileName) VALUES (?, ?, 1, ?)", [(i, f"a{i}", f"f{i}.jpg") for i in range(1, 61)])
+            conn.commit()
+
+    def tearDown(self):
+        pics.close()
+        sets.close()
+        self.tmp.cleanup()
+
+    def mismatches(self):
+        with pics.mkConn() as conn:
+            return conn.execute("""
+                SELECT a.autoId, a.simCnt, (SELECT COUNT(*) FROM assetsSims s WHERE s.autoId = a.autoId) AS n
+                FROM assets a WHERE a.simCnt != n
+            """).fetchall()
+
+    def fill(self, seed=3):
+        rng = np.random.default_rng(seed)
+        with pics.mkConn() as conn:
+            for aid in range(1, 61):
+                nbrs = {aid} | set(int(x) for x in rng.integers(1, 61, int(rng.integers(0, 6))))
+                conn.executemany("INSERT OR IGNORE INTO assetsSims (autoId, simAid, score, isSelf) VALUES (?, ?, ?, ?)",
+                    [(aid, b, 1.0 if b == aid else float(rng.uniform(0.9, 1.0)), int(b == aid)) for b in nbrs])
+                if aid % 3 != 0: conn.execute("INSERT INTO assetsGrps (autoId, groupId, isMain) VALUES (?, ?, 1)", (aid, aid))
+            conn.commit()
+
+    def test_simcnt_follows_inserts_and_deletes(self):
+        self.fill()
+        self.assertEqual(self.mismatches(), [])
+        with pics.mkConn() as conn:
+            conn.execute("DELETE FROM assetsSims WHERE autoId IN (5, 6) AND isSelf = 0")
+            conn.execute("DELETE FROM assetsSims WHERE simAid = 7")
+            conn.commit()
+        self.assertEqual(self.mismatches(), [])
+
+    def test_simcnt_insert_or_replace(self):
+        self.fill()
+        with pics.mkConn() as conn:
+            conn.execute("INSERT OR REPLACE INTO assetsSims (autoId, simAid, score, isSelf) VALUES (1, 1, 1.0, 1)")
+            conn.execute("INSERT OR REPLACE INTO assetsSims (autoId, simAid, score, isSelf) VALUES (1, 60, 0.95, 0)")
+            conn.commit()
+        self.assertEqual(self.mismatches(), [])
+
+    def test_simcnt_asset_delete_cascades(self):
+        self.fill()
+        with pics.mkConn() as conn:
+            conn.execute("DELETE FROM assets WHERE autoId IN (2, 9, 30)")
+            conn.commit()
+        self.assertEqual(self.mismatches(), [])
+
+    def test_keyset_matches_offset(self):
+        self.fill()
+        total = pics.countSimPending()
+        self.assertGreater(total, 20)
+
+        size = 7
+        byOffset = []
+        for page in range(1, total // size + 2): byOffset += [a.autoId for a in pics.getPagedPending(page, size)]
+
+        byKey, after = [], None
+        while True:
+            rows = pics.getPagedPending(size=size, after=after)
+            if not rows: break
+            byKey += [a.autoId for a in rows]
+            after = (rows[-1].simCnt, rows[-1].autoId)
+
+        self.assertEqual(byKey, byOffset)
+        self.assertEqual(len(byKey), total)
+
+        with pics.mkConn() as conn:
+            want = [r[0] for r in conn.execute("""
+                SELECT a.autoId FROM assets a JOIN assetsGrps ag ON ag.autoId = a.autoId AND ag.isMain = 1
+                WHERE a.simOk = 0 AND a.simCnt > 1 ORDER BY a.simCnt DESC, a.autoId
+            """)]
+        self.assertEqual(byKey, want)
+
+    def test_page_carries_sim_infos(self):
+        self.fill()
+        for a in pics.getPagedPending(1, 10):
+            self.assertEqual(len(a.simInfos), a.simCnt)
+            self.assertEqual(a.simInfos, sorted(a.simInfos, key=lambda i: -i.score))
+
+
+if __name__ == '__main__':
+    unittest.main()
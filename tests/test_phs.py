@@ -0,0 +1,73 @@
+import unittest
+import os
+import sys
+import random
+from io import BytesIO
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+from PIL import Image
+
+import pix
+from db import phs
+
+
+def bruteGroups(items, r):
+    parent = {aid: aid for aid, _ in items}
+    def find(x):
+        while parent[x] != x: x = parent[x]
+        return x
+    for i, (a, ha) in enumerate(items):
+        for b, hb in items[i + 1:]:
+            if phs.dist(ha, hb) <= r: parent[max(find(a), find(b))] = min(find(a), find(b))
+    comps = {}
+    for aid, _ in items: comps.setdefault(find(aid), []).append(aid)
+    return sorted([sorted(g) for g in comps.values() if len(g) > 1], key=lambda g: g[0])
+
+
+class TestPhs(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(7)
+        bases = [rnd.getrandbits(64) - (1 << 63) for _ in range(200)]
+        self.items = []
+        for aid in range(1, 601):
+            h = bases[rnd.randrange(len(bases))]
+            for _ in range(rnd.randrange(6)): h ^= 1 << rnd.randrange(64)
+            if h >= 1 << 63: h -= 1 << 64
+            self.items.append((aid, h))
+
+    def test_dist(self):
+        self.assertEqual(phs.dist(0, -1), 64)
+        self.assertEqual(phs.dist(-2, -1), 1)
+        self.assertEqual(phs.dist(5, 5), 0)
+
+    def test_groups_match_bruteforce(self):
+        for r in (0, 2, 4, 6):
+            self.assertEqual(phs.groups(self.items, r), bruteGroups(self.items, r), f"r={r}")
+
+    def test_near(self):
+        idx = phs.HamIdx(self.items, 4)
+        aid, h = self.items[0]
+        got = sorted(idx.near(h))
+        want = sorted((a, phs.dist(h, hh)) for a, hh in self.items if phs.dist(h, hh) <= 4)
+        self.assertEqual(got, want)
+
+    def test_dhash_reencode(self):
+        rnd = np.random.default_rng(3)
+        img = Image.fromarray((rnd.random((60, 80, 3)) * 255).astype('uint8')).resize((800, 600), Image.Resampling.BICUBIC)
+        buf = BytesIO()
+        img.resize((400, 300)).save(buf, format='JPEG', quality=60)
+
+        a, _ = pix.decodePix(self._png(img))
+        b, _ = pix.decodePix(buf.getvalue())
+        self.assertLessEqual(phs.dist(pix.dHash(a), pix.dHash(b)), 4)
+
+    @staticmethod
+    def _png(img):
+        buf = BytesIO()
+        img.save(buf, format='PNG')
+        return buf.getvalue()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import os
+import sys
+import threading
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import pipe
+
+
+def jobs(n): return (pipe.Job(key=i, data=[]) for i in range(n))
+
+
+def mark(tag):
+    def fn(js):
+        for j in js: j.data.append(tag)
+    return fn
+
+
+class TestPipe(unittest.TestCase):
+    def test_stages_in_order_every_job_once(self):
+        p = pipe.Pipe(jobs(200)).add('a', mark('a'), workers=3).add('b', mark('b'), workers=2, batch=8).add('c', mark('c'))
+        out = list(p.run())
+        self.assertEqual(sorted(j.key for j in out), list(range(200)))
+        for j in out: self.assertEqual(j.data, ['a', 'b', 'c'])
+        self.assertEqual([s.cnt for s in p.stages], [200, 200, 200])
+
+    def test_batch_bounded(self):
+        sizes = []
+        lock = threading.Lock()
+        def fn(js):
+            with lock: sizes.append(len(js))
+
+        out = list(pipe.Pipe(jobs(50)).add('b', fn, batch=6, flushWait=0.5).run())
+        self.assertEqual(len(out), 50)
+        self.assertEqual(sum(sizes), 50)
+        self.assertLessEqual(max(sizes), 6)
+        self.assertGreater(max(sizes), 1)
+
+    def test_err_job_skips_later_stages(self):
+        def load(js):
+            for j in js:
+                if j.key % 5 == 0: j.err = 'bad'
+                else: j.data.append('load')
+
+        out = list(pipe.Pipe(jobs(20)).add('load', load).add('vec', mark('vec'), batch=4).run())
+        self.assertEqual(len(out), 20)
+        for j in out:
+            if j.key % 5 == 0: self.assertEqual((j.err, j.data), ('bad', []))
+            else: self.assertEqual((j.err, j.data), (None, ['load', 'vec']))
+
+    def test_stage_error_reraised(self):
+        def boom(js):
+            if any(j.key == 7 for j in js): raise ValueError('boom')
+
+        p = pipe.Pipe(jobs(1000)).add('a', mark('a'), workers=2).add('boom', boom)
+        with self.assertRaises(ValueError): list(p.run())
+        self.assertTrue(p.stop.is_set())
+        for th in p._ths: self.assertFalse(th.is_alive())
+
+    def test_src_error_reraised(self):
+        def src():
+            yield pipe.Job(key=0, data=[])
+            raise KeyError('src')
+
+        with self.assertRaises(KeyError): list(pipe.Pipe(src()).add('a', mark('a')).run())
+
+    def test_cancel_stops_early(self):
+        got = []
+        p = pipe.Pipe(jobs(10000), isCancelled=lambda: len(got) >= 5, depthOut=4).add('a', mark('a'), depth=4)
+        for j in p.run(): got.append(j)
+        self.assertEqual(len(got), 5)
+        self.assertLess(p.stages[0].cnt, 10000)
+        for th in p._ths: self.assertFalse(th.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
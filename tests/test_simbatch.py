@@ -0,0 +1,97 @@
+import unittest
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+import db
+from db import pics, sets, sim
+from mod import models
+
+
+def infos(aid, hits): return [models.SimInfo(aid, 1.0, True)] + [models.SimInfo(b, s, False) for b, s in hits]
+
+
+class TestSimBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        sets.close()
+        sets.pathDb = os.path.join(self.tmp.name, 'sets.db')
+        sets._initialized = False
+        sets.init()
+        pics.close()
+        pics.pathDb = os.path.join(self.tmp.name, 'pics.db')
+        pics.init()
+        with pics.mkConn() as conn:
+            conn.executemany("INSERT INTO assets (autoId, id, isVectored, originalFileName) VALUES (?, ?, 1, ?)", [(i, f"a{i}", f"f{i}.jpg") for i in range(1, 21)])
+            conn.commit()
+
+    def tearDown(self):
+        pics.close()
+        sets.close()
+        self.tmp.cleanup()
+
+    def rows(self):
+        with pics.mkConn() as conn:
+            grps = sorted(tuple(r) for r in conn.execute("SELECT autoId, groupId, isMain FROM assetsGrps"))
+            sims = sorted(tuple(r) for r in conn.execute("SELECT autoId, simAid FROM assetsSims"))
+            cnts = {r[0]: r[1] for r in conn.execute("SELECT autoId, simCnt FROM assets WHERE simCnt > 0")}
+        return grps, sims, cnts
+
+    def test_flush_writes_whole_group(self):
+        bat = pics.SimBatch()
+        bat.setGroup(1, {1: infos(1, [(2, 0.97), (3, 0.96)]), 2: infos(2, [(1, 0.97)]), 3: infos(3, [(1, 0.96)])})
+        bat.setInfos(4, infos(4, []), isOk=1)
+        self.assertEqual(bat.flush(), 4)
+        self.assertEqual((bat.grps, bat.sims), ({}, {}))
+
+        grps, sims, cnts = self.rows()
+        self.assertEqual(grps, [(1, 1, 1), (2, 1, 0), (3, 1, 0)])
+        self.assertEqual(sims, [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (3, 1), (3, 3), (4, 4)])
+        self.assertEqual(cnts, {1: 3, 2: 2, 3: 2, 4: 1})
+        self.assertEqual(pics.getSimOkIds([1, 2, 3, 4]), {4})
+
+    def test_failed_flush_writes_nothing(self):
+        bat = pics.SimBatch()
+        bat.setGroup(1, {1: infos(1, [(2, 0.97)]), 2: infos(2, [(999, 0.95)])})  # 999 breaks the foreign key
+        with self.assertRaises(RuntimeError): bat.flush()
+        self.assertEqual(self.rows(), ([], [], {}))
+
+    def test_cancelled_search_leaves_seed_unsearched(self):
+        rng = np.random.default_rng(5)
+        base = rng.standard_normal(2048)
+        mat = np.stack([base + 0.05 * rng.standard_normal(2048) for _ in range(20)]).astype(np.float32)
+
+        db.vecs.conn = QdrantClient(":memory:")
+        db.vecs.use(db.vecs.mdl)
+        db.vecs.saveMany(list(range(1, 21)), mat, confirm=False)
+        db.dto.thMin = 0.9
+        db.dto.rtreeMax = 100
+        try:
+            steps = []
+            def isCancel(): return len(steps) > 0
+            def doRep(pct, msg): steps.append(msg)
+
+            asset = pics.getByAutoIds([1])[1]
+            gi = sim.findGroupBy(asset, doRep, 1, isCancel=isCancel)
+            self.assertTrue(steps)
+            self.assertEqual(gi.assets, [])
+            self.assertEqual(self.rows(), ([], [], {}))
+
+            # uncancelled, the same walk writes the whole group at once
+            _, bseInfos = db.vecs.findSimiliar(1, db.dto.thMin)
+            done = sim.processChildren(asset, bseInfos, [i.aid for i in bseInfos if not i.isSelf], doRep, isCancel=lambda: False)
+            grps, _, cnts = self.rows()
+            self.assertEqual(done, set(range(1, 21)))
+            self.assertEqual(grps, [(a, 1, 1 if a == 1 else 0) for a in range(1, 21)])
+            self.assertEqual(cnts, {a: 20 for a in range(1, 21)})
+        finally:
+            db.vecs.conn.close()
+            db.vecs.conn = None
+
+
+if __name__ == '__main__':
+    unittest.main()